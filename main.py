@@ -1,10 +1,24 @@
 import sys
 import os
+
+from src import profiler
+
+# KOODLE_PROFILE=1 or --profile reports import times and startup milestones,
+# so it is enabled before anything else is imported
+profiler.enable_from_env()
+
 import pickle
 from PyQt6 import QtWidgets, QtCore
+from src.gui.config import Config
 from src.gui.main_window import MainWindow
-from src.gui.login_dialog import LoginDialog
+from src.gui.widgets import MAX_IMAGE_DOWNLOADS
 from src.moodle import MoodleAPI
+from src.moodle.api import REVALIDATE_WORKERS
+from src.moodle.downloads import DEFAULT_MAX_DOWNLOADS, MAX_SEGMENTS
+from src.moodle.fetch import DEFAULT_MAX_WORKERS
+from src.moodle.replay import transport_from_env
+from src.moodle.sync import SyncEngine
+from src.moodle.transport import HttpTransport
 
 # Function to save token
 def save_token(token):
@@ -18,6 +32,16 @@ def load_token():
             return pickle.load(f)
     return None
 
+# One pooled connection for every thread that can talk to Moodle at once:
+# the API workers, cache revalidation, image loads and download segments
+def connection_pool_size():
+    return (
+        DEFAULT_MAX_WORKERS
+        + REVALIDATE_WORKERS
+        + MAX_IMAGE_DOWNLOADS
+        + DEFAULT_MAX_DOWNLOADS * MAX_SEGMENTS
+    )
+
 def main():
     app = QtWidgets.QApplication(sys.argv)
     # app.setStyle("Fusion")
@@ -28,20 +52,44 @@ def main():
         with open(stylesheet_path, "r") as f:
             app.setStyleSheet(f.read())
 
-    moodle_api = MoodleAPI("https://lernraum.th-luebeck.de/")
+    # KOODLE_RECORD / KOODLE_REPLAY swap the network for a cassette
+    pool_size = connection_pool_size()
+    transport = transport_from_env(pool_size=pool_size)
+    if transport is not None:
+        app.aboutToQuit.connect(transport.close)
+    else:
+        transport = HttpTransport(pool_size=pool_size)
+    HttpTransport.set_instance(transport)
+
+    # Favorites and course states are written behind, pending changes are
+    # written before the event loop ends
+    app.aboutToQuit.connect(Config.instance().flush)
+
+    moodle_api = MoodleAPI(
+        "https://lernraum.th-luebeck.de/", max_workers=DEFAULT_MAX_WORKERS
+    )
+
+    sync = SyncEngine(moodle_api)
 
     token = load_token()
     if token:
+        # The last known site info is enough to show the window, it is
+        # refreshed in the background by the main window
         moodle_api.token = token
-        moodle_api.userid = moodle_api.get_user_id()
+        sync.restore_site_info()
     else:
+        from src.gui.login_dialog import LoginDialog
+
         login_dialog = LoginDialog(moodle_api)
         if login_dialog.exec() != QtWidgets.QDialog.DialogCode.Accepted:
             sys.exit(app.exec())
         save_token(moodle_api.token)
 
-    main_window = MainWindow(moodle_api, token)
+    main_window = MainWindow(moodle_api, moodle_api.token, sync=sync)
     main_window.show()
+    profiler.mark("window shown")
+    profiler.report_after("first paint", "dashboard populated")
+    QtCore.QTimer.singleShot(0, lambda: profiler.mark("first paint"))
     sys.exit(app.exec())
 
 if __name__ == "__main__":
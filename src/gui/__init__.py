@@ -1,3 +1,10 @@
-from .grades_overview import GradesOverview
+__all__ = ["GradesOverview"]
 
-__all__ = ["GradesOverview"]
\ No newline at end of file
+
+def __getattr__(name):
+    # Views are imported on first use to keep startup fast
+    if name == "GradesOverview":
+        from .grades_overview import GradesOverview
+
+        return GradesOverview
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
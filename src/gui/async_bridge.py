@@ -0,0 +1,75 @@
+# Filename: async_bridge.py
+from PyQt6 import QtCore
+import asyncio
+import threading
+
+
+class AsyncBridge(QtCore.QObject):
+    """
+    Runs an asyncio event loop on one background thread so the GUI can hand
+    coroutines (for example AsyncMoodleAPI calls) to it. Results are delivered
+    back on the GUI thread through callbacks.
+    """
+
+    _instance = None
+    _finished = QtCore.pyqtSignal(object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="AsyncBridge", daemon=True
+        )
+        self.thread.start()
+        self._finished.connect(self._dispatch)
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+            app = QtCore.QCoreApplication.instance()
+            if app is not None:
+                app.aboutToQuit.connect(cls._instance.stop)
+        return cls._instance
+
+    def submit(self, coro):
+        """Schedule a coroutine and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, callback=None, errback=None):
+        """
+        Schedule a coroutine, call `callback(result)` or `errback(exception)`
+        on the GUI thread once it finished.
+        """
+        future = self.submit(coro)
+
+        def done(future):
+            error = future.exception()
+            if error is not None:
+                self._finished.emit(errback, None, error)
+            else:
+                self._finished.emit(callback, future.result(), None)
+
+        future.add_done_callback(done)
+        return future
+
+    def post(self, callback, result):
+        """
+        Call `callback(result)` on the GUI thread, used by coroutines to
+        report progress before they finish.
+        """
+        self._finished.emit(callback, result, None)
+
+    @QtCore.pyqtSlot(object, object, object)
+    def _dispatch(self, callback, result, error):
+        if error is not None:
+            if callback is not None:
+                callback(error)
+            else:
+                print(f"Async task failed: {error}")
+        elif callback is not None:
+            callback(result)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=1)
@@ -1,45 +1,142 @@
 # Filename: config.py
 
+import atexit
 import json
 import os
+import tempfile
+import threading
 
 CONFIG_FILE = "config.json"
+# Seconds between the first change and the write of config.json
+FLUSH_DELAY = 2.0
 
 
 class Config:
-    def __init__(self):
+    """
+    Favorites and course states, kept in memory and written behind.
+
+    Changes mark the config dirty and schedule one write after FLUSH_DELAY,
+    so a refresh that updates many courses writes the file once. The file is
+    written to a temporary file and renamed, a crash never leaves a half
+    written config.json. Pending changes are flushed at exit.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=CONFIG_FILE, flush_delay=FLUSH_DELAY):
+        self.path = path
+        self.flush_delay = flush_delay
         self.favorites = []
         self.course_states = {}
+        self.course_checked = {}
+        self.dirty = False
+        self._lock = threading.RLock()
+        self._timer = None
         self.load()
+        atexit.register(self.flush)
+
+    @classmethod
+    def instance(cls):
+        """Returns the config shared by the whole application."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
 
     def load(self):
-        if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, "r") as f:
-                data = json.load(f)
-                self.favorites = data.get("favorites", [])
-                self.course_states = data.get("course_states", {})
-        else:
+        with self._lock:
             self.favorites = []
             self.course_states = {}
+            self.course_checked = {}
+            if not os.path.exists(self.path):
+                return
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Could not read {self.path}, starting with an empty config: {e}")
+                # Kept aside, the next flush would overwrite it
+                try:
+                    os.replace(self.path, self.path + ".bad")
+                except OSError as error:
+                    print(f"Could not move {self.path} aside: {error}")
+                return
+            self.favorites = data.get("favorites", [])
+            self.course_states = data.get("course_states", {})
+            self.course_checked = data.get("course_checked", {})
 
     def save(self):
-        data = {"favorites": self.favorites, "course_states": self.course_states}
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(data, f, indent=4)
+        # Marks the config dirty, the write happens in flush
+        with self._lock:
+            self.dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.dirty:
+                return
+            data = json.dumps(
+                {
+                    "favorites": self.favorites,
+                    "course_states": self.course_states,
+                    "course_checked": self.course_checked,
+                },
+                separators=(",", ":"),
+            )
+            try:
+                self._write(data)
+            except OSError as e:
+                print(f"Could not save {self.path}: {e}")
+                return
+            self.dirty = False
+
+    def _write(self, data):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=".config-", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
 
     def add_favorite(self, course_id):
-        if course_id not in self.favorites:
-            self.favorites.append(course_id)
-            self.save()
+        with self._lock:
+            if course_id not in self.favorites:
+                self.favorites.append(course_id)
+                self.save()
 
     def remove_favorite(self, course_id):
-        if course_id in self.favorites:
-            self.favorites.remove(course_id)
-            self.save()
+        with self._lock:
+            if course_id in self.favorites:
+                self.favorites.remove(course_id)
+                self.save()
 
     def update_course_state(self, course_id, state):
-        self.course_states[str(course_id)] = state
-        self.save()
+        with self._lock:
+            if self.course_states.get(str(course_id)) != state:
+                self.course_states[str(course_id)] = state
+                self.save()
 
     def get_course_state(self, course_id):
         return self.course_states.get(str(course_id))
+
+    def update_course_checked(self, course_id, timestamp):
+        with self._lock:
+            self.course_checked[str(course_id)] = timestamp
+            self.save()
+
+    def get_course_checked(self, course_id):
+        return self.course_checked.get(str(course_id))
@@ -1,21 +1,32 @@
 # Filename: course_detail.py
 from PyQt6 import QtWidgets, QtCore, QtGui
-from .widgets import ImageLoader
-from .download_item_widget import DownloadItemWidget
-import requests
+from .widgets import ImageLoader, ImageVariant
 import webbrowser
 from concurrent.futures import ThreadPoolExecutor
 from .grades_overview import GradesOverview
+from ..moodle.downloads import DONE, FAILED
+from ..moodle.models import parse_sections
 
 class CourseDetail(QtWidgets.QWidget):
     back_requested = QtCore.pyqtSignal()
+    grades_loaded = QtCore.pyqtSignal(object)
+    content_html_loaded = QtCore.pyqtSignal(str)
+    content_reset = QtCore.pyqtSignal()
+    downloads_loaded = QtCore.pyqtSignal(list)
 
-    def __init__(self, moodle_api, course, token, parent=None):
+    def __init__(self, moodle_api, course, token, downloads, parent=None, sync=None):
         super().__init__(parent)
         self.moodle_api = moodle_api
         self.course = course
         self.token = token
+        # Offline mirror, shown first and reconciled in the background
+        self.sync = sync
         self.executor = ThreadPoolExecutor(max_workers=2)
+        # DownloadBridge of the manager shared by the whole application
+        self.downloads = downloads
+        # Downloads started from this page, reported when they finish
+        self.started_downloads = set()
+        self.downloads.download_changed.connect(self.on_download_changed)
         self.init_ui()
 
     def init_ui(self):
@@ -57,14 +68,15 @@ class CourseDetail(QtWidgets.QWidget):
         self.image_label.setStyleSheet("border-radius: 10px;")
         self.image_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
 
-        if self.course.get("overviewfiles"):
-            image_url = self.course["overviewfiles"][0].get("fileurl", "")
-            if image_url:
-                self.loader = ImageLoader(image_url, self.moodle_api.token)
-                self.loader.image_loaded.connect(self.set_course_image)
-                self.loader.load()
-            else:
-                self.set_default_image()
+        if self.course.image_url:
+            self.loader = ImageLoader(
+                self.course.image_url,
+                self.moodle_api.token,
+                self.course.image_timemodified,
+                ImageVariant(self.image_label.size(), radius=10),
+            )
+            self.loader.image_loaded.connect(self.set_course_image)
+            self.loader.load()
         else:
             self.set_default_image()
 
@@ -72,12 +84,12 @@ class CourseDetail(QtWidgets.QWidget):
         info_layout = QtWidgets.QVBoxLayout()
         info_layout.setSpacing(5)
 
-        shortname = QtWidgets.QLabel(f"<b>{self.course.get('shortname', '')}</b>")
+        shortname = QtWidgets.QLabel(f"<b>{self.course.shortname}</b>")
         shortname.setStyleSheet("color: white; font-size: 20px;")
-        fullname = QtWidgets.QLabel(self.course.get("fullname", ""))
+        fullname = QtWidgets.QLabel(self.course.fullname)
         fullname.setStyleSheet("color: #d4d4d4; font-size: 14px;")
         enrolled = QtWidgets.QLabel(
-            f"Enrolled Users: {self.course.get('enrolledusercount', 0)}"
+            f"Enrolled Users: {self.course.enrolledusercount}"
         )
         enrolled.setStyleSheet("color: #d4d4d4; font-size: 14px;")
         info_layout.addWidget(shortname)
@@ -177,6 +189,9 @@ class CourseDetail(QtWidgets.QWidget):
         )
 
         self.overview_layout.addWidget(self.content_area)
+        self.content_html_loaded.connect(self.append_content_html)
+        self.content_reset.connect(self.content_area.clear)
+        self.downloads_loaded.connect(self.populate_downloads_tab)
 
         # Populate Content and Downloads
         self.populate_content_and_downloads()
@@ -184,98 +199,139 @@ class CourseDetail(QtWidgets.QWidget):
         self.setLayout(layout)
 
     def populate_content_and_downloads(self):
-        # Fetch course content asynchronously
+        # Fetch course content and grades asynchronously and in parallel
         self.executor.submit(self.fetch_course_content)
+        self.executor.submit(self.fetch_grades)
+
+    def fetch_grades(self):
+        if self.sync is None:
+            self.grades_loaded.emit(self.moodle_api.get_user_grades(self.course.id))
+            return
+
+        grades = self.sync.mirror.load_grades(self.course.id)
+        if grades is not None:
+            self.grades_loaded.emit(grades)
+        result = self.sync.sync_grades(self.course.id)
+        if result is None:
+            # Keep the mirrored grades while offline
+            if grades is None:
+                self.grades_loaded.emit(None)
+        elif grades is None or result[1]:
+            self.grades_loaded.emit(result[0])
 
     def fetch_course_content(self):
-        contents = self.moodle_api.get_course_content(self.course["id"])
-        html = ""
+        # The mirrored content is shown at once and replaced if it changed
+        sections = self.sync.mirror.load_sections(self.course.id) if self.sync else None
+        if sections is not None:
+            self.show_sections(sections)
+            result = self.sync.sync_course_content(self.course.id)
+            if result is not None and result[1]:
+                self.content_reset.emit()
+                self.show_sections(parse_sections(result[0]))
+            return
+
+        # Sections are rendered one by one while the response is streamed
+        self.show_sections(self.moodle_api.iter_sections(self.course.id))
+        if self.sync is not None:
+            # Usually answered by the response cache filled by the stream
+            self.sync.sync_course_content(self.course.id, refresh=False)
+
+    def show_sections(self, sections):
+        # Prepare a list to hold downloadable items
+        self.downloadable_items = []
 
         # Include course summary if it's not empty or minimal
-        summary = self.course.get("summary", "")
+        summary = self.course.summary
         if summary.strip() and summary.strip() != "<p><br></p>":
-            html += f"{summary}<br><hr>"
+            self.content_html_loaded.emit(f"{summary}<br><hr>")
 
-        # Prepare a list to hold downloadable items
-        self.downloadable_items = []
+        # Changes found by the last update check of the dashboard
+        changes = self.course.changes
+        if changes:
+            self.content_html_loaded.emit(self.render_changes(changes))
 
-        if contents:
-            for section in contents:
-                section_name = section.get("name", "").strip()
-                section_summary = section.get("summary", "").strip()
-
-                if section_name:
-                    html += f"<h2>{section_name}</h2>"
-
-                if section_summary and section_summary != "<p><br></p>":
-                    html += f"{section_summary}<br>"
-
-                modules = section.get("modules", [])
-                for module in modules:
-                    module_name = module.get("name", "").strip()
-                    module_description = module.get("description", "").strip()
-                    module_url = module.get("url", "")
-
-                    if module_name:
-                        if module_url:
-                            html += f"<h3><a href='{module_url}'>{module_name}</a></h3>"
-                        else:
-                            html += f"<h3>{module_name}</h3>"
-
-                    if module_description and module_description != "<p><br></p>":
-                        html += f"{module_description}<br><br>"
-
-                    # Extract downloadable content
-                    contents_info = module.get("contents", [])
-                    for content in contents_info:
-                        if content.get("type") == "file":
-                            filename = content.get("filename")
-                            fileurl = content.get("fileurl")
-                            if filename and fileurl:
-                                # Append the token to the file URL for authentication
-                                authenticated_url = f"{fileurl}&token={self.token}"
-                                self.downloadable_items.append(
-                                    {
-                                        "name": filename,
-                                        "url": authenticated_url,
-                                        "size": content.get("filesize", 0),
-                                    }
-                                )
-                        elif content.get("type") == "url":
-                            pass  # Handle downloadable URLs if necessary
-
-                html += "<hr>"
+        loaded = False
+        for section in sections:
+            loaded = True
+            self.content_html_loaded.emit(self.render_section(section))
 
-        else:
-            html += "Could not load course content."
-
-        # Set the HTML content in the Overview tab
-        if html:
-            QtCore.QMetaObject.invokeMethod(
-                self.content_area,
-                "setHtml",
-                QtCore.Qt.ConnectionType.QueuedConnection,
-                QtCore.Q_ARG(str, html),
-            )
-        else:
-            QtCore.QMetaObject.invokeMethod(
-                self.content_area,
-                "setText",
-                QtCore.Qt.ConnectionType.QueuedConnection,
-                QtCore.Q_ARG(str, "Could not load course content."),
-            )
+        if not loaded:
+            self.content_html_loaded.emit("Could not load course content.")
 
         # Populate the Downloads tab
-        if self.downloadable_items:
-            QtCore.QMetaObject.invokeMethod(
-                self,
-                "populate_downloads_tab",
-                QtCore.Qt.ConnectionType.QueuedConnection,
-            )
-        else:
-            QtCore.QMetaObject.invokeMethod(
-                self, "show_no_downloads", QtCore.Qt.ConnectionType.QueuedConnection
-            )
+        self.downloads_loaded.emit(self.downloadable_items)
+
+    @staticmethod
+    def render_changes(changes):
+        parts = []
+        if changes.added_modules:
+            parts.append(f"{len(changes.added_modules)} new")
+        if changes.modified_modules:
+            parts.append(f"{len(changes.modified_modules)} updated")
+        if changes.removed_modules:
+            parts.append(f"{len(changes.removed_modules)} removed")
+        if changes.removed_sections:
+            parts.append(f"{len(changes.removed_sections)} sections removed")
+        summary = ", ".join(parts) or "sections were rearranged"
+        return (
+            f"<p style='color: #e5c07b;'><b>Changes since the last check:</b> "
+            f"{summary}</p><hr>"
+        )
+
+    @staticmethod
+    def change_badge(changes, module_id):
+        if changes is None:
+            return ""
+        if module_id in changes.added_modules:
+            return " <span style='color: #98c379;'>[new]</span>"
+        if module_id in changes.modified_modules:
+            return " <span style='color: #e5c07b;'>[updated]</span>"
+        return ""
+
+    def render_section(self, section):
+        html = ""
+        changes = self.course.changes or None
+        if section.name:
+            if changes is not None and changes.section_changed(section.id):
+                html += f"<h2>{section.name} <span style='color: #e5c07b;'>&#9679;</span></h2>"
+            else:
+                html += f"<h2>{section.name}</h2>"
+
+        if section.summary and section.summary != "<p><br></p>":
+            html += f"{section.summary}<br>"
+
+        for module in section.modules:
+            if module.name:
+                badge = self.change_badge(changes, module.id)
+                if module.url:
+                    html += f"<h3><a href='{module.url}'>{module.name}</a>{badge}</h3>"
+                else:
+                    html += f"<h3>{module.name}{badge}</h3>"
+
+            if module.description and module.description != "<p><br></p>":
+                html += f"{module.description}<br><br>"
+
+            # Extract downloadable content
+            for content in module.files:
+                if content.filename and content.fileurl:
+                    # Append the token to the file URL for authentication
+                    authenticated_url = f"{content.fileurl}&token={self.token}"
+                    self.downloadable_items.append(
+                        {
+                            "name": content.filename,
+                            "url": authenticated_url,
+                            "size": content.filesize,
+                        }
+                    )
+
+        html += "<hr>"
+        return html
+
+    @QtCore.pyqtSlot(str)
+    def append_content_html(self, html):
+        cursor = QtGui.QTextCursor(self.content_area.document())
+        cursor.movePosition(QtGui.QTextCursor.MoveOperation.End)
+        cursor.insertHtml(html)
 
     @QtCore.pyqtSlot()
     def show_no_downloads(self):
@@ -284,8 +340,20 @@ class CourseDetail(QtWidgets.QWidget):
         self.downloads_layout.addWidget(no_downloads_label)
         self.downloads_layout.addStretch()
 
-    @QtCore.pyqtSlot()
-    def populate_downloads_tab(self):
+    @QtCore.pyqtSlot(list)
+    def populate_downloads_tab(self, downloadable_items):
+        from .download_item_widget import DownloadItemWidget
+
+        # Remove the downloads of a previous render
+        while self.downloads_layout.count():
+            child = self.downloads_layout.takeAt(0)
+            if child.widget():
+                child.widget().deleteLater()
+
+        if not downloadable_items:
+            self.show_no_downloads()
+            return
+
         # Create a scroll area to hold all download items
         scroll_area = QtWidgets.QScrollArea()
         scroll_area.setWidgetResizable(True)
@@ -302,11 +370,13 @@ class CourseDetail(QtWidgets.QWidget):
         container.setLayout(v_layout)
 
         # Add a DownloadItemWidget for each downloadable item
-        for item in self.downloadable_items:
+        for item in downloadable_items:
             filename = item["name"]
             fileurl = item["url"]
             filesize = item.get("size", 0)
-            download_widget = DownloadItemWidget(filename, filesize, fileurl)
+            download_widget = DownloadItemWidget(
+                filename, filesize, fileurl, downloads=self.downloads
+            )
             download_widget.download_requested.connect(self.handle_download_requested)
             v_layout.addWidget(download_widget)
 
@@ -315,10 +385,13 @@ class CourseDetail(QtWidgets.QWidget):
         self.downloads_layout.addWidget(scroll_area)
 
     def populate_grades_tab(self):
-        self.grades_overview = GradesOverview(self.moodle_api, self.course["id"])
+        # Grades are fetched next to the course content
+        self.grades_overview = GradesOverview(
+            self.moodle_api, self.course.id, autoload=False
+        )
+        self.grades_loaded.connect(self.grades_overview.display_grades)
         self.grades_layout.addWidget(self.grades_overview)
 
-
     def handle_download_requested(self, filename, fileurl):
         # Open a standard file dialog to choose the download location
         save_path, _ = QtWidgets.QFileDialog.getSaveFileName(
@@ -328,47 +401,25 @@ class CourseDetail(QtWidgets.QWidget):
             "All Files (*);;PDF Files (*.pdf);;ZIP Files (*.zip)",
         )
         if save_path:
-            # Start the download in a separate thread
-            self.executor.submit(self.download_file, fileurl, save_path)
-
-    def download_file(self, url, save_path):
-        try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            total_length = response.headers.get("content-length")
-
-            with open(save_path, "wb") as f:
-                if total_length is None:
-                    f.write(response.content)
-                else:
-                    dl = 0
-                    total_length = int(total_length)
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                            dl += len(chunk)
-                            done = int(100 * dl / total_length)
-                            self.update_download_progress(done)
-
-            # Notify the user upon successful download
-            QtCore.QMetaObject.invokeMethod(
-                self,
-                "show_download_success",
-                QtCore.Qt.ConnectionType.QueuedConnection,
-                QtCore.Q_ARG(str, save_path),
-            )
-        except requests.exceptions.RequestException as e:
-            # Notify the user about the download failure
-            QtCore.QMetaObject.invokeMethod(
-                self,
-                "show_download_error",
-                QtCore.Qt.ConnectionType.QueuedConnection,
-                QtCore.Q_ARG(str, str(e)),
+            # Queued in the download manager, progress shows in the item
+            # and in the Downloads panel
+            size = next(
+                (item["size"] for item in self.downloadable_items if item["url"] == fileurl),
+                0,
             )
-
-    def update_download_progress(self, percent):
-        # Placeholder for progress update
-        pass
+            download = self.downloads.manager.enqueue(fileurl, save_path, size)
+            self.started_downloads.add(download.id)
+
+    @QtCore.pyqtSlot(dict)
+    def on_download_changed(self, download):
+        if download["id"] not in self.started_downloads:
+            return
+        if download["status"] == DONE:
+            self.started_downloads.discard(download["id"])
+            self.show_download_success(download["path"])
+        elif download["status"] == FAILED:
+            self.started_downloads.discard(download["id"])
+            self.show_download_error(download["error"])
 
     @QtCore.pyqtSlot(str)
     def show_download_success(self, save_path):
@@ -385,13 +436,8 @@ class CourseDetail(QtWidgets.QWidget):
         )
 
     def set_course_image(self, pixmap):
+        # Rendered at the size of the label by the loader
         if not pixmap.isNull():
-            pixmap = pixmap.scaled(
-                self.image_label.width(),
-                self.image_label.height(),
-                QtCore.Qt.AspectRatioMode.KeepAspectRatio,
-                QtCore.Qt.TransformationMode.SmoothTransformation,
-            )
             self.image_label.setPixmap(pixmap)
         else:
             self.set_default_image()
@@ -0,0 +1,354 @@
+# Filename: course_grid.py
+from PyQt6 import QtWidgets, QtGui, QtCore
+from .widgets import ImageCache, ImageLoader, ImageVariant, image_key
+import random
+import os
+
+TILE_WIDTH = 300
+TILE_HEIGHT = 200
+IMAGE_HEIGHT = 130
+TILE_RADIUS = 10
+ICON_SIZE = 24
+# Tile images are decoded, cropped and rounded in worker threads
+TILE_IMAGE = ImageVariant(
+    QtCore.QSize(TILE_WIDTH, IMAGE_HEIGHT), crop=True, radius=TILE_RADIUS, top_only=True
+)
+
+CourseRole = QtCore.Qt.ItemDataRole.UserRole + 1
+FavoriteRole = QtCore.Qt.ItemDataRole.UserRole + 2
+UpdateRole = QtCore.Qt.ItemDataRole.UserRole + 3
+ImageRole = QtCore.Qt.ItemDataRole.UserRole + 4
+GradientRole = QtCore.Qt.ItemDataRole.UserRole + 5
+
+
+def generate_matching_colors():
+    # Generate two random but matching colors for gradient
+    base_color = QtGui.QColor(
+        random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)
+    )
+    hue = base_color.hue()
+    saturation = base_color.saturation()
+    value = base_color.value()
+
+    # Generate a second color with a slight hue shift
+    hue_shift = random.randint(10, 30)
+    new_hue = (hue + hue_shift) % 360
+    color1 = QtGui.QColor.fromHsv(new_hue, saturation, value)
+    color2 = QtGui.QColor.fromHsv(hue, saturation, value)
+
+    return color1, color2
+
+
+class CourseListModel(QtCore.QAbstractListModel):
+    """
+    Holds every course of the dashboard, one row per course.
+
+    Course images are requested the first time a row is painted, so only
+    visible tiles start downloads. Pixmaps live in the bounded ImageCache
+    only, evicted images are reloaded from the thumbnail on disk.
+    """
+
+    def __init__(self, token, config, parent=None):
+        super().__init__(parent)
+        self.token = token
+        self.config = config
+        self.courses = []
+        self.rows = {}
+        self.gradients = {}
+        self.loaders = {}
+        # Courses whose image could not be loaded, painted with a gradient
+        self.failed = set()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.courses)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.courses):
+            return None
+        course = self.courses[index.row()]
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return course.shortname
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            return course.fullname
+        if role == CourseRole:
+            return course
+        if role == FavoriteRole:
+            return course.id in self.config.favorites
+        if role == UpdateRole:
+            return bool(course.has_update)
+        if role == ImageRole:
+            return self.image(course)
+        if role == GradientRole:
+            if course.id not in self.gradients:
+                self.gradients[course.id] = generate_matching_colors()
+            return self.gradients[course.id]
+        return None
+
+    def set_courses(self, courses):
+        self.beginResetModel()
+        self.courses = list(courses)
+        self.rows = {course.id: row for row, course in enumerate(self.courses)}
+        self.failed.clear()
+        self.endResetModel()
+
+    def course_changed(self, course_id):
+        row = self.rows.get(course_id)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+    def toggle_favorite(self, course):
+        if course.id in self.config.favorites:
+            self.config.remove_favorite(course.id)
+        else:
+            self.config.add_favorite(course.id)
+        self.course_changed(course.id)
+
+    def image(self, course):
+        url = course.image_url
+        if not url or course.id in self.failed:
+            return None
+        pixmap = ImageCache.get(image_key(url, course.image_timemodified, TILE_IMAGE))
+        if pixmap is not None:
+            return pixmap
+        if course.id not in self.loaders:
+            loader = ImageLoader(
+                url, self.token, course.image_timemodified, TILE_IMAGE
+            )
+            loader.image_loaded.connect(
+                lambda pixmap, course_id=course.id: self.on_image_loaded(course_id)
+            )
+            self.loaders[course.id] = loader
+            loader.load()
+        return None
+
+    def on_image_loaded(self, course_id):
+        loader = self.loaders.pop(course_id, None)
+        # Failed loads fall back to the gradient
+        if loader is not None and loader.failed:
+            self.failed.add(course_id)
+        self.course_changed(course_id)
+
+
+class CourseFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    Shows the courses matched by a search ranked by score, or all courses
+    with favorites first.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Course id -> score of the current search, None shows all courses
+        self.ranking = None
+        self.setDynamicSortFilter(True)
+
+    def set_ranking(self, ranking):
+        self.ranking = ranking
+        self.invalidate()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.ranking is None:
+            return True
+        return self.sourceModel().courses[source_row].id in self.ranking
+
+    def sort_key(self, index):
+        course = self.sourceModel().courses[index.row()]
+        key = (not index.data(FavoriteRole), course.shortname)
+        if self.ranking is not None:
+            return (-self.ranking.get(course.id, 0),) + key
+        return key
+
+    def lessThan(self, left, right):
+        return self.sort_key(left) < self.sort_key(right)
+
+
+class CourseTileDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints course tiles, replaces one CourseTile widget per course.
+
+    Clicking the star toggles the favorite, clicking anywhere else opens the
+    course.
+    """
+
+    course_clicked = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.star_filled = self.load_icon("icons/star_filled_yellow.png")
+        self.star_outline = self.load_icon("icons/star_outline_yellow.png")
+        self.update_icon = self.load_icon("icons/update.png")
+        self.title_font = QtGui.QFont()
+        self.title_font.setPixelSize(16)
+        self.title_font.setBold(True)
+        self.text_font = QtGui.QFont()
+        self.text_font.setPixelSize(12)
+
+    @staticmethod
+    def load_icon(path):
+        if os.path.exists(path):
+            return QtGui.QIcon(path).pixmap(ICON_SIZE, ICON_SIZE)
+        return None
+
+    def sizeHint(self, option, index):
+        return QtCore.QSize(TILE_WIDTH, TILE_HEIGHT)
+
+    @staticmethod
+    def tile_rect(option):
+        return QtCore.QRect(option.rect.topLeft(), QtCore.QSize(TILE_WIDTH, TILE_HEIGHT))
+
+    @staticmethod
+    def star_rect(tile):
+        return QtCore.QRect(
+            tile.right() - ICON_SIZE - 9, tile.top() + 10, ICON_SIZE, ICON_SIZE
+        )
+
+    def paint(self, painter, option, index):
+        course = index.data(CourseRole)
+        if course is None:
+            return
+        tile = self.tile_rect(option)
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+
+        # Tile background, shows through below the image area
+        painter.setPen(QtCore.Qt.PenStyle.NoPen)
+        painter.setBrush(QtGui.QColor("#3c3c3c"))
+        painter.drawRoundedRect(QtCore.QRectF(tile), TILE_RADIUS, TILE_RADIUS)
+
+        # Image area, with a gradient if there is no image (yet). Images
+        # arrive at their final size with rounded corners, ready to blit.
+        image_rect = QtCore.QRect(tile.left(), tile.top(), TILE_WIDTH, IMAGE_HEIGHT)
+        pixmap = index.data(ImageRole)
+        if pixmap is not None:
+            painter.drawPixmap(image_rect, pixmap)
+        else:
+            color1, color2 = index.data(GradientRole)
+            gradient = QtGui.QLinearGradient(
+                QtCore.QPointF(image_rect.topLeft()),
+                QtCore.QPointF(image_rect.bottomRight()),
+            )
+            gradient.setColorAt(0, color1)
+            gradient.setColorAt(1, color2)
+            painter.setBrush(gradient)
+            # Rounded at the top only, the lower corners are covered below
+            painter.drawRoundedRect(
+                QtCore.QRectF(image_rect.adjusted(0, 0, 0, TILE_RADIUS)),
+                TILE_RADIUS,
+                TILE_RADIUS,
+            )
+
+        # Data block
+        data_rect = QtCore.QRect(
+            tile.left(),
+            tile.top() + IMAGE_HEIGHT,
+            TILE_WIDTH,
+            TILE_HEIGHT - IMAGE_HEIGHT,
+        )
+        painter.fillRect(
+            QtCore.QRect(data_rect.left(), data_rect.top(), TILE_WIDTH, TILE_RADIUS),
+            QtGui.QColor("#3c3c3c"),
+        )
+        text_rect = data_rect.adjusted(10, 5, -10, -5)
+        line_height = text_rect.height() // 3
+
+        painter.setFont(self.title_font)
+        painter.setPen(QtGui.QColor("white"))
+        self.draw_line(painter, text_rect, 0, line_height, course.shortname)
+        painter.setFont(self.text_font)
+        painter.setPen(QtGui.QColor("#d4d4d4"))
+        self.draw_line(painter, text_rect, 1, line_height, course.fullname)
+        self.draw_line(
+            painter,
+            text_rect,
+            2,
+            line_height,
+            f"Enrolled: {course.enrolledusercount}",
+        )
+
+        # Icons
+        star = self.star_filled if index.data(FavoriteRole) else self.star_outline
+        if star is not None:
+            painter.drawPixmap(self.star_rect(tile), star)
+        if index.data(UpdateRole) and self.update_icon is not None:
+            painter.drawPixmap(tile.left() + 10, tile.top() + 10, self.update_icon)
+
+        # Border, highlighted under the mouse
+        hovered = option.state & QtWidgets.QStyle.StateFlag.State_MouseOver
+        painter.setPen(
+            QtGui.QPen(QtGui.QColor("#007acc" if hovered else "#444"), 2)
+        )
+        painter.setBrush(QtCore.Qt.BrushStyle.NoBrush)
+        painter.drawRoundedRect(
+            QtCore.QRectF(tile).adjusted(1, 1, -1, -1), TILE_RADIUS, TILE_RADIUS
+        )
+        painter.restore()
+
+    @staticmethod
+    def draw_line(painter, rect, line, line_height, text):
+        line_rect = QtCore.QRect(
+            rect.left(), rect.top() + line * line_height, rect.width(), line_height
+        )
+        text = painter.fontMetrics().elidedText(
+            text, QtCore.Qt.TextElideMode.ElideRight, line_rect.width()
+        )
+        painter.drawText(
+            line_rect,
+            QtCore.Qt.AlignmentFlag.AlignLeft | QtCore.Qt.AlignmentFlag.AlignVCenter,
+            text,
+        )
+
+    def editorEvent(self, event, model, option, index):
+        if (
+            event.type() != QtCore.QEvent.Type.MouseButtonRelease
+            or event.button() != QtCore.Qt.MouseButton.LeftButton
+        ):
+            return False
+        course = index.data(CourseRole)
+        if course is None:
+            return False
+        if self.star_rect(self.tile_rect(option)).contains(event.position().toPoint()):
+            source = model.mapToSource(index) if hasattr(model, "mapToSource") else index
+            source.model().toggle_favorite(course)
+        else:
+            self.course_clicked.emit(course)
+        return True
+
+
+class CourseGrid(QtWidgets.QListView):
+    """
+    Course tiles in a grid that reflows with the width of the view.
+
+    Only visible rows are painted, resizing relayouts the rows without
+    creating or destroying widgets.
+    """
+
+    course_clicked = QtCore.pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setViewMode(QtWidgets.QListView.ViewMode.IconMode)
+        self.setResizeMode(QtWidgets.QListView.ResizeMode.Adjust)
+        self.setMovement(QtWidgets.QListView.Movement.Static)
+        self.setFlow(QtWidgets.QListView.Flow.LeftToRight)
+        self.setWrapping(True)
+        self.setUniformItemSizes(True)
+        self.setSpacing(10)
+        self.setMouseTracking(True)
+        self.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.NoSelection)
+        self.setFocusPolicy(QtCore.Qt.FocusPolicy.NoFocus)
+        self.setVerticalScrollMode(
+            QtWidgets.QAbstractItemView.ScrollMode.ScrollPerPixel
+        )
+        self.setStyleSheet(
+            """
+            QListView {
+                background-color: #1e1e1e;
+                border-radius: 10px;
+                border: none;
+            }
+        """
+        )
+        self.delegate = CourseTileDelegate(self)
+        self.delegate.course_clicked.connect(self.course_clicked.emit)
+        self.setItemDelegate(self.delegate)
+        self.viewport().setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
@@ -1,8 +1,17 @@
 # Filename: dashboard.py
 from PyQt6 import QtWidgets, QtCore, QtGui
-from .widgets import CourseTile
+from .course_grid import CourseGrid, CourseListModel, CourseFilterProxyModel
 from .config import Config
-import math
+from ..moodle.models import parse_sections
+from ..moodle.search import CourseSearchIndex
+from ..moodle.state import CourseState
+from .. import profiler
+import asyncio
+import time
+
+# Seconds subtracted from the local clock when a course check is stored, so
+# changes are not missed when the local clock runs ahead of the server's
+UPDATE_CHECK_MARGIN = 300
 
 
 class FetchCoursesSignals(QtCore.QObject):
@@ -11,20 +20,34 @@ class FetchCoursesSignals(QtCore.QObject):
 
 
 class FetchCoursesRunnable(QtCore.QRunnable):
-    def __init__(self, moodle_api):
+    def __init__(self, moodle_api, refresh=False, sync=None, only_changes=False):
         super().__init__()
         self.moodle_api = moodle_api
+        # Bypass the response cache, used by the Refresh button
+        self.refresh = refresh
+        # Mirror the course list, with only_changes the list is emitted
+        # only if it differs from the mirrored one
+        self.sync = sync
+        self.only_changes = only_changes
         self.signals = FetchCoursesSignals()
 
     @QtCore.pyqtSlot()
     def run(self):
         try:
+            if self.sync is not None:
+                result = self.sync.sync_courses(refresh=self.refresh)
+                if result is None:
+                    self.signals.error.emit()
+                elif result[1] or not self.only_changes:
+                    self.signals.courses_loaded.emit(result[0])
+                return
+
             user_id = self.moodle_api.get_user_id()
             if user_id is None:
                 self.signals.error.emit()
                 return
 
-            courses = self.moodle_api.get_course(user_id)
+            courses = self.moodle_api.get_courses(user_id, refresh=self.refresh)
             if courses:
                 self.signals.courses_loaded.emit(courses)
             else:
@@ -34,47 +57,185 @@ class FetchCoursesRunnable(QtCore.QRunnable):
             self.signals.error.emit()
 
 
+class FetchCourseStatesSignals(QtCore.QObject):
+    course_state_loaded = QtCore.pyqtSignal(dict)
+    courses_loaded = QtCore.pyqtSignal(list)
+    error = QtCore.pyqtSignal()
+
+
 class FetchCourseStatesRunnable(QtCore.QRunnable):
-    def __init__(self, moodle_api, courses):
+    def __init__(self, moodle_api, courses, checked=None, sync=None):
         super().__init__()
         self.moodle_api = moodle_api
         self.courses = courses
-        self.signals = FetchCoursesSignals()
+        # Fetched contents are written to the offline mirror
+        self.sync = sync
+        # Timestamp of the last successful check per course id
+        self.checked = checked or {}
+        self.signals = FetchCourseStatesSignals()
         self.results = []
 
     @QtCore.pyqtSlot()
     def run(self):
         try:
-            for course in self.courses:
-                course_id = course["id"]
-                contents = self.moodle_api.get_course_content(course_id)
-                # Compute the state
-                if contents is None:
+            checked_at = int(time.time()) - UPDATE_CHECK_MARGIN
+            course_ids = [course.id for course in self.courses]
+
+            # Courses checked before only need the small list of changed
+            # modules, the full content is fetched for changed courses only
+            since_by_course = {
+                course_id: self.checked[course_id]
+                for course_id in course_ids
+                if self.checked.get(course_id)
+            }
+            to_fetch = [
+                course_id for course_id in course_ids if course_id not in since_by_course
+            ]
+            for course_id, changed in self.moodle_api.iter_course_updates(
+                since_by_course
+            ):
+                if changed is False:
+                    self.emit_result(
+                        {"course_id": course_id, "state": None, "checked": checked_at}
+                    )
+                else:
+                    to_fetch.append(course_id)
+
+            # Changed courses are fetched in parallel, each result is emitted
+            # as soon as it arrives so the dashboard can update progressively
+            for course_id, contents in self.moodle_api.iter_course_contents(
+                to_fetch, refresh=True
+            ):
+                sections = parse_sections(contents)
+                if sections is None:
+                    print(f"Could not fetch content of course {course_id}")
                     continue
-                state = []
-                for section in contents:
-                    for module in section.get("modules", []):
-                        module_id = module.get("id")
-                        module_modified = module.get("timemodified", 0)
-                        state.append({"id": module_id, "timemodified": module_modified})
-                self.results.append({"course_id": course_id, "state": state})
+                if self.sync is not None:
+                    self.sync.store_course_content(course_id, contents)
+                self.emit_result(
+                    {
+                        "course_id": course_id,
+                        "state": CourseState.from_sections(sections).to_json(),
+                        "checked": checked_at,
+                    }
+                )
             self.signals.courses_loaded.emit(self.results)
         except Exception as e:
             print(f"Error fetching course states: {e}")
             self.signals.error.emit()
 
+    def emit_result(self, result):
+        self.results.append(result)
+        self.signals.course_state_loaded.emit(result)
+
+
+async def fetch_course_states(moodle_api, courses, checked, sync=None, on_result=None):
+    """
+    Coroutine version of FetchCourseStatesRunnable, run on the AsyncBridge.
+    `on_result` is called with every course state as soon as its batch
+    arrived, the list of all results is returned.
+    """
+    from ..moodle.async_api import AsyncMoodleAPI
+
+    checked_at = int(time.time()) - UPDATE_CHECK_MARGIN
+    loop = asyncio.get_running_loop()
+    results = []
+
+    def emit_result(result):
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    async with AsyncMoodleAPI.from_api(moodle_api) as client:
+        course_ids = [course.id for course in courses]
+        since_by_course = {
+            course_id: checked[course_id]
+            for course_id in course_ids
+            if checked.get(course_id)
+        }
+        to_fetch = [
+            course_id
+            for course_id in course_ids
+            if course_id not in since_by_course
+        ]
+        updates = await client.get_course_updates(since_by_course)
+        for course_id, changed in updates.items():
+            if changed is False:
+                emit_result(
+                    {"course_id": course_id, "state": None, "checked": checked_at}
+                )
+            else:
+                to_fetch.append(course_id)
+
+        async def fetch_batch(batch):
+            calls = [
+                ("core_course_get_contents", {"courseid": course_id})
+                for course_id in batch
+            ]
+            return batch, await client.call_many(calls, refresh=True)
+
+        batches = [
+            to_fetch[start : start + client.batch_size]
+            for start in range(0, len(to_fetch), client.batch_size)
+        ]
+        for next_batch in asyncio.as_completed([fetch_batch(b) for b in batches]):
+            batch, contents_list = await next_batch
+            for course_id, contents in zip(batch, contents_list):
+                sections = parse_sections(contents)
+                if sections is None:
+                    print(f"Could not fetch content of course {course_id}")
+                    continue
+                if sync is not None:
+                    # The mirror writes to SQLite, keep it off the event loop
+                    await loop.run_in_executor(
+                        None, sync.store_course_content, course_id, contents
+                    )
+                emit_result(
+                    {
+                        "course_id": course_id,
+                        "state": CourseState.from_sections(sections).to_json(),
+                        "checked": checked_at,
+                    }
+                )
+    return results
+
+
+class SearchSignals(QtCore.QObject):
+    results_ready = QtCore.pyqtSignal(int, list)
+
+
+class SearchRunnable(QtCore.QRunnable):
+    def __init__(self, search_index, query, generation):
+        super().__init__()
+        self.search_index = search_index
+        self.query = query
+        # Lets the dashboard drop results of outdated queries
+        self.generation = generation
+        self.signals = SearchSignals()
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        try:
+            results = self.search_index.search(self.query)
+        except Exception as e:
+            print(f"Error searching courses: {e}")
+            results = []
+        self.signals.results_ready.emit(self.generation, results)
+
 
 class Dashboard(QtWidgets.QWidget):
-    course_selected = QtCore.pyqtSignal(dict)
+    course_selected = QtCore.pyqtSignal(object)
 
-    def __init__(self, moodle_api, parent=None):
+    def __init__(self, moodle_api, parent=None, sync=None):
         super().__init__(parent)
         self.moodle_api = moodle_api
+        self.sync = sync
         self.token = moodle_api.token
-        self.config = Config()
+        self.config = Config.instance()
+        self.search_index = CourseSearchIndex()
+        self.search_generation = 0
         self.init_ui()
         self.all_courses = []
-        self.courses = []
         self.load_courses()
 
     def init_ui(self):
@@ -106,7 +267,12 @@ class Dashboard(QtWidgets.QWidget):
             }
         """
         )
-        self.search_bar.textChanged.connect(self.update_course_list)
+        # Searches run once typing pauses
+        self.search_timer = QtCore.QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.update_course_list)
+        self.search_bar.textChanged.connect(self.search_timer.start)
         search_layout.addWidget(self.search_bar)
 
         # Refresh Button
@@ -133,59 +299,55 @@ class Dashboard(QtWidgets.QWidget):
 
         self.layout.addLayout(search_layout)
 
-        # Scroll Area
-        self.scroll = QtWidgets.QScrollArea()
-        self.scroll.setWidgetResizable(True)
-        self.scroll.setStyleSheet(
-            """
-            QScrollArea {
-                background-color: #1e1e1e;
-                border-radius: 10px;
-            }
-            /* Scrollbar styles omitted for brevity */
-        """
-        )
-        self.layout.addWidget(self.scroll)
-
-        # Container widget
-        self.container = QtWidgets.QWidget()
-        self.scroll.setWidget(self.container)
-
-        # Grid Layout
-        self.grid = QtWidgets.QGridLayout()
-        self.grid.setSpacing(20)
-        self.container.setLayout(self.grid)
+        # Course grid, tiles are painted by a delegate for the visible rows
+        self.model = CourseListModel(self.token, self.config, self)
+        self.proxy = CourseFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.sort(0)
+        self.grid = CourseGrid()
+        self.grid.setModel(self.proxy)
+        self.grid.course_clicked.connect(self.on_tile_clicked)
+        self.layout.addWidget(self.grid)
 
     def load_courses(self):
-        runnable = FetchCoursesRunnable(self.moodle_api)
+        # Show the mirrored courses at once and reconcile in the background
+        if self.sync is not None:
+            courses = self.sync.mirror.load_courses()
+            if courses:
+                self.on_courses_loaded(courses)
+
+        runnable = FetchCoursesRunnable(
+            self.moodle_api, sync=self.sync, only_changes=bool(self.all_courses)
+        )
         runnable.signals.courses_loaded.connect(self.on_courses_loaded)
-        runnable.signals.error.connect(self.on_error)
+        runnable.signals.error.connect(self.on_load_error)
         QtCore.QThreadPool.globalInstance().start(runnable)
 
     @QtCore.pyqtSlot(list)
     def on_courses_loaded(self, courses):
         self.all_courses = courses
+        self.model.set_courses(courses)
+        self.search_index.update(courses)
         self.update_course_list()
+        profiler.mark("dashboard populated")
 
     def update_course_list(self):
-        search_text = self.search_bar.text().lower()
-        if search_text:
-            filtered_courses = [
-                course
-                for course in self.all_courses
-                if search_text in course.get("shortname", "").lower()
-                or search_text in course.get("fullname", "").lower()
-            ]
-        else:
-            filtered_courses = self.all_courses
-
-        # Sort courses: favorites first
-        def course_sort_key(course):
-            is_favorite = course["id"] in self.config.favorites
-            return (0 if is_favorite else 1, course.get("shortname", ""))
-
-        self.courses = sorted(filtered_courses, key=course_sort_key)
-        self.populate_grid()
+        # Filtering and sorting only touch the proxy, no tiles are rebuilt
+        self.search_timer.stop()
+        self.search_generation += 1
+        query = self.search_bar.text()
+        if not query.strip():
+            self.proxy.set_ranking(None)
+            return
+        runnable = SearchRunnable(self.search_index, query, self.search_generation)
+        runnable.signals.results_ready.connect(self.on_search_results)
+        # Ahead of image loads, so results show up while typing
+        QtCore.QThreadPool.globalInstance().start(runnable, priority=5)
+
+    @QtCore.pyqtSlot(int, list)
+    def on_search_results(self, generation, results):
+        if generation == self.search_generation:
+            self.proxy.set_ranking(dict(results))
 
     def refresh_courses(self):
         self.loading_indicator = QtWidgets.QProgressDialog(
@@ -195,7 +357,7 @@ class Dashboard(QtWidgets.QWidget):
         self.loading_indicator.show()
 
         # Fetch the list of courses first
-        runnable = FetchCoursesRunnable(self.moodle_api)
+        runnable = FetchCoursesRunnable(self.moodle_api, refresh=True, sync=self.sync)
         runnable.signals.courses_loaded.connect(self.on_courses_fetched_for_refresh)
         runnable.signals.error.connect(self.on_error)
         QtCore.QThreadPool.globalInstance().start(runnable)
@@ -203,76 +365,96 @@ class Dashboard(QtWidgets.QWidget):
     @QtCore.pyqtSlot(list)
     def on_courses_fetched_for_refresh(self, courses):
         self.all_courses = courses
+        self.model.set_courses(courses)
+        self.search_index.update(courses)
+        self.update_course_list()
+        self.loading_indicator.setRange(0, len(courses))
+        self.loading_indicator.setValue(0)
         # Now fetch course states
-        state_runnable = FetchCourseStatesRunnable(self.moodle_api, self.all_courses)
+        checked = {
+            course.id: self.config.get_course_checked(course.id)
+            for course in courses
+            if self.config.get_course_state(course.id) is not None
+        }
+        from ..moodle import async_api
+
+        if async_api.aiohttp is not None:
+            # The update check and the content fetch run on the asyncio
+            # client, results arrive on the GUI thread through the bridge
+            from .async_bridge import AsyncBridge
+
+            bridge = AsyncBridge.instance()
+            bridge.run(
+                fetch_course_states(
+                    self.moodle_api,
+                    self.all_courses,
+                    checked,
+                    sync=self.sync,
+                    on_result=lambda result: bridge.post(
+                        self.on_course_state_fetched, result
+                    ),
+                ),
+                callback=self.on_course_states_fetched,
+                errback=self.on_course_states_error,
+            )
+            return
+
+        state_runnable = FetchCourseStatesRunnable(
+            self.moodle_api, self.all_courses, checked, sync=self.sync
+        )
+        state_runnable.signals.course_state_loaded.connect(
+            self.on_course_state_fetched
+        )
         state_runnable.signals.courses_loaded.connect(self.on_course_states_fetched)
         state_runnable.signals.error.connect(self.on_error)
         QtCore.QThreadPool.globalInstance().start(state_runnable)
 
+    @QtCore.pyqtSlot(dict)
+    def on_course_state_fetched(self, result):
+        self.loading_indicator.setValue(self.loading_indicator.value() + 1)
+        course_id = result["course_id"]
+        course = next((c for c in self.all_courses if c.id == course_id), None)
+        if course:
+            course.has_update = False
+            # A state of None means the update check found no changes
+            if result["state"] is not None:
+                current_state = CourseState.from_json(result["state"])
+                saved_state = CourseState.from_json(
+                    self.config.get_course_state(course_id)
+                )
+                # Courses without a saved digest count as updated
+                changes = current_state.diff(saved_state) if saved_state else None
+                if changes is None or changes:
+                    course.has_update = True
+                    course.changes = changes
+                    self.config.update_course_state(course_id, result["state"])
+            self.model.course_changed(course_id)
+        self.config.update_course_checked(course_id, result["checked"])
+
     @QtCore.pyqtSlot(list)
     def on_course_states_fetched(self, results):
+        # Each result was already processed by on_course_state_fetched
         self.loading_indicator.close()
-        # Process the results
-        for result in results:
-            course_id = result["course_id"]
-            current_state = result["state"]
-            saved_state = self.config.get_course_state(course_id)
-            course = next((c for c in self.all_courses if c["id"] == course_id), None)
-            if course:
-                if saved_state != current_state:
-                    course["has_update"] = True
-                    self.config.update_course_state(course_id, current_state)
-                else:
-                    course["has_update"] = False
-        self.update_course_list()
+
+    def on_course_states_error(self, error):
+        print(f"Error fetching course states: {error}")
+        self.on_error()
+
+    @QtCore.pyqtSlot()
+    def on_load_error(self):
+        # The mirrored courses stay usable while Moodle is unreachable
+        if self.all_courses:
+            print("Could not reach Moodle, showing offline courses")
+        else:
+            QtWidgets.QMessageBox.warning(self, "Error", "Could not load courses.")
 
     @QtCore.pyqtSlot()
     def on_error(self):
         self.loading_indicator.close()
         QtWidgets.QMessageBox.warning(self, "Error", "Could not load courses.")
 
-    @QtCore.pyqtSlot()
-    def populate_grid(self):
-        # Clear existing items in the grid
-        while self.grid.count():
-            child = self.grid.takeAt(0)
-            if child.widget():
-                child.widget().deleteLater()
-
-        # Determine number of columns based on window width
-        available_width = self.scroll.viewport().width()
-        tile_width = 300  # Width of each CourseTile
-        spacing = self.grid.spacing()
-        columns = max(1, available_width // (tile_width + spacing))
-
-        # Limit to 4 columns for better display
-        columns = min(columns, 4)
-
-        # Populate grid
-        row = 0
-        col = 0
-        for course in self.courses:
-            tile = CourseTile(course, self.token, self.config)
-            tile.clicked.connect(self.on_tile_clicked)
-            tile.favorite_changed.connect(self.update_course_list)
-            self.grid.addWidget(tile, row, col)
-            col += 1
-            if col >= columns:
-                col = 0
-                row += 1
-
-        # Add stretch to push items to the top
-        self.grid.setRowStretch(row + 1, 1)
-
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        self.populate_grid()
-
     def on_tile_clicked(self, course):
         # Clear the update flag
-        course["has_update"] = False
-        self.config.update_course_state(
-            course["id"], self.config.get_course_state(course["id"])
-        )
-        self.update_course_list()
+        course.has_update = False
+        self.model.course_changed(course.id)
         self.course_selected.emit(course)
@@ -1,15 +1,20 @@
 # Filename: download_item_widget.py
 from PyQt6 import QtWidgets, QtCore, QtGui
+from .downloads import human_readable_speed
+from ..moodle.downloads import ACTIVE, CANCELLED, DONE, FAILED, QUEUED
 import os
 
 class DownloadItemWidget(QtWidgets.QWidget):
     download_requested = QtCore.pyqtSignal(str, str)
 
-    def __init__(self, filename, filesize, fileurl, parent=None):
+    def __init__(self, filename, filesize, fileurl, parent=None, downloads=None):
         super().__init__(parent)
         self.filename = filename
         self.filesize = filesize
         self.fileurl = fileurl
+        # DownloadBridge of the download manager, None hides the progress
+        self.downloads = downloads
+        self.download_id = None
 
         # Check if the file size is 0 bytes
         if filesize == 0:
@@ -37,6 +42,23 @@ class DownloadItemWidget(QtWidgets.QWidget):
         self.size_label.setStyleSheet("color: #d4d4d4;")
         name_size_layout.addWidget(self.name_label)
         name_size_layout.addWidget(self.size_label)
+
+        # Progress of the download, hidden until one is started
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setFixedHeight(14)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setStyleSheet(
+            """
+            QProgressBar { background-color: #3c3c3c; border-radius: 5px; }
+            QProgressBar::chunk { background-color: #007acc; border-radius: 5px; }
+        """
+        )
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setStyleSheet("color: #d4d4d4;")
+        self.progress_bar.hide()
+        self.status_label.hide()
+        name_size_layout.addWidget(self.progress_bar)
+        name_size_layout.addWidget(self.status_label)
         layout.addLayout(name_size_layout)
 
         # Action Buttons
@@ -88,10 +110,55 @@ class DownloadItemWidget(QtWidgets.QWidget):
 
         self.setLayout(layout)
         self.setStyleSheet("background-color: #2c2c2c; border-radius: 10px;")
-        self.setMaximumHeight(100)
+        self.setMaximumHeight(120)
+
+        if self.downloads is not None:
+            self.downloads.download_changed.connect(self.on_download_changed)
+            # Show a download of this file that is running or was queued
+            # in an earlier session
+            download = self.downloads.manager.find(self.fileurl)
+            if download is not None:
+                self.download_id = download.id
+                self.update_progress(download.to_dict())
 
     def on_download_clicked(self):
         self.download_requested.emit(self.filename, self.fileurl)
+        if self.downloads is not None:
+            download = self.downloads.manager.find(self.fileurl)
+            if download is not None and download.id != self.download_id:
+                self.download_id = download.id
+                self.update_progress(download.to_dict())
+
+    @QtCore.pyqtSlot(dict)
+    def on_download_changed(self, download):
+        if download["id"] == self.download_id:
+            self.update_progress(download)
+
+    def update_progress(self, download):
+        status = download["status"]
+        self.progress_bar.show()
+        self.status_label.show()
+        if download["progress"] is None:
+            # Unknown size, the bar shows activity only
+            self.progress_bar.setRange(0, 0 if status == ACTIVE else 100)
+        else:
+            self.progress_bar.setRange(0, 100)
+            self.progress_bar.setValue(download["progress"])
+
+        if status == ACTIVE:
+            text = f"{download['progress'] or 0}% - {human_readable_speed(download['speed'])}"
+        elif status == QUEUED:
+            text = "Queued"
+        elif status == DONE:
+            text = "Downloaded"
+        elif status == FAILED:
+            text = f"Failed: {download['error']}"
+        elif status == CANCELLED:
+            text = "Cancelled"
+        else:
+            text = status
+        self.status_label.setText(text)
+        self.download_button.setEnabled(status not in (ACTIVE, QUEUED))
 
     @staticmethod
     def human_readable_size(size, decimal_places=2):
@@ -0,0 +1,29 @@
+# Filename: downloads.py
+from PyQt6 import QtCore
+
+
+def human_readable_speed(speed):
+    for unit in ["B/s", "KB/s", "MB/s", "GB/s"]:
+        if speed < 1024.0:
+            return f"{speed:.1f} {unit}"
+        speed /= 1024.0
+    return f"{speed:.1f} TB/s"
+
+
+class DownloadBridge(QtCore.QObject):
+    """
+    Re-emits the progress of a DownloadManager as a Qt signal.
+
+    The manager notifies from its worker threads, the signal carries a
+    snapshot dict of the download and is delivered on the GUI thread.
+    """
+
+    download_changed = QtCore.pyqtSignal(dict)
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        manager.add_listener(self.on_download_changed)
+
+    def on_download_changed(self, download):
+        self.download_changed.emit(download.to_dict())
@@ -0,0 +1,141 @@
+# Filename: downloads_panel.py
+from PyQt6 import QtWidgets, QtCore, QtGui
+from .downloads import human_readable_speed
+from ..moodle.downloads import ACTIVE, QUEUED, FINISHED
+import os
+
+
+class DownloadsPanel(QtWidgets.QWidget):
+    COLUMNS = ["File", "Status", "Progress", "Speed", "Location"]
+    # Active transfers first, then the queue, then finished ones
+    ORDER = {ACTIVE: 0, QUEUED: 1}
+
+    def __init__(self, downloads, parent=None):
+        super().__init__(parent)
+        self.downloads = downloads
+        self.rows = {}
+        self.init_ui()
+        self.populate()
+        self.downloads.download_changed.connect(self.on_download_changed)
+
+    def init_ui(self):
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(20)
+
+        # Title
+        title = QtWidgets.QLabel("Downloads")
+        title.setStyleSheet("color: white; font-size: 24px; font-weight: bold;")
+        layout.addWidget(title)
+
+        self.summary_label = QtWidgets.QLabel()
+        self.summary_label.setStyleSheet("color: #d4d4d4; font-size: 14px;")
+        layout.addWidget(self.summary_label)
+
+        self.table = QtWidgets.QTableWidget()
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(
+            QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows
+        )
+        self.table.setStyleSheet("color: #d4d4d4;")
+        layout.addWidget(self.table)
+
+        # Buttons
+        buttons_layout = QtWidgets.QHBoxLayout()
+        cancel_button = QtWidgets.QPushButton("Cancel")
+        cancel_button.clicked.connect(self.cancel_selected)
+        retry_button = QtWidgets.QPushButton("Retry")
+        retry_button.clicked.connect(self.retry_selected)
+        open_button = QtWidgets.QPushButton("Open Folder")
+        open_button.clicked.connect(self.open_selected_folder)
+        clear_button = QtWidgets.QPushButton("Clear Finished")
+        clear_button.clicked.connect(self.clear_finished)
+        for button in (cancel_button, retry_button, open_button, clear_button):
+            buttons_layout.addWidget(button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+        self.setLayout(layout)
+
+    def populate(self):
+        downloads = sorted(
+            (download.to_dict() for download in self.downloads.manager.downloads()),
+            key=lambda d: (self.ORDER.get(d["status"], 2), -d["created_at"]),
+        )
+        self.rows = {}
+        self.table.setRowCount(len(downloads))
+        for row, download in enumerate(downloads):
+            self.rows[download["id"]] = (row, download["status"])
+            self.update_row(row, download)
+        self.update_summary()
+
+    def update_row(self, row, download):
+        progress = "" if download["progress"] is None else f"{download['progress']}%"
+        speed = human_readable_speed(download["speed"]) if download["status"] == ACTIVE else ""
+        status = download["status"].capitalize()
+        if download["error"] and download["status"] not in FINISHED:
+            status += " (retrying)"
+        values = [
+            download["filename"],
+            status,
+            progress,
+            speed,
+            os.path.dirname(download["path"]),
+        ]
+        for column, value in enumerate(values):
+            item = self.table.item(row, column)
+            if item is None:
+                item = QtWidgets.QTableWidgetItem()
+                self.table.setItem(row, column, item)
+            item.setText(value)
+        self.table.item(row, 0).setData(QtCore.Qt.ItemDataRole.UserRole, download["id"])
+        self.table.item(row, 1).setToolTip(download["error"])
+
+    def update_summary(self):
+        downloads = self.downloads.manager.downloads()
+        active = sum(download.status == ACTIVE for download in downloads)
+        queued = sum(download.status == QUEUED for download in downloads)
+        speed = sum(download.speed for download in downloads if download.status == ACTIVE)
+        self.summary_label.setText(
+            f"{active} active, {queued} queued, {len(downloads) - active - queued} finished"
+            f", {human_readable_speed(speed)}"
+        )
+
+    @QtCore.pyqtSlot(dict)
+    def on_download_changed(self, download):
+        row, status = self.rows.get(download["id"], (None, None))
+        if status != download["status"]:
+            # New downloads and status changes reorder the table
+            self.populate()
+        else:
+            self.update_row(row, download)
+            self.update_summary()
+
+    def selected_ids(self):
+        rows = {index.row() for index in self.table.selectionModel().selectedRows()}
+        return [
+            self.table.item(row, 0).data(QtCore.Qt.ItemDataRole.UserRole) for row in rows
+        ]
+
+    def cancel_selected(self):
+        for download_id in self.selected_ids():
+            self.downloads.manager.cancel(download_id)
+
+    def retry_selected(self):
+        for download_id in self.selected_ids():
+            self.downloads.manager.retry(download_id)
+
+    def open_selected_folder(self):
+        for download_id in self.selected_ids()[:1]:
+            download = self.downloads.manager.get(download_id)
+            QtGui.QDesktopServices.openUrl(
+                QtCore.QUrl.fromLocalFile(os.path.dirname(download.path))
+            )
+
+    def clear_finished(self):
+        self.downloads.manager.remove_finished()
+        self.populate()
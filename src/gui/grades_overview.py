@@ -3,10 +3,14 @@ from PyQt6 import QtWidgets, QtCore
 
 
 class GradesOverview(QtWidgets.QWidget):
-    def __init__(self, moodle_api, course_id, parent=None):
+    grades_loaded = QtCore.pyqtSignal(object)
+
+    def __init__(self, moodle_api, course_id, parent=None, autoload=True):
         super().__init__(parent)
         self.moodle_api = moodle_api
         self.course_id = course_id
+        # Set autoload to False when the grades are passed to display_grades
+        self.autoload = autoload
         self.init_ui()
 
     def init_ui(self):
@@ -26,10 +30,19 @@ class GradesOverview(QtWidgets.QWidget):
         layout.addWidget(self.table)
 
         # Fetch and populate grades
-        self.fetch_and_display_grades()
+        self.grades_loaded.connect(self.display_grades)
+        if self.autoload:
+            self.fetch_and_display_grades()
 
     def fetch_and_display_grades(self):
-        grades_data = self.moodle_api.get_user_grades(self.course_id)
+        # Fetched on the thread pool, the constructor returns at once
+        QtCore.QThreadPool.globalInstance().start(self.fetch_grades)
+
+    def fetch_grades(self):
+        self.grades_loaded.emit(self.moodle_api.get_user_grades(self.course_id))
+
+    @QtCore.pyqtSlot(object)
+    def display_grades(self, grades_data):
         if not grades_data or "usergrades" not in grades_data:
             QtWidgets.QMessageBox.warning(self, "Error", "Could not fetch grades.")
             return
@@ -1,17 +1,57 @@
 # Filename: main_window.py
 from PyQt6 import QtWidgets, QtCore, QtGui
 from .dashboard import Dashboard
-from .course_detail import CourseDetail
-from .settings import SettingsWidget
+from .config import Config
+from .widgets import ImageCache
+from .downloads import DownloadBridge
+from ..moodle.downloads import DownloadManager
+from ..moodle.sync import SyncEngine
 import os
 import sys
 
+
+class WarmupSignals(QtCore.QObject):
+    site_info_loaded = QtCore.pyqtSignal(dict)
+    error = QtCore.pyqtSignal()
+
+
+class WarmupRunnable(QtCore.QRunnable):
+    def __init__(self, sync):
+        super().__init__()
+        self.sync = sync
+        self.signals = WarmupSignals()
+
+    @QtCore.pyqtSlot()
+    def run(self):
+        try:
+            moodle_api = self.sync.moodle_api
+            # Open the connection before the first real request needs it
+            moodle_api.transport.prewarm(moodle_api.url)
+            site_info = self.sync.sync_site_info()
+            if site_info is None:
+                self.signals.error.emit()
+            else:
+                self.signals.site_info_loaded.emit(site_info)
+        except Exception as e:
+            print(f"Error warming up: {e}")
+            self.signals.error.emit()
+
+
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self, moodle_api, token):
+    def __init__(self, moodle_api, token, sync=None):
         super().__init__()
         self.moodle_api = moodle_api
         self.token = token
+        # Offline mirror shared by the dashboard and the course pages
+        self.sync = sync or SyncEngine(moodle_api)
+        # File downloads of all course pages, queued and capped in one place
+        self.downloads = DownloadBridge(DownloadManager(moodle_api), self)
+        QtWidgets.QApplication.instance().aboutToQuit.connect(
+            self.downloads.manager.close
+        )
         self.init_ui()
+        # Network warm-up starts once the window has been painted
+        QtCore.QTimer.singleShot(0, self.start_warmup)
 
     def init_ui(self):
         self.setWindowTitle("Moodle Desktop Client")
@@ -45,6 +85,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.settings_button.setFixedHeight(50)
         self.settings_button.setStyleSheet(self.get_sidebar_button_style())
 
+        self.downloads_button = QtWidgets.QPushButton("Downloads")
+        self.downloads_button.setIconSize(QtCore.QSize(24, 24))
+        self.downloads_button.setFixedHeight(50)
+        self.downloads_button.setStyleSheet(self.get_sidebar_button_style())
+
+        self.network_button = QtWidgets.QPushButton("Network")
+        self.network_button.setIconSize(QtCore.QSize(24, 24))
+        self.network_button.setFixedHeight(50)
+        self.network_button.setStyleSheet(self.get_sidebar_button_style())
+
         self.logout_button = QtWidgets.QPushButton("Logout")
         self.logout_button.setIcon(QtGui.QIcon("icons/logout.png"))
         self.logout_button.setIconSize(QtCore.QSize(24, 24))
@@ -54,12 +104,16 @@ class MainWindow(QtWidgets.QMainWindow):
         # Add buttons to sidebar
         sidebar_layout.addWidget(self.dashboard_button)
         sidebar_layout.addWidget(self.settings_button)
+        sidebar_layout.addWidget(self.downloads_button)
+        sidebar_layout.addWidget(self.network_button)
         sidebar_layout.addStretch()
         sidebar_layout.addWidget(self.logout_button)
 
         # Connect sidebar buttons
         self.dashboard_button.clicked.connect(self.open_dashboard_tab)
         self.settings_button.clicked.connect(self.open_settings_tab)
+        self.downloads_button.clicked.connect(self.open_downloads_tab)
+        self.network_button.clicked.connect(self.open_network_tab)
         self.logout_button.clicked.connect(self.logout)
 
         # Main content area with QTabWidget
@@ -103,6 +157,26 @@ class MainWindow(QtWidgets.QMainWindow):
         # Open Dashboard tab by default
         self.open_dashboard_tab()
 
+    def start_warmup(self):
+        self.statusBar().showMessage("Connecting...")
+        runnable = WarmupRunnable(self.sync)
+        runnable.signals.site_info_loaded.connect(self.on_site_info_loaded)
+        runnable.signals.error.connect(self.on_warmup_error)
+        # Ahead of the image loads queued by the dashboard
+        QtCore.QThreadPool.globalInstance().start(runnable, priority=10)
+        # Continue the downloads left unfinished by the last run
+        self.downloads.manager.resume()
+
+    @QtCore.pyqtSlot(dict)
+    def on_site_info_loaded(self, site_info):
+        self.statusBar().showMessage(
+            f"Signed in as {site_info.get('fullname', '')} on {site_info.get('sitename', '')}"
+        )
+
+    @QtCore.pyqtSlot()
+    def on_warmup_error(self):
+        self.statusBar().showMessage("Offline, showing saved data")
+
     def get_sidebar_button_style(self):
         return """
             QPushButton {
@@ -128,7 +202,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.tab_widget.setCurrentIndex(index)
                 return
 
-        dashboard = Dashboard(self.moodle_api)
+        dashboard = Dashboard(self.moodle_api, sync=self.sync)
         dashboard.course_selected.connect(self.open_course_detail_tab)
         self.tab_widget.addTab(dashboard, "Dashboard")
         self.tab_widget.setCurrentWidget(dashboard)
@@ -140,13 +214,42 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.tab_widget.setCurrentIndex(index)
                 return
 
+        # Views that are not shown at startup are imported on first use
+        from .settings import SettingsWidget
+
         settings = SettingsWidget(self.moodle_api)
         settings.settings_saved.connect(self.handle_settings_saved)
         self.tab_widget.addTab(settings, "Settings")
         self.tab_widget.setCurrentWidget(settings)
 
+    def open_downloads_tab(self):
+        # Check if Downloads tab already exists
+        for index in range(self.tab_widget.count()):
+            if self.tab_widget.tabText(index) == "Downloads":
+                self.tab_widget.setCurrentIndex(index)
+                return
+
+        from .downloads_panel import DownloadsPanel
+
+        panel = DownloadsPanel(self.downloads)
+        self.tab_widget.addTab(panel, "Downloads")
+        self.tab_widget.setCurrentWidget(panel)
+
+    def open_network_tab(self):
+        # Check if Network tab already exists
+        for index in range(self.tab_widget.count()):
+            if self.tab_widget.tabText(index) == "Network":
+                self.tab_widget.setCurrentIndex(index)
+                return
+
+        from .network_stats import NetworkStatsWidget
+
+        network = NetworkStatsWidget(self.moodle_api)
+        self.tab_widget.addTab(network, "Network")
+        self.tab_widget.setCurrentWidget(network)
+
     def open_course_detail_tab(self, course):
-        course_name = course.get("shortname", "Course Detail")
+        course_name = course.shortname or "Course Detail"
         # Create a unique tab name
         tab_name = course_name
         existing_tabs = [
@@ -157,7 +260,15 @@ class MainWindow(QtWidgets.QMainWindow):
             self.tab_widget.setCurrentIndex(index)
             return
 
-        course_detail = CourseDetail(self.moodle_api, course, token=self.token)
+        from .course_detail import CourseDetail
+
+        course_detail = CourseDetail(
+            self.moodle_api,
+            course,
+            token=self.token,
+            sync=self.sync,
+            downloads=self.downloads,
+        )
         course_detail.back_requested.connect(self.close_current_tab)
         self.tab_widget.addTab(course_detail, tab_name)
         self.tab_widget.setCurrentWidget(course_detail)
@@ -191,9 +302,17 @@ class MainWindow(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.StandardButton.No,
         )
         if reply == QtWidgets.QMessageBox.StandardButton.Yes:
-            # Remove token and restart the application
+            # Remove the token, cached responses, images and the offline
+            # mirror and restart the application
             if os.path.exists("token.pkl"):
                 os.remove("token.pkl")
+            self.moodle_api.logout()
+            self.sync.mirror.clear()
+            ImageCache.clear()
+            # Running downloads keep their partial files and continue later
+            self.downloads.manager.close()
+            # exec skips the exit handlers that flush the config
+            Config.instance().flush()
             QtCore.QCoreApplication.quit()
             os.execl(sys.executable, sys.executable, *sys.argv)
 
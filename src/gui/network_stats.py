@@ -0,0 +1,158 @@
+# Filename: network_stats.py
+from PyQt6 import QtWidgets, QtCore
+
+
+class NetworkStatsWidget(QtWidgets.QWidget):
+    COLUMNS = [
+        "Function",
+        "Requests",
+        "Errors",
+        "Cache Hits",
+        "Retries",
+        "Coalesced",
+        "Avg ms",
+        "p50 ms",
+        "p95 ms",
+        "Max ms",
+        "KB",
+    ]
+
+    def __init__(self, moodle_api, parent=None):
+        super().__init__(parent)
+        self.moodle_api = moodle_api
+        self.init_ui()
+
+        # Refresh the tables while the panel is visible
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+
+    def init_ui(self):
+        layout = QtWidgets.QVBoxLayout()
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(20)
+
+        # Title
+        title = QtWidgets.QLabel("Network")
+        title.setStyleSheet("color: white; font-size: 24px; font-weight: bold;")
+        layout.addWidget(title)
+
+        self.summary_label = QtWidgets.QLabel()
+        self.summary_label.setStyleSheet("color: #d4d4d4; font-size: 14px;")
+        layout.addWidget(self.summary_label)
+
+        # Per wsfunction table
+        layout.addWidget(QtWidgets.QLabel("Requests per function:"))
+        self.functions_table = self.create_table(self.COLUMNS)
+        layout.addWidget(self.functions_table, 2)
+
+        # Per course table, sorted by total time
+        layout.addWidget(QtWidgets.QLabel("Slowest courses:"))
+        self.courses_table = self.create_table(
+            ["Course", "Requests", "Total ms", "Max ms", "KB"]
+        )
+        layout.addWidget(self.courses_table, 1)
+
+        # Buttons
+        buttons_layout = QtWidgets.QHBoxLayout()
+        export_button = QtWidgets.QPushButton("Export JSON")
+        export_button.clicked.connect(self.export_json)
+        reset_button = QtWidgets.QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        buttons_layout.addWidget(export_button)
+        buttons_layout.addWidget(reset_button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+        self.setLayout(layout)
+
+    def create_table(self, columns):
+        table = QtWidgets.QTableWidget()
+        table.setColumnCount(len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.horizontalHeader().setStretchLastSection(True)
+        table.verticalHeader().setVisible(False)
+        table.setEditTriggers(QtWidgets.QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.setStyleSheet("color: #d4d4d4;")
+        return table
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.timer.stop()
+
+    def refresh(self):
+        snapshot = self.moodle_api.metrics.snapshot()
+        functions = sorted(
+            snapshot["functions"].items(),
+            key=lambda item: item[1]["total_time"],
+            reverse=True,
+        )
+
+        self.functions_table.setRowCount(len(functions))
+        for row, (name, stats) in enumerate(functions):
+            values = [
+                name,
+                stats["requests"],
+                stats["errors"],
+                stats["cache_hits"],
+                stats["retries"],
+                stats["coalesced"],
+                f"{stats['avg_time'] * 1000:.0f}",
+                f"{stats['p50'] * 1000:.0f}",
+                f"{stats['p95'] * 1000:.0f}",
+                f"{stats['max_time'] * 1000:.0f}",
+                f"{stats['bytes'] / 1024:.1f}",
+            ]
+            for column, value in enumerate(values):
+                self.functions_table.setItem(
+                    row, column, QtWidgets.QTableWidgetItem(str(value))
+                )
+        self.functions_table.resizeColumnsToContents()
+
+        courses = sorted(
+            snapshot["courses"].items(),
+            key=lambda item: item[1]["total_time"],
+            reverse=True,
+        )[:20]
+        self.courses_table.setRowCount(len(courses))
+        for row, (course_id, stats) in enumerate(courses):
+            values = [
+                course_id,
+                stats["requests"],
+                f"{stats['total_time'] * 1000:.0f}",
+                f"{stats['max_time'] * 1000:.0f}",
+                f"{stats['bytes'] / 1024:.1f}",
+            ]
+            for column, value in enumerate(values):
+                self.courses_table.setItem(
+                    row, column, QtWidgets.QTableWidgetItem(str(value))
+                )
+
+        total_requests = sum(stats["requests"] for _, stats in functions)
+        total_bytes = sum(stats["bytes"] for _, stats in functions)
+        self.summary_label.setText(
+            f"{total_requests} calls, {total_bytes / 1024:.1f} KB received, "
+            f"{self.moodle_api.singleflight.saved} duplicate requests saved"
+        )
+
+    def export_json(self):
+        save_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Network Stats", "network_stats.json", "JSON Files (*.json)"
+        )
+        if not save_path:
+            return
+        try:
+            self.moodle_api.metrics.dump(save_path)
+        except OSError as e:
+            QtWidgets.QMessageBox.warning(
+                self, "Export Failed", f"Could not write {save_path}: {e.strerror}"
+            )
+
+    def reset(self):
+        self.moodle_api.metrics.reset()
+        self.refresh()
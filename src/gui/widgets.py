@@ -1,320 +1,363 @@
 # Filename: widgets.py
-from PyQt6 import QtWidgets, QtGui, QtCore
-import requests
-import random
+from PyQt6 import QtGui, QtCore
+from ..moodle.transport import HttpTransport, redact
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
 import os
+import tempfile
+import threading
+
+THUMBNAIL_DIR = os.path.join("cache", "thumbnails")
+# Bytes of decoded pixmaps kept in memory
+MEMORY_BUDGET = 32 * 1024 * 1024
+# Bytes of thumbnails kept on disk, the least recently used are removed
+DISK_BUDGET = 64 * 1024 * 1024
+TOKEN_PARAMS = ("token", "wstoken")
+# Image requests running at the same time, shared by all loaders
+MAX_IMAGE_DOWNLOADS = 4
+
+
+def strip_token(url):
+    parts = urlsplit(url)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TOKEN_PARAMS
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class ImageVariant:
+    """
+    How an image is rendered: the target size, whether it is cropped to fill
+    the size or fitted into it, and the radius of its rounded corners.
+    """
+
+    __slots__ = ("size", "crop", "radius", "top_only")
+
+    def __init__(self, size, crop=False, radius=0, top_only=False):
+        self.size = size
+        self.crop = crop
+        self.radius = radius
+        # Only round the top corners, e.g. for images above a text block
+        self.top_only = top_only
+
+    def key(self):
+        mode = "crop" if self.crop else "fit"
+        corners = "top" if self.top_only else "all"
+        return f"{self.size.width()}x{self.size.height()}|{mode}|{self.radius}{corners}"
+
+
+def image_key(url, timemodified=0, variant=None):
+    # The token is not part of the key, so cached images survive a new login
+    key = f"{strip_token(url)}|{timemodified}"
+    if variant is not None:
+        key += f"|{variant.key()}"
+    return key
+
+
+def render_image(data, variant=None):
+    """
+    Decodes image data straight to the size of `variant` and rounds its
+    corners. Only uses QImage, so it runs in worker threads.
+    """
+    buffer = QtCore.QBuffer()
+    buffer.setData(data)
+    buffer.open(QtCore.QIODevice.OpenModeFlag.ReadOnly)
+    reader = QtGui.QImageReader(buffer)
+    reader.setAutoTransform(True)
+
+    source = reader.size()
+    if variant is not None and source.isValid():
+        mode = (
+            QtCore.Qt.AspectRatioMode.KeepAspectRatioByExpanding
+            if variant.crop
+            else QtCore.Qt.AspectRatioMode.KeepAspectRatio
+        )
+        scaled = source.scaled(variant.size, mode)
+        # Decoders like JPEG skip work when decoding to a smaller size
+        reader.setScaledSize(scaled)
+        if variant.crop:
+            width = min(variant.size.width(), scaled.width())
+            height = min(variant.size.height(), scaled.height())
+            reader.setScaledClipRect(
+                QtCore.QRect(
+                    (scaled.width() - width) // 2,
+                    (scaled.height() - height) // 2,
+                    width,
+                    height,
+                )
+            )
+
+    image = reader.read()
+    if image.isNull() or variant is None or not variant.radius:
+        return image
+    return round_corners(image, variant.radius, variant.top_only)
+
+
+def round_corners(image, radius, top_only=False):
+    rounded = QtGui.QImage(image.size(), QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    rounded.fill(QtCore.Qt.GlobalColor.transparent)
+
+    painter = QtGui.QPainter(rounded)
+    painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+    # With top_only the bottom corners lie below the image
+    height = image.height() + (radius if top_only else 0)
+    path = QtGui.QPainterPath()
+    path.addRoundedRect(QtCore.QRectF(0, 0, image.width(), height), radius, radius)
+    painter.setClipPath(path)
+    painter.drawImage(0, 0, image)
+    painter.end()
+
+    return rounded
 
 
 class ImageCache:
-    _cache = {}
+    """
+    Two tier cache of course images.
+
+    Pixmaps are kept in memory in least recently used order, bounded by
+    MEMORY_BUDGET bytes. Rendered variants (scaled, cropped and rounded)
+    are stored as PNG files below THUMBNAIL_DIR, keyed by the url without
+    the token, the timemodified of the file and the variant, so images
+    show up on a cold start without a request and are fetched again once
+    the file changes. Reading a thumbnail touches it, once the directory
+    grows beyond DISK_BUDGET bytes the least recently used are removed,
+    which also drops thumbnails of old file versions.
+    """
+
+    budget = MEMORY_BUDGET
+    disk_budget = DISK_BUDGET
+    directory = THUMBNAIL_DIR
+    _cache = OrderedDict()
+    _bytes = 0
+    # Bytes in the directory, counted on the first write
+    _disk_bytes = None
+    _disk_lock = threading.Lock()
+
+    @staticmethod
+    def cost(pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
 
     @classmethod
-    def get(cls, url):
-        return cls._cache.get(url)
+    def get(cls, key):
+        pixmap = cls._cache.get(key)
+        if pixmap is not None:
+            cls._cache.move_to_end(key)
+        return pixmap
 
     @classmethod
-    def add(cls, url, pixmap):
-        cls._cache[url] = pixmap
+    def add(cls, key, pixmap):
+        if key in cls._cache:
+            cls._bytes -= cls.cost(cls._cache.pop(key))
+        cls._cache[key] = pixmap
+        cls._bytes += cls.cost(pixmap)
+        # Evict the least recently used pixmaps, the new one always stays
+        while cls._bytes > cls.budget and len(cls._cache) > 1:
+            _, evicted = cls._cache.popitem(last=False)
+            cls._bytes -= cls.cost(evicted)
+
+    @classmethod
+    def path(cls, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(cls.directory, f"{digest}.png")
+
+    @classmethod
+    def load_thumbnail(cls, key):
+        # QImage is safe to use off the GUI thread
+        path = cls.path(key)
+        if not os.path.exists(path):
+            return None
+        image = QtGui.QImage(path)
+        if image.isNull():
+            return None
+        try:
+            # The modification time orders thumbnails by last use
+            os.utime(path)
+        except OSError:
+            pass
+        return image
+
+    @classmethod
+    def save_thumbnail(cls, key, image):
+        try:
+            os.makedirs(cls.directory, exist_ok=True)
+            # Written next to the target and renamed, readers never see a
+            # partial file
+            fd, temp_path = tempfile.mkstemp(dir=cls.directory, suffix=".tmp")
+            os.close(fd)
+            if image.save(temp_path, "PNG"):
+                size = os.path.getsize(temp_path)
+                os.replace(temp_path, cls.path(key))
+                cls._account(size)
+            else:
+                os.remove(temp_path)
+        except OSError as e:
+            print(f"Could not save thumbnail: {e}")
+
+    @classmethod
+    def _account(cls, size):
+        with cls._disk_lock:
+            if cls._disk_bytes is None:
+                cls._disk_bytes = sum(size for _, size, _ in cls._thumbnails())
+            else:
+                cls._disk_bytes += size
+            if cls._disk_bytes > cls.disk_budget:
+                cls._prune()
+
+    @classmethod
+    def _thumbnails(cls):
+        # (last use, size, path) of every thumbnail
+        entries = []
+        for entry in os.scandir(cls.directory):
+            if entry.name.endswith(".png"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    @classmethod
+    def _prune(cls):
+        # Called with the disk lock held, removes down to 3/4 of the budget
+        # so the next writes do not prune again right away
+        entries = sorted(cls._thumbnails())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= cls.disk_budget * 3 // 4:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                print(f"Could not remove thumbnail {path}: {e}")
+        cls._disk_bytes = total
+
+    @classmethod
+    def clear(cls):
+        cls._cache.clear()
+        cls._bytes = 0
+        cls._disk_bytes = None
+        if not os.path.isdir(cls.directory):
+            return
+        for name in os.listdir(cls.directory):
+            if name.endswith(".png"):
+                try:
+                    os.remove(os.path.join(cls.directory, name))
+                except OSError as e:
+                    print(f"Could not remove thumbnail {name}: {e}")
 
 
 class ImageLoaderSignals(QtCore.QObject):
-    image_loaded = QtCore.pyqtSignal(QtGui.QPixmap)
+    image_loaded = QtCore.pyqtSignal(str, QtGui.QImage)
 
 
 class ImageLoaderRunnable(QtCore.QRunnable):
-    def __init__(self, url, token):
+    def __init__(self, url, token, key, variant=None):
         super().__init__()
-        self.url = f"{url}?token={token}"
+        self.url = url
+        self.token = token
+        self.key = key
+        self.variant = variant
         self.signals = ImageLoaderSignals()
 
     @QtCore.pyqtSlot()
     def run(self):
+        # QPixmap may only be used on the GUI thread, images are decoded
+        # and rendered into a QImage here and converted on the GUI thread
+        image = ImageCache.load_thumbnail(self.key)
+        if image is not None:
+            self.signals.image_loaded.emit(self.key, image)
+            return
+
         try:
-            response = requests.get(self.url, timeout=10)
+            response = HttpTransport.instance().get(
+                self.url, params={"token": self.token}
+            )
             response.raise_for_status()
-            pixmap = QtGui.QPixmap()
-            if pixmap.loadFromData(response.content):
-                ImageCache.add(self.url, pixmap)
-                self.signals.image_loaded.emit(pixmap)
-            else:
-                pixmap = QtGui.QPixmap(180, 130)
-                pixmap.fill(QtGui.QColor("gray"))
-                self.signals.image_loaded.emit(pixmap)
+            image = render_image(response.content, self.variant)
         except Exception as e:
-            print(f"Failed to load image from {self.url}: {e}")
-            pixmap = QtGui.QPixmap(180, 130)
-            pixmap.fill(QtGui.QColor("gray"))
-            self.signals.image_loaded.emit(pixmap)
+            # Request errors contain the url with the token
+            print(f"Failed to load image {self.key}: {redact(e)}")
+            self.signals.image_loaded.emit(self.key, QtGui.QImage())
+            return
+
+        if not image.isNull():
+            ImageCache.save_thumbnail(self.key, image)
+        self.signals.image_loaded.emit(self.key, image)
+
+
+class ImageFetches(QtCore.QObject):
+    """
+    Registry of the image fetches in flight.
+
+    A loader asking for an image that is already being fetched subscribes
+    to that fetch, every subscriber gets the same pixmap once it arrives.
+    Fetches run on their own thread pool, at most MAX_IMAGE_DOWNLOADS at a
+    time, so a large course grid does not flood the server.
+    """
+
+    _instance = None
+
+    def __init__(self, max_downloads=MAX_IMAGE_DOWNLOADS):
+        super().__init__()
+        # Image key -> loaders waiting for it
+        self.subscribers = {}
+        self.threadpool = QtCore.QThreadPool(self)
+        self.threadpool.setMaxThreadCount(max_downloads)
+
+    @classmethod
+    def instance(cls):
+        # Only used on the GUI thread
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def fetch(self, loader):
+        subscribers = self.subscribers.get(loader.key)
+        if subscribers is not None:
+            subscribers.append(loader)
+            return
+        self.subscribers[loader.key] = [loader]
+        runnable = ImageLoaderRunnable(loader.url, loader.token, loader.key, loader.variant)
+        runnable.signals.image_loaded.connect(self.on_image_loaded)
+        self.threadpool.start(runnable)
+
+    @QtCore.pyqtSlot(str, QtGui.QImage)
+    def on_image_loaded(self, key, image):
+        pixmap = None
+        if not image.isNull():
+            pixmap = QtGui.QPixmap.fromImage(image)
+            ImageCache.add(key, pixmap)
+        for loader in self.subscribers.pop(key, []):
+            loader.deliver(pixmap)
 
 
 class ImageLoader(QtCore.QObject):
     image_loaded = QtCore.pyqtSignal(QtGui.QPixmap)
 
-    def __init__(self, url, token):
+    def __init__(self, url, token, timemodified=0, variant=None):
         super().__init__()
         self.url = url
         self.token = token
-        self.threadpool = QtCore.QThreadPool.globalInstance()
+        # How the image is shown, images are cached as rendered
+        self.variant = variant
+        self.key = image_key(url, timemodified, variant)
+        self.failed = False
 
     def load(self):
-        cached_pixmap = ImageCache.get(f"{self.url}?token={self.token}")
+        cached_pixmap = ImageCache.get(self.key)
         if cached_pixmap:
             self.image_loaded.emit(cached_pixmap)
             return
+        ImageFetches.instance().fetch(self)
 
-        runnable = ImageLoaderRunnable(self.url, self.token)
-        runnable.signals.image_loaded.connect(self.image_loaded.emit)
-        self.threadpool.start(runnable)
-
-
-class CourseTile(QtWidgets.QWidget):
-    clicked = QtCore.pyqtSignal(dict)
-    favorite_changed = QtCore.pyqtSignal()
-
-    def __init__(self, course, token, config, parent=None):
-        super().__init__(parent)
-        self.course = course
-        self.token = token
-        self.config = config
-        self.init_ui()
-
-    def init_ui(self):
-        self.setFixedSize(300, 200)
-        self.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
-
-        # Create main layout
-        main_layout = QtWidgets.QVBoxLayout()
-        main_layout.setContentsMargins(0, 0, 0, 0)
-        main_layout.setSpacing(0)
-        self.setLayout(main_layout)
-
-        # Background Frame
-        self.background = QtWidgets.QFrame()
-        self.background.setStyleSheet(
-            """
-            QFrame {
-                background-color: #2c2c2c;
-                border-radius: 10px;
-                border: 2px solid #444;
-            }
-        """
-        )
-        self.background.setFixedSize(300, 200)
-        main_layout.addWidget(self.background)
-
-        # Image Label
-        self.image_label = QtWidgets.QLabel(self.background)
-        self.image_label.setFixedSize(300, 130)
-        self.image_label.setAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-        self.image_label.setStyleSheet(
-            "border-top-left-radius: 10px; border-top-right-radius: 10px;"
-        )
-
-        # Overlay for Data Block
-        self.data_block = QtWidgets.QFrame(self.background)
-        self.data_block.setGeometry(0, 130, 300, 70)
-        self.data_block.setStyleSheet(
-            """
-            QFrame {
-                background-color: #3c3c3c;
-                border-bottom-left-radius: 10px;
-                border-bottom-right-radius: 10px;
-                border: 1px solid #444;
-            }
-        """
-        )
-
-        data_layout = QtWidgets.QVBoxLayout()
-        data_layout.setContentsMargins(10, 5, 10, 5)
-        data_layout.setSpacing(5)
-        self.data_block.setLayout(data_layout)
-
-        # Course Shortname
-        self.shortname = QtWidgets.QLabel(self.course.get("shortname", ""))
-        self.shortname.setStyleSheet(
-            """
-            color: white; 
-            font-weight: bold; 
-            font-size: 16px; 
-            background-color: #3c3c3c; 
-            margin: 0px;
-            padding: 0px;
-            border: none;
-            """
-        )
-        # Course Fullname
-        self.fullname = QtWidgets.QLabel(self.course.get("fullname", ""))
-        self.fullname.setStyleSheet(
-            """
-            color: #d4d4d4; 
-            font-size: 12px; 
-            background-color: #3c3c3c; 
-            margin: 0px; 
-            padding: 0px;
-            border: none;
-            """
-        )
-        # Enrolled User Count
-        self.enrolled = QtWidgets.QLabel(
-            f"Enrolled: {self.course.get('enrolledusercount', 0)}"
-        )
-        self.enrolled.setStyleSheet(
-            """
-            color: #d4d4d4; 
-            font-size: 12px; 
-            background-color: #3c3c3c; 
-            margin: 0px; 
-            padding: 0px;
-            border: none;
-            """
-        )
-
-        # Add labels to data layout
-        data_layout.addWidget(self.shortname)
-        data_layout.addWidget(self.fullname)
-        data_layout.addWidget(self.enrolled)
-
-        # Favorite button
-        self.favorite_button = QtWidgets.QPushButton(self.background)
-        self.favorite_button.setFixedSize(24, 24)
-        self.favorite_button.move(self.width() - 34, 10)
-        self.favorite_button.setStyleSheet(
-            "background-color: transparent; border: none;"
-        )
-        self.favorite_button.setCursor(QtCore.Qt.CursorShape.PointingHandCursor)
-        self.update_favorite_status()
-        self.favorite_button.clicked.connect(self.toggle_favorite)
-
-        # Update indicator
-        if self.course.get("has_update"):
-            self.update_icon = QtWidgets.QLabel(self.background)
-            self.update_icon.setFixedSize(24, 24)
-            self.update_icon.move(10, 10)
-            self.update_icon.setAttribute(
-                QtCore.Qt.WidgetAttribute.WA_TranslucentBackground
-            )
-            icon_path = "icons/update.png"
-            if os.path.exists(icon_path):
-                icon = QtGui.QIcon(icon_path)
-                pixmap = icon.pixmap(24, 24)
-                self.update_icon.setPixmap(pixmap)
-            else:
-                self.update_icon.setPixmap(QtGui.QPixmap())
-        else:
-            self.update_icon = None
-
-        # Load image or apply gradient/background
-        if self.course.get("overviewfiles"):
-            image_url = self.course["overviewfiles"][0].get("fileurl", "")
-            if image_url:
-                self.loader = ImageLoader(image_url, self.token)
-                self.loader.image_loaded.connect(self.set_background_image)
-                self.loader.load()
-            else:
-                self.apply_gradient_background()
-        else:
-            self.apply_gradient_background()
-
-        # Event filter to capture clicks
-        self.background.installEventFilter(self)
-
-    def apply_gradient_background(self):
-        # Apply a random gradient from two matching colors
-        color1, color2 = self.generate_matching_colors()
-        gradient_style = f"""
-            QFrame {{
-                background: qlineargradient(
-                    spread:pad, 
-                    x1:0, y1:0, x2:1, y2:1, 
-                    stop:0 {color1.name()}, 
-                    stop:1 {color2.name()}
-                );
-                border-radius: 10px;
-                border: 2px solid #444;
-            }}
-        """
-        self.background.setStyleSheet(gradient_style)
-
-    def generate_matching_colors(self):
-        # Generate two random but matching colors for gradient
-        base_color = QtGui.QColor(
-            random.randint(0, 255), random.randint(0, 255), random.randint(0, 255)
-        )
-        hue = base_color.hue()
-        saturation = base_color.saturation()
-        value = base_color.value()
-
-        # Generate a second color with a slight hue shift
-        hue_shift = random.randint(10, 30)
-        new_hue = (hue + hue_shift) % 360
-        color1 = QtGui.QColor.fromHsv(new_hue, saturation, value)
-        color2 = QtGui.QColor.fromHsv(hue, saturation, value)
-
-        return color1, color2
-
-    def set_background_image(self, pixmap):
-        if not pixmap.isNull():
-            pixmap = pixmap.scaled(
-                self.image_label.width(),
-                self.image_label.height(),
-                QtCore.Qt.AspectRatioMode.KeepAspectRatioByExpanding,
-                QtCore.Qt.TransformationMode.SmoothTransformation,
-            )
-            # Apply rounded corners to pixmap
-            rounded_pixmap = self.apply_rounded_corners(pixmap, 10)
-            self.image_label.setPixmap(rounded_pixmap)
-            self.image_label.setStyleSheet(
-                "border-top-left-radius: 10px; border-top-right-radius: 10px;"
-            )
-        else:
-            self.apply_gradient_background()
-
-    def apply_rounded_corners(self, pixmap, radius):
-        size = pixmap.size()
-        rounded = QtGui.QPixmap(size)
-        rounded.fill(QtCore.Qt.GlobalColor.transparent)
-
-        painter = QtGui.QPainter(rounded)
-        painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
-        path = QtGui.QPainterPath()
-        path.addRoundedRect(
-            QtCore.QRectF(0, 0, size.width(), size.height()), radius, radius
-        )
-        painter.setClipPath(path)
-        painter.drawPixmap(0, 0, pixmap)
-        painter.end()
-
-        return rounded
-
-    def eventFilter(self, source, event):
-        if (
-            source is self.background
-            and event.type() == QtCore.QEvent.Type.MouseButtonPress
-        ):
-            if event.button() == QtCore.Qt.MouseButton.LeftButton:
-                # Check if click was on favorite button
-                if not self.favorite_button.geometry().contains(event.pos()):
-                    self.clicked.emit(self.course)
-            return True
-        return super().eventFilter(source, event)
-
-    def update_favorite_status(self):
-        if self.course["id"] in self.config.favorites:
-            icon_path = "icons/star_filled_yellow.png"
-        else:
-            icon_path = "icons/star_outline_yellow.png"
-
-        if os.path.exists(icon_path):
-            icon = QtGui.QIcon(icon_path)
-            self.favorite_button.setIcon(icon)
-            self.favorite_button.setIconSize(QtCore.QSize(24, 24))
-        else:
-            self.favorite_button.setIcon(QtGui.QIcon())
-
-    def toggle_favorite(self):
-        if self.course["id"] in self.config.favorites:
-            self.config.remove_favorite(self.course["id"])
-        else:
-            self.config.add_favorite(self.course["id"])
-        self.update_favorite_status()
-        self.favorite_changed.emit()
+    def deliver(self, pixmap):
+        # Failed loads show a placeholder and are retried next time
+        self.failed = pixmap is None
+        if self.failed:
+            pixmap = QtGui.QPixmap(180, 130)
+            pixmap.fill(QtGui.QColor("gray"))
+        self.image_loaded.emit(pixmap)
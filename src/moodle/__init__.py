@@ -1,3 +1,13 @@
 from .api import MoodleAPI
+from .models import Course, FileContent, Module, Section
 
-__all__ = ['MoodleAPI']
\ No newline at end of file
+__all__ = ['MoodleAPI', 'AsyncMoodleAPI', 'Course', 'FileContent', 'Module', 'Section']
+
+
+def __getattr__(name):
+    # aiohttp is slow to import and only needed by the async client
+    if name == "AsyncMoodleAPI":
+        from .async_api import AsyncMoodleAPI
+
+        return AsyncMoodleAPI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
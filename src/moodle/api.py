@@ -7,15 +7,117 @@ Github: @EvickaStudio
 """
 
 
+import json
 import logging
 import os
-from typing import Optional
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Iterable, Iterator, Optional, Tuple
 
-import requests
 from requests.exceptions import RequestException
 
+from .cache import IGNORED_PARAMS, ResponseCache
+from .fetch import DEFAULT_MAX_WORKERS, fetch_concurrently
+from .metrics import ApiMetrics
+from .models import Course, Section, parse_courses, parse_sections
+from .singleflight import SingleFlight
+from .streaming import NotAnArrayError, iter_json_array
+from .transport import HttpTransport
+
 logger = logging.getLogger(__name__)
 
+# Bytes read from the network at a time when streaming responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Maximum number of calls sent in one tool_mobile_call_external_functions request
+DEFAULT_BATCH_SIZE = 20
+# Threads refreshing stale cache entries in the background
+REVALIDATE_WORKERS = 2
+
+# Errors of a batch request that mean the site does not offer batching,
+# the function is missing or not part of the service, or not allowed
+_BATCHING_UNAVAILABLE = frozenset(
+    {"accessexception", "invalidrecord", "servicenotavailable", "nopermissions"}
+)
+
+_MISS = object()
+# Web service functions that only read data and can be retried safely
+_READ_ONLY_FUNCTION = re.compile(r"_(get|check)_")
+_PARAM_KEY = re.compile(r"[^\[\]]+")
+
+
+def _unflatten_params(params: dict) -> dict:
+    """
+    Turns flattened REST parameters like "values[0]" or "tocheck[0][id]"
+    into the nested structure expected by JSON encoded arguments.
+    """
+    nested = {}
+    for key, value in params.items():
+        parts = _PARAM_KEY.findall(key)
+        node = nested
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+
+    def to_lists(node):
+        if not isinstance(node, dict):
+            return node
+        if node and all(key.isdigit() for key in node):
+            return [to_lists(node[key]) for key in sorted(node, key=int)]
+        return {key: to_lists(value) for key, value in node.items()}
+
+    return to_lists(nested)
+
+
+def _check_result(result: Any) -> Any:
+    """Return the decoded response, None if Moodle reported an exception."""
+    if isinstance(result, dict) and "exception" in result:
+        logger.error(f"API Error: {result['exception']} - {result.get('message', '')}")
+        return None
+    return result
+
+
+def _encode_batch(batch_params: dict, params_list: list[dict]) -> dict:
+    """Add the calls in `params_list` to a tool_mobile_call_external_functions request."""
+    for index, params in enumerate(params_list):
+        arguments = {
+            key: value for key, value in params.items() if key not in IGNORED_PARAMS
+        }
+        batch_params[f"requests[{index}][function]"] = params["wsfunction"]
+        batch_params[f"requests[{index}][arguments]"] = json.dumps(
+            _unflatten_params(arguments)
+        )
+    return batch_params
+
+
+def _decode_batch(result: dict, params_list: list[dict]) -> list[Any]:
+    """
+    Split a tool_mobile_call_external_functions response into per-call results.
+    Calls the server sent no response for get None.
+    """
+    responses = result["responses"]
+    if len(responses) < len(params_list):
+        logger.error(
+            f"Batched response has {len(responses)} of {len(params_list)} responses"
+        )
+    results = []
+    for params, response in zip(params_list, responses):
+        if response.get("error"):
+            logger.error(
+                f"API Error in {params['wsfunction']}: {response.get('exception')}"
+            )
+            results.append(None)
+            continue
+        try:
+            results.append(json.loads(response["data"]))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Invalid batched response for {params['wsfunction']}: {e}")
+            results.append(None)
+    results.extend([None] * (len(params_list) - len(results)))
+    return results
+
 
 class MoodleAPI:
     """
@@ -23,19 +125,81 @@ class MoodleAPI:
     ....
     """
 
-    def __init__(self, url: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        cache: Optional[ResponseCache] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        transport: Optional[HttpTransport] = None,
+    ) -> None:
         """
         Initializes the MoodleAPI object with the provided API URL.
+        `max_workers` limits how many requests the bulk helpers run at once.
+        `cache` defaults to a persistent ResponseCache, pass False to disable it.
+        `batch_size` is the number of calls combined into one batched request.
+        `transport` defaults to the HttpTransport shared by the application.
         """
-        self.url = url or os.getenv("MOODLE_URL")
-        self.session = requests.Session()
+        # Site info is memoized for the current url and token
+        self._site_info = None
+        self._site_info_lock = threading.RLock()
+        self._url = url or os.getenv("MOODLE_URL")
+        self._token = None
+        self.userid = None
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._batching_supported = True
+        self.cache = ResponseCache() if cache is None else (cache or None)
+        self._revalidating = set()
+        self._revalidate_lock = threading.Lock()
+        self._revalidate_executor = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS)
+        # Coalesces identical in-flight requests, saved requests are counted
+        self.singleflight = SingleFlight()
+        # Latency, size, errors, cache hits and retries per wsfunction
+        self.metrics = ApiMetrics()
+        # Pooled, sized for the bulk helpers and background revalidation
+        self.transport = transport or HttpTransport.instance()
         self.request_header = {
             "User-Agent": "Mozilla/5.0 (Linux; Android 7.1.1; ...) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/71.0.3578.99 Mobile Safari/537.36 MoodleMobile",
             "Content-Type": "application/x-www-form-urlencoded",
         }
-        self.session.headers.update(self.request_header)
+
+    @property
+    def url(self) -> str | None:
+        return self._url
+
+    @url.setter
+    def url(self, value: str | None) -> None:
+        if value != self._url:
+            self._url = value
+            self.invalidate_session()
+
+    @property
+    def token(self) -> str | None:
+        return self._token
+
+    @token.setter
+    def token(self, value: str | None) -> None:
+        if value != self._token:
+            self._token = value
+            self.invalidate_session()
+
+    def invalidate_session(self) -> None:
+        """
+        Forgets the memoized site info and user id. Called automatically
+        when the url or token changes.
+        """
+        with self._site_info_lock:
+            self._site_info = None
+            self.userid = None
+
+    def logout(self) -> None:
+        """
+        Drops the token, the memoized site info and all cached responses.
+        """
         self.token = None
-        self.userid = None
+        if self.cache is not None:
+            self.cache.clear()
 
     def login(self, username: str, password: str) -> bool:
         """
@@ -64,46 +228,66 @@ class MoodleAPI:
         }
 
         try:
-            response = self.session.post(
-                f"{self.url}/login/token.php", data=login_data
+            response = self.transport.post(
+                f"{self.url}/login/token.php",
+                data=login_data,
+                headers=self.request_header,
+                idempotent=True,
             )
             response.raise_for_status()
+            result = response.json()
 
-            if "token" in response.json():
-                self.token = response.json()["token"]
+            if "token" in result:
+                self.token = result["token"]
                 logger.info("Login successful")
+                # The new token may belong to another user, so the site info
+                # is fetched fresh instead of from the response cache
+                self.get_site_info(refresh=True)
                 return True
 
             logger.error("Login failed: Invalid credentials")
             return False
 
-        except RequestException as e:
+        except (RequestException, ValueError) as e:
             logger.error("Request to Moodle failed: %s", e)
             return False
 
-    def get_site_info(self) -> dict | None:
+    def get_site_info(self, refresh: bool = False) -> dict | None:
         """
         Retrieves site information from the Moodle instance.
         ....
+        The result is memoized until the url or token changes, so every
+        caller after the first one gets it without a round trip.
+        ....
+        Args:
+            refresh (bool): Bypass the memoized value and the response cache.
+        ....
         Returns:
             dict: A dictionary containing site information.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
-
-        wsfunction = "core_webservice_get_site_info"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "moodlewsrestformat": "json",
-        }
+        if self._site_info is not None and not refresh:
+            return self._site_info
+
+        # The lock makes concurrent callers wait for a single request
+        with self._site_info_lock:
+            if self._site_info is not None and not refresh:
+                return self._site_info
+
+            token = self.token
+            result = self._post("core_webservice_get_site_info", refresh=refresh)
+            if result and token == self.token:
+                self._site_info = result
+                self.userid = result.get("userid")
+            return result
 
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
-        )
-        self.userid = response.json().get("userid")
-        return response.json()
+    def restore_site_info(self, site_info: dict) -> None:
+        """
+        Memoizes site info saved earlier for the current token, e.g. by the
+        offline mirror. It is replaced by the next get_site_info(refresh=True).
+        """
+        with self._site_info_lock:
+            self._site_info = site_info
+            self.userid = site_info.get("userid")
 
     def get_user_id(self) -> int | None:
         """
@@ -113,6 +297,8 @@ class MoodleAPI:
             logger.error("Token not set. Please login first.")
             return None
 
+        if self.userid is not None:
+            return self.userid
         result = self.get_site_info()
         return result["userid"] if result else None
 
@@ -141,200 +327,353 @@ class MoodleAPI:
         """
         Send a post request to retrieve user info based on user id.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
-
-        wsfunction = "core_user_get_users_by_field"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "field": "id",
-            "values[0]": user_id,
-            "moodlewsrestformat": "json",
-        }
-
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
+        return self._post(
+            "core_user_get_users_by_field", {"field": "id", "values[0]": user_id}
         )
-        return response.json()
 
-    def get_course(self, user_id: int) -> dict | None:
+    def get_course(self, user_id: int, refresh: bool = False) -> dict | None:
         """
         Send a post request to retrieve course info based on user id.
         """
-        return self._post("core_enrol_get_users_courses", {"userid": user_id})
+        return self._post(
+            "core_enrol_get_users_courses", {"userid": user_id}, refresh=refresh
+        )
 
-    def get_course_content(self, course_id: int) -> dict | None:
+    def get_course_content(self, course_id: int, refresh: bool = False) -> dict | None:
         """
         Send a post request to retrieve course content based on user id and course id.
         """
+        return self._post(
+            "core_course_get_contents", {"courseid": course_id}, refresh=refresh
+        )
+
+    def get_courses(self, user_id: int, refresh: bool = False) -> list[Course] | None:
+        """
+        Retrieves the courses of a user as Course objects.
+        """
+        return parse_courses(self.get_course(user_id, refresh=refresh))
+
+    def get_sections(self, course_id: int, refresh: bool = False) -> list[Section] | None:
+        """
+        Retrieves the content of a course as Section objects.
+        """
+        return parse_sections(self.get_course_content(course_id, refresh=refresh))
+
+    def iter_course_content(
+        self, course_id: int, refresh: bool = False
+    ) -> Iterator[dict]:
+        """
+        Streams the content of a course section by section.
+        ....
+        The core_course_get_contents response is parsed incrementally while it
+        is downloaded, so the first section is available before the last one
+        has arrived. Cached contents are yielded directly, a complete stream
+        is stored in the cache. Errors are logged and end the stream early.
+        ....
+        Yields:
+            dict: The raw sections in order.
+        """
         if self.token is None:
             logger.error("Token not set. Please login first.")
-            return None
+            return
 
         wsfunction = "core_course_get_contents"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "courseid": course_id,
-            "moodlewsrestformat": "json",
-        }
+        params = self._build_params(wsfunction, {"courseid": course_id})
+        key, cached = self._lookup(wsfunction, params, refresh)
+        if cached is not _MISS:
+            yield from cached or ()
+            return
+
+        # Join a request for the same course that is already in flight
+        flight_key = ResponseCache.make_key(self.url, wsfunction, params)
+        call, leader = self.singleflight.begin(flight_key)
+        if not leader:
+            self.metrics.record_coalesced(wsfunction)
+            yield from self.singleflight.wait(call) or ()
+            return
+
+        sections = []
+        result = None
+        received = 0
+        started = time.perf_counter()
+
+        def count_bytes(chunks):
+            nonlocal received
+            for chunk in chunks:
+                received += len(chunk)
+                yield chunk
 
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
+        try:
+            response = self.transport.post(
+                f"{self.url}/webservice/rest/server.php",
+                data=params,
+                headers=self.request_header,
+                idempotent=True,
+                on_retry=lambda: self.metrics.record_retry(wsfunction),
+                stream=True,
+            )
+            with response:
+                response.raise_for_status()
+                chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+                for section in iter_json_array(count_bytes(chunks)):
+                    sections.append(section)
+                    yield section
+            result = sections
+            self._store(key, result)
+        except NotAnArrayError as e:
+            _check_result(e.value)
+        except (RequestException, ValueError) as e:
+            logger.error(f"Request to Moodle failed: {e}")
+        finally:
+            self.singleflight.finish(flight_key, call, result)
+            self.metrics.record_request(
+                wsfunction,
+                time.perf_counter() - started,
+                received,
+                error=result is None,
+                course_id=course_id,
+            )
+
+    def iter_sections(self, course_id: int, refresh: bool = False) -> Iterator[Section]:
+        """
+        Streams the content of a course as Section objects.
+        """
+        for section in self.iter_course_content(course_id, refresh=refresh):
+            yield Section.from_json(section)
+
+    def iter_course_contents(
+        self, course_ids: Iterable[int], refresh: bool = False
+    ) -> Iterator[Tuple[int, dict | None]]:
+        """
+        Retrieves the content of several courses in batched requests.
+        ....
+        Yields (course_id, contents) as each batch finishes. Courses whose
+        request failed are yielded with contents set to None.
+        """
+        course_ids = list(course_ids)
+        calls = [
+            ("core_course_get_contents", {"courseid": course_id})
+            for course_id in course_ids
+        ]
+        for index, contents in self.iter_many(calls, refresh=refresh):
+            yield course_ids[index], contents
+
+    def get_updates_since(self, course_id: int, since: int) -> dict | None:
+        """
+        Retrieves the modules of a course that changed since a timestamp.
+        ....
+        Args:
+            course_id (int): Id of the course to check.
+            since (int): Unix timestamp of the last check.
+        ....
+        Returns:
+            dict: {"instances": [...], "warnings": [...]} where every
+            instance is a module with at least one update.
+        """
+        return self._post(
+            "core_course_get_updates_since", {"courseid": course_id, "since": since}
         )
-        return response.json()
 
-    def get_groupselect_details(self, instance_id: int) -> dict | None:
+    def has_course_updates(self, course_id: int, since: int) -> bool | None:
         """
-        Send a post request to retrieve group details for a groupselect module.
+        Checks whether anything in a course changed since a timestamp.
+        ....
+        Only the list of changed modules is transferred, which is much
+        smaller than the full core_course_get_contents tree.
+        ....
+        Returns:
+            bool: True if the course changed, None if the check failed.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
+        return self._has_updates(self.get_updates_since(course_id, since))
+
+    @staticmethod
+    def _has_updates(result: dict | None) -> bool | None:
+        if not isinstance(result, dict) or "instances" not in result:
             return None
+        return bool(result["instances"])
 
-        wsfunction = "mod_groupselect_get_groups"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "instanceid": instance_id,
-            "moodlewsrestformat": "json",
-        }
+    def iter_course_updates(
+        self, since_by_course: dict[int, int]
+    ) -> Iterator[Tuple[int, bool | None]]:
+        """
+        Checks several courses for updates in batched requests.
+        ....
+        Yields (course_id, changed) as each batch finishes, where changed is
+        None if the check failed.
+        """
+        course_ids = list(since_by_course)
+        calls = [
+            (
+                "core_course_get_updates_since",
+                {"courseid": course_id, "since": since_by_course[course_id]},
+            )
+            for course_id in course_ids
+        ]
+        for index, result in self.iter_many(calls):
+            yield course_ids[index], self._has_updates(result)
 
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
-        )
-        return response.json()
+    def get_groupselect_details(self, instance_id: int) -> dict | None:
+        """
+        Send a post request to retrieve group details for a groupselect module.
+        """
+        return self._post("mod_groupselect_get_groups", {"instanceid": instance_id})
 
     def get_activity_allowed_groups(self, activityid: int) -> dict | None:
         """
         Retrieves groups allowed in a specific activity.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
-
-        wsfunction = "core_group_get_activity_allowed_groups"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "activityid": activityid,
-            "moodlewsrestformat": "json",
-        }
-
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
+        return self._post(
+            "core_group_get_activity_allowed_groups", {"activityid": activityid}
         )
-        return response.json()
 
     def get_course_groups(self, courseid: int) -> dict | None:
         """
         Retrieves all groups in a course.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
-
-        wsfunction = "core_group_get_course_groups"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "courseid": courseid,
-            "moodlewsrestformat": "json",
-        }
-
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
-        )
-        return response.json()
+        return self._post("core_group_get_course_groups", {"courseid": courseid})
 
     def get_groupselect_groups(self, instance_id: int) -> dict | None:
         """
         Retrieves groups for a groupselect instance.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
-
-        wsfunction = "mod_groupselect_get_groups"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "instanceid": instance_id,
-            "moodlewsrestformat": "json",
-        }
-
-        try:
-            response = self.session.post(
-                f"{self.url}/webservice/rest/server.php", data=params
-            )
-            response.raise_for_status()
-            result = response.json()
-            if 'exception' in result:
-                logger.error(f"API Error: {result['exception']} - {result.get('message', '')}")
-                return None
-            print("API Response from get_groupselect_groups:", result)  # Debugging line
-            return result
-        except RequestException as e:
-            logger.error(f"Request to Moodle failed: {e}")
-            return None
+        return self._post("mod_groupselect_get_groups", {"instanceid": instance_id})
 
     def get_group_members(self, groupid: int) -> dict | None:
         """
         Retrieves members of a group.
         """
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
-
-        wsfunction = "core_group_get_group_members"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "groupids[0]": groupid,
-            "moodlewsrestformat": "json",
-        }
-
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
-        )
-        return response.json()
+        return self._post("core_group_get_group_members", {"groupids[0]": groupid})
 
     def get_user_grades(self, course_id: int) -> dict | None:
         """
         Retrieves the user's grades for a specific course.
         """
+        return self._post(
+            "gradereport_user_get_grade_items",
+            {"courseid": course_id, "userid": self.userid},
+        )
+
+    def call_many(
+        self, calls: list[Tuple[str, dict]], refresh: bool = False
+    ) -> list[Any]:
+        """
+        Runs several web service calls with as few HTTP requests as possible.
+        ....
+        Args:
+            calls (list): (wsfunction, params) tuples.
+            refresh (bool): Skip the cache lookup but still store the responses.
+        ....
+        Returns:
+            list: The result of every call in the order of `calls`,
+            None for calls that failed.
+        """
+        results = [None] * len(calls)
+        for index, result in self.iter_many(calls, refresh=refresh):
+            results[index] = result
+        return results
+
+    def iter_many(
+        self, calls: list[Tuple[str, dict]], refresh: bool = False
+    ) -> Iterator[Tuple[int, Any]]:
+        """
+        Runs several web service calls in batched requests.
+        ....
+        Cached results are yielded first. The remaining calls are split into
+        batches of `batch_size` that are sent concurrently through
+        tool_mobile_call_external_functions, each result is yielded as soon
+        as its batch finishes.
+        ....
+        Yields:
+            tuple: (index into `calls`, result or None on errors).
+        """
+        if self.token is None:
+            logger.error("Token not set. Please login first.")
+            for index in range(len(calls)):
+                yield index, None
+            return
+
+        pending = []
+        followers = []
+        for index, (wsfunction, additional_params) in enumerate(calls):
+            params = self._build_params(wsfunction, additional_params)
+            key, cached = self._lookup(wsfunction, params, refresh)
+            if cached is not _MISS:
+                yield index, cached
+                continue
+
+            # Calls already in flight elsewhere are not sent again
+            flight_key = ResponseCache.make_key(self.url, wsfunction, params)
+            call, leader = self.singleflight.begin(flight_key)
+            if leader:
+                pending.append((index, key, params, flight_key, call))
+            else:
+                self.metrics.record_coalesced(wsfunction)
+                followers.append((index, call))
+
+        batches = [
+            pending[start : start + self.batch_size]
+            for start in range(0, len(pending), self.batch_size)
+        ]
+        finished = set()
+        try:
+            for batch, results in fetch_concurrently(
+                lambda batch: self._send_batch([entry[2] for entry in batch]),
+                batches,
+                max_workers=self.max_workers,
+            ):
+                if results is None:
+                    results = [None] * len(batch)
+                for (index, key, _, flight_key, call), result in zip(batch, results):
+                    self._store(key, result)
+                    self.singleflight.finish(flight_key, call, result)
+                    finished.add(index)
+                    yield index, result
+        finally:
+            # Never leave waiting callers behind if the caller stops early
+            for index, _, _, flight_key, call in pending:
+                if index not in finished:
+                    self.singleflight.finish(flight_key, call)
+
+        for index, call in followers:
+            yield index, self.singleflight.wait(call)
+
+    def _post(
+        self, wsfunction: str, additional_params: dict = None, refresh: bool = False
+    ) -> dict | None:
+        """
+        Send a POST request to the Moodle API with given wsfunction and parameters.
+        ....
+        Responses of cacheable functions are served from the response cache.
+        Expired entries are returned at once and refreshed in the background
+        when the cache runs in stale-while-revalidate mode.
+        ....
+        Args:
+            wsfunction (str): Name of the web service function.
+            additional_params (dict): Parameters of the function.
+            refresh (bool): Skip the cache lookup but still store the response.
+        """
         if self.token is None:
             logger.error("Token not set. Please login first.")
             return None
 
-        wsfunction = "gradereport_user_get_grade_items"
-        params = {
-            "wstoken": self.token,
-            "wsfunction": wsfunction,
-            "courseid": course_id,
-            "userid": self.userid,
-            "moodlewsrestformat": "json",
-        }
+        params = self._build_params(wsfunction, additional_params)
+        key, cached = self._lookup(wsfunction, params, refresh)
+        if cached is not _MISS:
+            return cached
 
-        response = self.session.post(
-            f"{self.url}/webservice/rest/server.php", params=params
-        )
-        result = response.json()
-        if "exception" in result:
-            logger.error(
-                f"API Error: {result['exception']} - {result.get('message', '')}"
-            )
-            return None
-        return result
+        def send():
+            result = self._send(params)
+            self._store(key, result)
+            return result
 
-    def _post(self, wsfunction: str, additional_params: dict = None) -> dict | None:
-        """Send a POST request to the Moodle API with given wsfunction and parameters."""
-        if self.token is None:
-            logger.error("Token not set. Please login first.")
-            return None
+        # Identical requests already in flight are joined instead of repeated
+        return self.singleflight.do(
+            ResponseCache.make_key(self.url, wsfunction, params),
+            send,
+            on_join=lambda: self.metrics.record_coalesced(wsfunction),
+        )
 
+    def _build_params(self, wsfunction: str, additional_params: dict = None) -> dict:
         params = {
             "wstoken": self.token,
             "wsfunction": wsfunction,
@@ -343,19 +682,139 @@ class MoodleAPI:
 
         if additional_params:
             params.update(additional_params)
+        return params
 
+    def _lookup(self, wsfunction: str, params: dict, refresh: bool) -> Tuple[Any, Any]:
+        """
+        Looks up a call in the response cache.
+        ....
+        Returns:
+            tuple: (cache key or None if the call is not cacheable,
+            cached value or _MISS).
+        """
+        if self.cache is None or not self.cache.is_cacheable(wsfunction):
+            return None, _MISS
+
+        key = self.cache.make_key(self.url, wsfunction, params)
+        if refresh:
+            return key, _MISS
+        cached = self.cache.get(key, wsfunction)
+        if cached is None:
+            return key, _MISS
+
+        value, fresh = cached
+        self.metrics.record_cache_hit(wsfunction)
+        if not fresh:
+            self._revalidate(key, params)
+        return key, value
+
+    def _store(self, key: str | None, result: Any) -> None:
+        if key is not None and result is not None:
+            self.cache.set(key, result)
+
+    def _revalidate(self, key: str, params: dict) -> None:
+        """Refresh a stale cache entry in the background."""
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def revalidate():
+            try:
+                self._store(key, self._send(params))
+            finally:
+                with self._revalidate_lock:
+                    self._revalidating.discard(key)
+
+        self._revalidate_executor.submit(revalidate)
+
+    def _send(
+        self,
+        params: dict,
+        idempotent: Optional[bool] = None,
+        errors: Optional[list] = None,
+    ) -> dict | None:
+        """
+        Send the request and return the decoded response, None on errors.
+        Read-only functions are retried by the transport on transient errors.
+        Exceptions reported by Moodle are appended to `errors` if given.
+        """
+        wsfunction = params["wsfunction"]
+        if idempotent is None:
+            idempotent = bool(_READ_ONLY_FUNCTION.search(wsfunction))
+        result = None
+        received = 0
+        started = time.perf_counter()
         try:
-            response = self.session.post(
-                f"{self.url}/webservice/rest/server.php", data=params
+            response = self.transport.post(
+                f"{self.url}/webservice/rest/server.php",
+                data=params,
+                headers=self.request_header,
+                idempotent=idempotent,
+                on_retry=lambda: self.metrics.record_retry(wsfunction),
             )
+            received = len(response.content)
             response.raise_for_status()
-            result = response.json()
-            if "exception" in result:
-                logger.error(
-                    f"API Error: {result['exception']} - {result.get('message', '')}"
-                )
-                return None
-            return result
-        except RequestException as e:
+            decoded = response.json()
+            result = _check_result(decoded)
+            if result is None and errors is not None:
+                errors.append(decoded)
+        except (RequestException, ValueError) as e:
             logger.error(f"Request to Moodle failed: {e}")
-            return None
+        finally:
+            self.metrics.record_request(
+                wsfunction,
+                time.perf_counter() - started,
+                received,
+                error=result is None,
+                course_id=params.get("courseid"),
+            )
+        return result
+
+    def _send_batch(self, params_list: list[dict]) -> list[Any]:
+        """
+        Send several calls in one tool_mobile_call_external_functions request.
+        Falls back to one request per call if batching is not available.
+        ....
+        The batch request is recorded in the metrics like any other request,
+        the calls inside it are recorded with the latency of the whole batch.
+        """
+        if len(params_list) == 1 or not self._batching_supported:
+            return [self._send(params) for params in params_list]
+
+        batch_params = _encode_batch(
+            self._build_params("tool_mobile_call_external_functions"), params_list
+        )
+        started = time.perf_counter()
+        errors = []
+        result = self._send(
+            batch_params,
+            idempotent=all(
+                _READ_ONLY_FUNCTION.search(params["wsfunction"])
+                for params in params_list
+            ),
+            errors=errors,
+        )
+        if not isinstance(result, dict) or "responses" not in result:
+            # Timeouts and server errors are transient, only Moodle refusing
+            # the batch function turns batching off
+            if any(error.get("errorcode") in _BATCHING_UNAVAILABLE for error in errors):
+                logger.warning("Batching is not available, sending calls one by one")
+                self._batching_supported = False
+            else:
+                logger.warning("Batched request failed, sending calls one by one")
+            return [self._send(params) for params in params_list]
+
+        latency = time.perf_counter() - started
+        results = _decode_batch(result, params_list)
+        responses = result["responses"]
+        for index, (params, decoded) in enumerate(zip(params_list, results)):
+            response = responses[index] if index < len(responses) else {}
+            self.metrics.record_request(
+                params["wsfunction"],
+                latency,
+                len(response.get("data") or ""),
+                error=decoded is None,
+                course_id=params.get("courseid"),
+            )
+        return results
@@ -0,0 +1,445 @@
+"""
+Asyncio Moodle API client with the same surface as MoodleAPI.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import asyncio
+import logging
+import os
+from typing import Any, Iterable, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - optional dependency
+    aiohttp = None
+
+from .api import (
+    DEFAULT_BATCH_SIZE,
+    MoodleAPI,
+    _MISS,
+    _check_result,
+    _decode_batch,
+    _encode_batch,
+)
+from .cache import ResponseCache
+from .fetch import DEFAULT_MAX_WORKERS
+from .transport import DEFAULT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Connection errors and malformed responses are handled like in MoodleAPI
+_REQUEST_ERRORS = (
+    (aiohttp.ClientError, asyncio.TimeoutError, ValueError) if aiohttp else ()
+)
+
+
+class AsyncMoodleAPI:
+    """
+    An asyncio Moodle API wrapper.
+    ....
+    All requests share one aiohttp session and run on the calling event loop,
+    `max_concurrency` limits how many of them are on the wire at once.
+    Cache reads and writes can touch the disk, they run in the loop's
+    default executor.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        max_concurrency: int = DEFAULT_MAX_WORKERS,
+        cache: Optional[ResponseCache] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> None:
+        """
+        Initializes the AsyncMoodleAPI object with the provided API URL.
+        `cache` defaults to a persistent ResponseCache, pass False to disable it.
+        `batch_size` is the number of calls combined into one batched request.
+        ....
+        Raises:
+            RuntimeError: If aiohttp is not installed.
+        """
+        if aiohttp is None:
+            raise RuntimeError("AsyncMoodleAPI requires the aiohttp package")
+
+        self.url = url or os.getenv("MOODLE_URL")
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.cache = ResponseCache() if cache is None else (cache or None)
+        self.request_header = {
+            "User-Agent": "Mozilla/5.0 (Linux; Android 7.1.1; ...) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/71.0.3578.99 Mobile Safari/537.36 MoodleMobile",
+        }
+        self.token = None
+        self.userid = None
+        self._session = None
+        self._semaphore = None
+        self._revalidating = set()
+        # The loop only keeps weak references to tasks, these are held here
+        # until they finish
+        self._tasks = set()
+
+    @classmethod
+    def from_api(cls, moodle_api: MoodleAPI) -> "AsyncMoodleAPI":
+        """
+        Creates a client sharing URL, token, user id and cache with a MoodleAPI.
+        """
+        client = cls(
+            moodle_api.url,
+            max_concurrency=moodle_api.max_workers,
+            cache=moodle_api.cache or False,
+            batch_size=moodle_api.batch_size,
+        )
+        client.token = moodle_api.token
+        client.userid = moodle_api.userid
+        return client
+
+    async def __aenter__(self) -> "AsyncMoodleAPI":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """Closes the underlying HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        # The session and semaphore are bound to the running loop,
+        # so they are created on first use
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = DEFAULT_TIMEOUT
+            self._session = aiohttp.ClientSession(
+                headers=self.request_header,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=connect_timeout, sock_read=read_timeout
+                ),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def login(self, username: str, password: str) -> bool:
+        """
+        Logs in to the Moodle instance using the provided username and password.
+        ....
+        Returns:
+            bool: True if login is successful, False otherwise.
+        ....
+        Raises:
+            ValueError: If username or password is not provided.
+        """
+        if not username:
+            raise ValueError("Username is required")
+        if not password:
+            raise ValueError("Password is required")
+
+        login_data = {
+            "username": username,
+            "password": password,
+            "service": "moodle_mobile_app",
+        }
+
+        try:
+            result = await self._request(f"{self.url}/login/token.php", login_data)
+        except _REQUEST_ERRORS as e:
+            logger.error("Request to Moodle failed: %s", e)
+            return False
+
+        if "token" in result:
+            self.token = result["token"]
+            logger.info("Login successful")
+            return True
+
+        logger.error("Login failed: Invalid credentials")
+        return False
+
+    async def get_site_info(self, refresh: bool = False) -> dict | None:
+        """Retrieves site information from the Moodle instance."""
+        result = await self._post("core_webservice_get_site_info", refresh=refresh)
+        if result:
+            self.userid = result.get("userid")
+        return result
+
+    async def get_user_id(self) -> int | None:
+        """Retrieve the user id."""
+        if self.token is None:
+            logger.error("Token not set. Please login first.")
+            return None
+
+        result = await self.get_site_info()
+        return result["userid"] if result else None
+
+    async def get_popup_notifications(self, user_id: int) -> dict | None:
+        """Retrieves popup notifications for a user."""
+        return await self._post(
+            "message_popup_get_popup_notifications", {"useridto": user_id}
+        )
+
+    async def core_user_get_users_by_field(self, user_id: int) -> dict | None:
+        """Retrieves user info based on user id."""
+        return await self._post(
+            "core_user_get_users_by_field", {"field": "id", "values[0]": user_id}
+        )
+
+    async def get_course(self, user_id: int, refresh: bool = False) -> dict | None:
+        """Retrieves the courses a user is enrolled in."""
+        return await self._post(
+            "core_enrol_get_users_courses", {"userid": user_id}, refresh=refresh
+        )
+
+    async def get_course_content(
+        self, course_id: int, refresh: bool = False
+    ) -> dict | None:
+        """Retrieves the content of a course."""
+        return await self._post(
+            "core_course_get_contents", {"courseid": course_id}, refresh=refresh
+        )
+
+    async def get_updates_since(self, course_id: int, since: int) -> dict | None:
+        """Retrieves the modules of a course that changed since a timestamp."""
+        return await self._post(
+            "core_course_get_updates_since", {"courseid": course_id, "since": since}
+        )
+
+    async def has_course_updates(self, course_id: int, since: int) -> bool | None:
+        """Checks whether anything in a course changed since a timestamp."""
+        return MoodleAPI._has_updates(await self.get_updates_since(course_id, since))
+
+    async def get_course_updates(
+        self, since_by_course: dict[int, int]
+    ) -> dict[int, bool | None]:
+        """
+        Checks several courses for updates in batched requests.
+        ....
+        Returns:
+            dict: Whether each course changed by course id, None for courses
+            whose check failed.
+        """
+        course_ids = list(since_by_course)
+        results = await self.call_many(
+            [
+                (
+                    "core_course_get_updates_since",
+                    {"courseid": course_id, "since": since_by_course[course_id]},
+                )
+                for course_id in course_ids
+            ]
+        )
+        return {
+            course_id: MoodleAPI._has_updates(result)
+            for course_id, result in zip(course_ids, results)
+        }
+
+    async def get_groupselect_details(self, instance_id: int) -> dict | None:
+        """Retrieves group details for a groupselect module."""
+        return await self._post(
+            "mod_groupselect_get_groups", {"instanceid": instance_id}
+        )
+
+    async def get_activity_allowed_groups(self, activityid: int) -> dict | None:
+        """Retrieves groups allowed in a specific activity."""
+        return await self._post(
+            "core_group_get_activity_allowed_groups", {"activityid": activityid}
+        )
+
+    async def get_course_groups(self, courseid: int) -> dict | None:
+        """Retrieves all groups in a course."""
+        return await self._post("core_group_get_course_groups", {"courseid": courseid})
+
+    async def get_groupselect_groups(self, instance_id: int) -> dict | None:
+        """Retrieves groups for a groupselect instance."""
+        return await self._post(
+            "mod_groupselect_get_groups", {"instanceid": instance_id}
+        )
+
+    async def get_group_members(self, groupid: int) -> dict | None:
+        """Retrieves members of a group."""
+        return await self._post(
+            "core_group_get_group_members", {"groupids[0]": groupid}
+        )
+
+    async def get_user_grades(self, course_id: int) -> dict | None:
+        """Retrieves the user's grades for a specific course."""
+        return await self._post(
+            "gradereport_user_get_grade_items",
+            {"courseid": course_id, "userid": self.userid},
+        )
+
+    async def get_course_contents(
+        self, course_ids: Iterable[int], refresh: bool = False
+    ) -> dict[int, Any]:
+        """
+        Retrieves the content of many courses concurrently.
+        ....
+        Returns:
+            dict: Contents by course id, None for courses that failed.
+        """
+        course_ids = list(course_ids)
+        results = await asyncio.gather(
+            *(self.get_course_content(course_id, refresh) for course_id in course_ids)
+        )
+        return dict(zip(course_ids, results))
+
+    async def get_groups_members(self, group_ids: Iterable[int]) -> dict[int, Any]:
+        """
+        Retrieves the members of many groups concurrently.
+        ....
+        Returns:
+            dict: Members by group id, None for groups that failed.
+        """
+        group_ids = list(group_ids)
+        results = await asyncio.gather(
+            *(self.get_group_members(group_id) for group_id in group_ids)
+        )
+        return dict(zip(group_ids, results))
+
+    async def call_many(
+        self, calls: list[Tuple[str, dict]], refresh: bool = False
+    ) -> list[Any]:
+        """
+        Runs several web service calls in batched requests.
+        ....
+        Cached calls are not sent. The remaining calls are split into batches
+        of `batch_size` that are sent concurrently through
+        tool_mobile_call_external_functions.
+        ....
+        Returns:
+            list: The result of every call in the order of `calls`,
+            None for calls that failed.
+        """
+        if self.token is None:
+            logger.error("Token not set. Please login first.")
+            return [None] * len(calls)
+
+        results = [None] * len(calls)
+        pending = []
+        for index, (wsfunction, additional_params) in enumerate(calls):
+            params = self._build_params(wsfunction, additional_params)
+            key, cached = await self._lookup(wsfunction, params, refresh)
+            if cached is not _MISS:
+                results[index] = cached
+            else:
+                pending.append((index, key, params))
+
+        batches = [
+            pending[start : start + self.batch_size]
+            for start in range(0, len(pending), self.batch_size)
+        ]
+        batch_results = await asyncio.gather(
+            *(self._send_batch([params for _, _, params in batch]) for batch in batches)
+        )
+        for batch, batch_result in zip(batches, batch_results):
+            for (index, key, _), result in zip(batch, batch_result):
+                await self._store(key, result)
+                results[index] = result
+        return results
+
+    async def _send_batch(self, params_list: list[dict]) -> list[Any]:
+        """
+        Sends several calls in one tool_mobile_call_external_functions request,
+        falls back to one request per call if the batch fails.
+        """
+        if len(params_list) == 1:
+            return [await self._send(params_list[0])]
+
+        batch = await self._send(
+            _encode_batch(
+                self._build_params("tool_mobile_call_external_functions"),
+                params_list,
+            )
+        )
+        if isinstance(batch, dict) and "responses" in batch:
+            return _decode_batch(batch, params_list)
+        logger.warning("Batched request failed, sending calls one by one")
+        return await asyncio.gather(*(self._send(params) for params in params_list))
+
+    async def _post(
+        self, wsfunction: str, additional_params: dict = None, refresh: bool = False
+    ) -> dict | None:
+        """
+        Send a POST request to the Moodle API with given wsfunction and parameters.
+        Uses the response cache like MoodleAPI._post.
+        """
+        if self.token is None:
+            logger.error("Token not set. Please login first.")
+            return None
+
+        params = self._build_params(wsfunction, additional_params)
+        key, cached = await self._lookup(wsfunction, params, refresh)
+        if cached is not _MISS:
+            return cached
+
+        result = await self._send(params)
+        await self._store(key, result)
+        return result
+
+    def _build_params(self, wsfunction: str, additional_params: dict = None) -> dict:
+        params = {
+            "wstoken": self.token,
+            "wsfunction": wsfunction,
+            "moodlewsrestformat": "json",
+        }
+
+        if additional_params:
+            params.update(additional_params)
+        return params
+
+    async def _lookup(
+        self, wsfunction: str, params: dict, refresh: bool
+    ) -> Tuple[Any, Any]:
+        if self.cache is None or not self.cache.is_cacheable(wsfunction):
+            return None, _MISS
+
+        key = self.cache.make_key(self.url, wsfunction, params)
+        if refresh:
+            return key, _MISS
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.cache.get, key, wsfunction)
+        if cached is None:
+            return key, _MISS
+
+        value, fresh = cached
+        if not fresh and key not in self._revalidating:
+            self._revalidating.add(key)
+            task = loop.create_task(self._revalidate(key, params))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return key, value
+
+    async def _revalidate(self, key: str, params: dict) -> None:
+        try:
+            await self._store(key, await self._send(params))
+        finally:
+            self._revalidating.discard(key)
+
+    async def _store(self, key: str | None, result: Any) -> None:
+        if key is not None and result is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.cache.set, key, result
+            )
+
+    async def _send(self, params: dict) -> dict | None:
+        """Send the request and return the decoded response, None on errors."""
+        try:
+            result = await self._request(
+                f"{self.url}/webservice/rest/server.php", params
+            )
+        except _REQUEST_ERRORS as e:
+            logger.error(f"Request to Moodle failed: {e}")
+            return None
+        return _check_result(result)
+
+    async def _request(self, url: str, data: dict) -> Any:
+        session = self._get_session()
+        async with self._semaphore:
+            # Like requests, skip parameters without a value
+            form = {
+                key: str(value) for key, value in data.items() if value is not None
+            }
+            async with session.post(url, data=form) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
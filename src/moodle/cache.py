@@ -0,0 +1,200 @@
+"""
+Response cache for the Moodle web service API.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "cache"
+# Entries a DiskCacheBackend keeps in memory, older ones are read from disk
+MEMORY_ENTRIES = 256
+
+# Seconds a cached response is considered fresh, per wsfunction.
+# Functions without an entry are never cached.
+DEFAULT_TTLS = {
+    "core_webservice_get_site_info": 24 * 60 * 60,
+    "core_user_get_users_by_field": 24 * 60 * 60,
+    "core_enrol_get_users_courses": 60 * 60,
+    "core_course_get_contents": 15 * 60,
+    "core_group_get_course_groups": 60 * 60,
+    "core_group_get_activity_allowed_groups": 60 * 60,
+    "core_group_get_group_members": 60 * 60,
+    "mod_groupselect_get_groups": 10 * 60,
+    "gradereport_user_get_grade_items": 5 * 60,
+}
+
+# Parameters that are not part of the cache key
+IGNORED_PARAMS = ("wstoken", "wsfunction", "moodlewsrestformat")
+
+
+class MemoryCacheBackend:
+    """
+    Keeps cache entries in a dict for the lifetime of the process.
+    With max_entries the least recently used entries are dropped.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None) -> None:
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, stored_at: float, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCacheBackend(MemoryCacheBackend):
+    """
+    Stores every cache entry as a JSON file so it survives restarts.
+    The most recently used entries are kept in memory as well.
+    """
+
+    def __init__(
+        self, directory: str = CACHE_DIR, max_entries: int = MEMORY_ENTRIES
+    ) -> None:
+        super().__init__(max_entries)
+        self.directory = directory
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        entry = super().get(key)
+        if entry is not None:
+            return entry
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Dropping unreadable cache entry %s: %s", path, e)
+            return None
+        if not isinstance(data, dict) or data.get("key") != key:
+            return None
+        if "stored_at" not in data or "value" not in data:
+            return None
+
+        entry = (data["stored_at"], data["value"])
+        super().set(key, *entry)
+        return entry
+
+    def set(self, key: str, stored_at: float, value: Any) -> None:
+        super().set(key, stored_at, value)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so a crash never leaves
+            # a truncated entry behind
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "stored_at": stored_at, "value": value}, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning("Could not write cache entry: %s", e)
+
+    def clear(self) -> None:
+        super().clear()
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError as e:
+                    logger.warning("Could not remove cache entry %s: %s", name, e)
+
+
+class ResponseCache:
+    """
+    Caches web service responses keyed by wsfunction and parameters.
+    ....
+    The token is not part of the key, so cached data stays valid after
+    logging in again. Keys are namespaced by the Moodle URL.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[MemoryCacheBackend] = None,
+        ttls: Optional[dict] = None,
+        stale_while_revalidate: bool = True,
+    ) -> None:
+        """
+        Args:
+            backend: Storage for the entries, defaults to a DiskCacheBackend.
+            ttls (dict): Seconds an entry stays fresh, per wsfunction.
+            stale_while_revalidate (bool): Return expired entries at once and
+                let the caller refresh them in the background.
+        """
+        self.backend = backend if backend is not None else DiskCacheBackend()
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.stale_while_revalidate = stale_while_revalidate
+
+    @staticmethod
+    def make_key(namespace: str, wsfunction: str, params: dict) -> str:
+        """
+        Builds a cache key from the wsfunction and the normalized parameters.
+        """
+        normalized = sorted(
+            (str(key), str(value))
+            for key, value in params.items()
+            if key not in IGNORED_PARAMS
+        )
+        return json.dumps([namespace, wsfunction, normalized])
+
+    def is_cacheable(self, wsfunction: str) -> bool:
+        return self.ttls.get(wsfunction, 0) > 0
+
+    def get(self, key: str, wsfunction: str) -> Optional[Tuple[Any, bool]]:
+        """
+        Looks up a cached response.
+        ....
+        Returns:
+            tuple: (value, fresh) or None if nothing usable is cached.
+            Expired entries are only returned in stale-while-revalidate mode.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+
+        stored_at, value = entry
+        fresh = time.time() - stored_at < self.ttls.get(wsfunction, 0)
+        if not fresh and not self.stale_while_revalidate:
+            return None
+        return value, fresh
+
+    def set(self, key: str, value: Any) -> None:
+        self.backend.set(key, time.time(), value)
+
+    def clear(self) -> None:
+        self.backend.clear()
@@ -0,0 +1,832 @@
+"""
+Download manager for course files.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import itertools
+import json
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Callable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from urllib3.exceptions import HTTPError as Urllib3Error
+
+from .transport import redact
+
+logger = logging.getLogger(__name__)
+
+DOWNLOADS_FILE = "downloads.json"
+DEFAULT_MAX_DOWNLOADS = 2
+# Attempts per download, every attempt resumes where the last one stopped
+DOWNLOAD_ATTEMPTS = 5
+DOWNLOAD_BACKOFF = 1.0
+# Client errors worth another attempt, every other 4xx fails at once
+RETRY_CLIENT_STATUSES = frozenset({408, 429})
+# Seconds between two progress notifications of one download
+PROGRESS_INTERVAL = 0.25
+PART_SUFFIX = ".part"
+# Seconds close() waits for the workers, a read stuck on a stalled
+# connection ends with the process
+CLOSE_TIMEOUT = 1.0
+# Files from this size on are fetched over several connections
+SEGMENT_THRESHOLD = 8 * 1024 * 1024
+# Ranges are never split below this size, smaller ones finish faster alone
+MIN_SEGMENT_SIZE = 2 * 1024 * 1024
+INITIAL_SEGMENTS = 2
+MAX_SEGMENTS = 6
+# Throughput gained by the last added connection to try one more
+SEGMENT_GAIN = 1.1
+# Seconds between two changes of the number of connections
+TUNE_INTERVAL = 2.0
+# Seconds of data read at once, chunks follow the speed of the connection
+CHUNK_SECONDS = 0.1
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+TOKEN_PARAMS = frozenset({"token", "wstoken"})
+
+QUEUED = "queued"
+ACTIVE = "active"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = frozenset({DONE, FAILED, CANCELLED})
+
+
+def strip_token(url: str) -> str:
+    """Removes the token from a file url, it is added again per request."""
+    parts = urlsplit(url)
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TOKEN_PARAMS
+    ]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class DownloadCancelled(Exception):
+    """Raised inside a transfer that was cancelled or interrupted by close()."""
+
+
+class TransferError(OSError):
+    """A transfer that ended early, the message never contains the url."""
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether another attempt may succeed: connection errors, timeouts,
+    transfers that ended early, 5xx responses and 408/429.
+    """
+    if isinstance(error, requests.HTTPError):
+        response = error.response
+        return (
+            response is None
+            or response.status_code >= 500
+            or response.status_code in RETRY_CLIENT_STATUSES
+        )
+    return isinstance(
+        error,
+        (
+            requests.ConnectionError,
+            requests.Timeout,
+            requests.exceptions.ChunkedEncodingError,
+            TransferError,
+        ),
+    )
+
+
+def describe_error(error: Exception, url: str) -> str:
+    """
+    Describes why a download failed without the text of `error`. Messages
+    of requests exceptions contain the full url including the token, so
+    only the exception class, the status code and the stripped `url` are
+    used.
+    """
+    if isinstance(error, TransferError):
+        return str(error)
+    if isinstance(error, requests.RequestException):
+        response = error.response
+        if response is not None:
+            return f"HTTP {response.status_code} for {url}"
+        return f"{type(error).__name__} for {url}"
+    # Local file errors, the description of the error code names no url
+    return f"{type(error).__name__}: {getattr(error, 'strerror', None) or 'I/O error'}"
+
+
+class Download:
+    """A file transfer, its progress and its state."""
+
+    __slots__ = (
+        "id",
+        "url",
+        "path",
+        "size",
+        "downloaded",
+        "status",
+        "error",
+        "speed",
+        "created_at",
+        "finished_at",
+        "segments",
+        "validator",
+    )
+
+    # Fields written to the downloads file
+    PERSISTED = (
+        "id",
+        "url",
+        "path",
+        "size",
+        "status",
+        "error",
+        "created_at",
+        "finished_at",
+        "segments",
+        "validator",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        url: str,
+        path: str,
+        size: int = 0,
+        status: str = QUEUED,
+        error: str = "",
+        created_at: Optional[float] = None,
+        finished_at: Optional[float] = None,
+        segments: Optional[list] = None,
+        validator: str = "",
+    ) -> None:
+        self.id = id
+        self.url = url
+        self.path = path
+        self.size = size
+        self.downloaded = 0
+        self.status = status
+        self.error = error
+        # Bytes per second, smoothed
+        self.speed = 0.0
+        self.created_at = created_at or time.time()
+        self.finished_at = finished_at
+        # [start, end, position] of every byte range of a segmented
+        # download, None for downloads over a single stream
+        self.segments = segments
+        # ETag or Last-Modified of the file the .part file belongs to,
+        # sent as If-Range so a changed file is never resumed
+        self.validator = validator
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def part_path(self) -> str:
+        return self.path + PART_SUFFIX
+
+    @property
+    def progress(self) -> Optional[int]:
+        """Percent done, None while the size is unknown."""
+        if self.status == DONE:
+            return 100
+        if not self.size:
+            return None
+        return min(100, int(100 * self.downloaded / self.size))
+
+    def to_dict(self) -> dict:
+        data = {key: getattr(self, key) for key in self.PERSISTED}
+        if self.segments is not None:
+            # A snapshot, the ranges change while the download runs
+            data["segments"] = [list(segment) for segment in self.segments]
+        data.update(
+            downloaded=self.downloaded,
+            speed=self.speed,
+            progress=self.progress,
+            filename=self.filename,
+        )
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Download":
+        return cls(**{key: data[key] for key in cls.PERSISTED if key in data})
+
+    def __repr__(self) -> str:
+        return f"Download({self.id!r}, {self.filename!r}, {self.status!r})"
+
+
+class DownloadManager:
+    """
+    Downloads files in the background, at most `max_downloads` at a time.
+    ....
+    The queue is saved to a JSON file on every state change, downloads
+    that were queued or running when the application quit continue after
+    resume(). Data is streamed to a .part file next to the target with
+    constant memory. Failed attempts and restarts continue from the size of
+    the .part file with an HTTP Range request, the file is renamed to its
+    final name once complete.
+    ....
+    Files of SEGMENT_THRESHOLD bytes and more are fetched in segments when
+    the server answers a probe with a byte range. The .part file is
+    preallocated and every connection writes its range at its offset.
+    Downloads start with INITIAL_SEGMENTS connections and add one while
+    the last one raised the throughput, up to MAX_SEGMENTS. A connection
+    that finishes early takes over half of the largest remaining range.
+    Servers without Range support get a single stream.
+    ....
+    Listeners are called with the Download after every state change and
+    at most every PROGRESS_INTERVAL seconds while it transfers. They run
+    on worker threads. The workers are daemon threads, so a transfer stuck
+    in a slow read never keeps the application from quitting.
+    """
+
+    def __init__(
+        self,
+        moodle_api,
+        path: str = DOWNLOADS_FILE,
+        max_downloads: int = DEFAULT_MAX_DOWNLOADS,
+    ) -> None:
+        self.moodle_api = moodle_api
+        self.path = path
+        self.max_downloads = max_downloads
+        self._downloads = {}
+        self._cancelled = set()
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._queue = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"download-{index}", daemon=True)
+            for index in range(max_downloads)
+        ]
+        for worker in self._workers:
+            worker.start()
+        self._load()
+        self._ids = itertools.count(max(self._downloads, default=0) + 1)
+
+    def add_listener(self, listener: Callable[[Download], None]) -> None:
+        self._listeners.append(listener)
+
+    def _notify(self, download: Download) -> None:
+        for listener in self._listeners:
+            try:
+                listener(download)
+            except Exception as e:
+                logger.warning("Download listener failed: %s", e)
+
+    def downloads(self) -> list[Download]:
+        """All downloads, oldest first."""
+        with self._lock:
+            return list(self._downloads.values())
+
+    def get(self, download_id: int) -> Optional[Download]:
+        return self._downloads.get(download_id)
+
+    def find(self, url: str) -> Optional[Download]:
+        """Returns the latest download of `url`, None if it was never downloaded."""
+        url = strip_token(url)
+        with self._lock:
+            matches = [d for d in self._downloads.values() if d.url == url]
+        return matches[-1] if matches else None
+
+    def enqueue(self, url: str, path: str, size: int = 0) -> Download:
+        """
+        Queues a download of `url` to `path`.
+        ....
+        Args:
+            url (str): File url, a token in it is replaced by the current one.
+            path (str): Target file.
+            size (int): Expected size in bytes, 0 if unknown.
+        ....
+        Returns:
+            Download: The new download, or the unfinished one to the same path.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            for download in self._downloads.values():
+                if download.path == path and download.status not in FINISHED:
+                    return download
+            download = Download(next(self._ids), strip_token(url), path, size)
+            self._downloads[download.id] = download
+            self._save()
+        self._notify(download)
+        self._submit(download)
+        return download
+
+    def resume(self) -> None:
+        """Restarts the downloads left unfinished by the last run."""
+        for download in self.downloads():
+            if download.status in (QUEUED, ACTIVE):
+                download.status = QUEUED
+                self._notify(download)
+                self._submit(download)
+
+    def retry(self, download_id: int) -> None:
+        download = self.get(download_id)
+        if download is None or download.status not in (FAILED, CANCELLED):
+            return
+        with self._lock:
+            self._cancelled.discard(download_id)
+            download.status = QUEUED
+            download.error = ""
+            self._save()
+        self._notify(download)
+        self._submit(download)
+
+    def cancel(self, download_id: int) -> None:
+        """Stops a download and deletes its partial data."""
+        download = self.get(download_id)
+        if download is None or download.status in FINISHED:
+            return
+        with self._lock:
+            self._cancelled.add(download_id)
+            if download.status == QUEUED:
+                self._finish(download, CANCELLED)
+                self._remove_part(download)
+                return
+        # A running download stops at its next chunk
+
+    def remove_finished(self) -> None:
+        with self._lock:
+            for download_id in [
+                d.id for d in self._downloads.values() if d.status in FINISHED
+            ]:
+                del self._downloads[download_id]
+            self._save()
+
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> None:
+        """
+        Interrupts the running downloads, they stay in the queue with their
+        .part files and continue after the next resume(). Waits at most
+        `timeout` seconds for the workers to stop.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        for _ in self._workers:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+        with self._lock:
+            self._save()
+
+    def _submit(self, download: Download) -> None:
+        if not self._closed.is_set():
+            self._queue.put(download)
+
+    def _work(self) -> None:
+        while True:
+            download = self._queue.get()
+            if download is None:
+                return
+            try:
+                self._run(download)
+            except Exception as e:
+                # Keeps the worker alive for the rest of the queue
+                logger.error("Download of %s stopped: %s", download.filename, redact(e))
+                self._finish(download, FAILED)
+
+    def _run(self, download: Download) -> None:
+        if download.status != QUEUED or self._closed.is_set():
+            return
+        download.status = ACTIVE
+        self._notify(download)
+
+        for attempt in range(DOWNLOAD_ATTEMPTS):
+            try:
+                self._transfer(download)
+            except DownloadCancelled:
+                if self._closed.is_set():
+                    # Left active, resumed on the next start
+                    return
+                self._finish(download, CANCELLED)
+                self._remove_part(download)
+                return
+            except (requests.RequestException, OSError) as e:
+                if self._closed.is_set():
+                    return
+                download.error = describe_error(e, download.url)
+                if not is_transient(e):
+                    logger.warning(
+                        "Download of %s failed: %s", download.filename, download.error
+                    )
+                    break
+                logger.warning(
+                    "Download of %s failed (%s), attempt %d of %d",
+                    download.filename,
+                    download.error,
+                    attempt + 1,
+                    DOWNLOAD_ATTEMPTS,
+                )
+                if self._closed.wait(DOWNLOAD_BACKOFF * (2**attempt)):
+                    return
+                continue
+            download.error = ""
+            self._finish(download, DONE)
+            return
+        self._finish(download, FAILED)
+
+    def _finish(self, download: Download, status: str) -> None:
+        with self._lock:
+            download.status = status
+            download.speed = 0.0
+            download.finished_at = time.time()
+            self._save()
+        self._notify(download)
+
+    def _check_cancelled(self, download: Download) -> None:
+        if self._closed.is_set() or download.id in self._cancelled:
+            raise DownloadCancelled()
+
+    def _transfer(self, download: Download) -> None:
+        if download.segments is not None and (
+            self._part_size(download) != download.size or self._changed(download)
+        ):
+            # The preallocated file is gone or the file changed, start over
+            self._remove_part(download)
+        if download.segments is None:
+            # A .part file without segments belongs to a single stream
+            if self._part_size(download) or not self._start_segments(download):
+                self._transfer_stream(download)
+                return
+        self._transfer_segmented(download)
+
+    def _request(
+        self, download: Download, headers: dict, if_range: bool = True
+    ) -> requests.Response:
+        # A changed file is sent in full instead of the requested range
+        if if_range and "Range" in headers and download.validator:
+            headers = dict(headers, **{"If-Range": download.validator})
+        return self.moodle_api.transport.get(
+            download.url,
+            params={"token": self.moodle_api.token},
+            headers=headers,
+            stream=True,
+        )
+
+    def _transfer_stream(self, download: Download) -> None:
+        offset = self._part_size(download)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = self._request(download, headers)
+        with response:
+            if response.status_code == 416 and offset and offset >= download.size:
+                # The .part file already holds the whole file
+                os.replace(download.part_path, download.path)
+                return
+            response.raise_for_status()
+            if offset and response.status_code == 206:
+                if _validator(response) not in ("", download.validator):
+                    # A server ignoring If-Range sent a part of another file
+                    self._remove_part(download)
+                    raise TransferError("The file changed on the server")
+            elif offset:
+                # The server ignored the Range header or the file changed,
+                # it sends everything
+                offset = 0
+            if not offset:
+                with self._lock:
+                    download.validator = _validator(response)
+                    self._save()
+            length = response.headers.get("content-length")
+            if length is not None:
+                download.size = offset + int(length)
+
+            download.downloaded = offset
+            meter = _SpeedMeter(offset)
+            with open(download.part_path, "ab" if offset else "wb") as f:
+                for chunk in _read_chunks(response):
+                    self._check_cancelled(download)
+                    f.write(chunk)
+                    download.downloaded += len(chunk)
+                    if meter.update(download):
+                        self._notify(download)
+
+        if download.size and download.downloaded < download.size:
+            raise TransferError(
+                f"Connection closed after {download.downloaded} of {download.size} bytes"
+            )
+        download.size = download.downloaded
+        os.replace(download.part_path, download.path)
+
+    def _start_segments(self, download: Download) -> bool:
+        """
+        Probes the server for byte ranges and preallocates the .part file.
+        ....
+        Returns:
+            bool: True if the download continues in segments.
+        """
+        if 0 < download.size < SEGMENT_THRESHOLD:
+            # Small enough for one stream, no probe needed
+            return False
+        probe = self._probe(download)
+        if probe is None:
+            logger.info("No byte ranges for %s, using one stream", download.filename)
+            return False
+        download.size = probe[0]
+        if download.size < SEGMENT_THRESHOLD:
+            return False
+
+        with open(download.part_path, "wb") as f:
+            f.truncate(download.size)
+        with self._lock:
+            download.segments = [[0, download.size, 0]]
+            download.validator = probe[1]
+            self._save()
+        return True
+
+    def _probe(self, download: Download) -> Optional[Tuple[int, str]]:
+        """
+        Requests the first byte of the file.
+        ....
+        Returns:
+            tuple: (size, validator), None if the server sends no byte ranges.
+        """
+        # Without If-Range, the probe describes the current file
+        response = self._request(download, {"Range": "bytes=0-0"}, if_range=False)
+        with response:
+            response.raise_for_status()
+            size = _range_total(response.headers.get("content-range"))
+            if response.status_code != 206 or size is None:
+                return None
+            return size, _validator(response)
+
+    def _changed(self, download: Download) -> bool:
+        """Whether the file changed since its segments were started."""
+        probe = self._probe(download)
+        if probe is None or probe[0] != download.size:
+            return True
+        if probe[1] != download.validator:
+            logger.info("%s changed on the server, starting over", download.filename)
+            return True
+        return False
+
+    def _transfer_segmented(self, download: Download) -> None:
+        lock = threading.Lock()
+        stop = threading.Event()
+        download.downloaded = download.size - _remaining(download.segments)
+        meter = _SpeedMeter(download.downloaded)
+        tuner = _ConnectionTuner()
+        # id -> the segments being fetched
+        running = {}
+        # (segment, error) of the connections that ended
+        finished = queue.Queue()
+
+        def fetch(segment):
+            try:
+                self._fetch_segment(download, segment, lock, stop)
+            except Exception as e:
+                finished.put((segment, e))
+            else:
+                finished.put((segment, None))
+
+        try:
+            while True:
+                idle = [
+                    segment
+                    for segment in download.segments
+                    if segment[2] < segment[1] and id(segment) not in running
+                ]
+                while len(running) < tuner.target:
+                    segment = idle.pop(0) if idle else self._split(download, lock)
+                    if segment is None:
+                        break
+                    running[id(segment)] = segment
+                    # Daemon threads, like the download workers
+                    threading.Thread(
+                        target=fetch, args=(segment,), name="download-segment", daemon=True
+                    ).start()
+                if not running:
+                    break
+
+                done = []
+                try:
+                    done.append(finished.get(timeout=PROGRESS_INTERVAL))
+                    while True:
+                        done.append(finished.get_nowait())
+                except queue.Empty:
+                    pass
+                for segment, error in done:
+                    del running[id(segment)]
+                    if error is not None:
+                        raise error
+                if done:
+                    with lock:
+                        download.segments = [
+                            segment
+                            for segment in download.segments
+                            if segment[2] < segment[1]
+                        ]
+                self._check_cancelled(download)
+                if meter.update(download):
+                    tuner.update(download.speed, len(running))
+                    self._notify(download)
+        finally:
+            # Connections still running stop before their next write
+            stop.set()
+
+        with self._lock:
+            download.segments = None
+        download.downloaded = download.size
+        os.replace(download.part_path, download.path)
+
+    def _fetch_segment(
+        self, download: Download, segment: list, lock: threading.Lock, stop: threading.Event
+    ) -> None:
+        """Writes the byte range of `segment` into the .part file."""
+        headers = {"Range": f"bytes={segment[2]}-{segment[1] - 1}"}
+        with self._request(download, headers) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise TransferError("The server stopped sending byte ranges")
+            if _validator(response) not in ("", download.validator):
+                raise TransferError("The file changed on the server")
+            with open(download.part_path, "r+b") as f:
+                for chunk in _read_chunks(response):
+                    with lock:
+                        if stop.is_set():
+                            return
+                        # The end moves forward when the range was split
+                        length = min(len(chunk), segment[1] - segment[2])
+                        f.seek(segment[2])
+                        f.write(chunk[:length])
+                        segment[2] += length
+                        download.downloaded += length
+                    if segment[2] >= segment[1]:
+                        return
+        if not stop.is_set():
+            raise TransferError(
+                f"Connection closed {segment[1] - segment[2]} bytes before the end"
+                " of a segment"
+            )
+
+    @staticmethod
+    def _split(download: Download, lock: threading.Lock) -> Optional[list]:
+        """Hands the upper half of the largest remaining range to a new segment."""
+        with lock:
+            segment = max(download.segments, key=lambda s: s[1] - s[2], default=None)
+            if segment is None or segment[1] - segment[2] < 2 * MIN_SEGMENT_SIZE:
+                return None
+            middle = segment[2] + (segment[1] - segment[2]) // 2
+            new = [middle, segment[1], middle]
+            # Added before the old range shrinks, a save in between sees an
+            # overlap and never a gap
+            download.segments.append(new)
+            segment[1] = middle
+        return new
+
+    @staticmethod
+    def _part_size(download: Download) -> int:
+        try:
+            return os.path.getsize(download.part_path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _remove_part(download: Download) -> None:
+        # The segments and the validator describe the .part file
+        download.segments = None
+        download.validator = ""
+        try:
+            os.remove(download.part_path)
+        except OSError:
+            pass
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not read %s, starting with an empty queue: %s", self.path, e)
+            return
+        for entry in data.get("downloads", []):
+            download = Download.from_dict(entry)
+            # Queues written by older versions stored raw exception text
+            download.error = redact(download.error)
+            if download.segments is not None:
+                download.downloaded = download.size - _remaining(download.segments)
+            elif download.status not in FINISHED:
+                download.downloaded = self._part_size(download)
+            self._downloads[download.id] = download
+
+    def _save(self) -> None:
+        # Called with the lock held, written to a temporary file and renamed
+        data = {
+            "downloads": [
+                {key: getattr(download, key) for key in Download.PERSISTED}
+                for download in self._downloads.values()
+            ]
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning("Could not save the download queue: %s", e)
+
+
+class _SpeedMeter:
+    """Smoothed transfer rate, updated at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, downloaded: int) -> None:
+        self.last_time = time.monotonic()
+        self.last_bytes = downloaded
+
+    def update(self, download: Download) -> bool:
+        """Updates download.speed, returns True when listeners are due."""
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed < PROGRESS_INTERVAL:
+            return False
+        rate = (download.downloaded - self.last_bytes) / elapsed
+        download.speed = rate if not download.speed else 0.7 * download.speed + 0.3 * rate
+        self.last_time = now
+        self.last_bytes = download.downloaded
+        return True
+
+
+class _ConnectionTuner:
+    """
+    Number of connections of a segmented download. Adds one every
+    TUNE_INTERVAL seconds while the last one raised the throughput by
+    SEGMENT_GAIN, then settles.
+    """
+
+    def __init__(self) -> None:
+        self.target = INITIAL_SEGMENTS
+        self.rate = 0.0
+        self.changed_at = time.monotonic()
+        self.settled = False
+
+    def update(self, speed: float, connections: int) -> None:
+        now = time.monotonic()
+        if (
+            self.settled
+            or connections < self.target
+            or now - self.changed_at < TUNE_INTERVAL
+        ):
+            return
+        if speed >= self.rate * SEGMENT_GAIN and self.target < MAX_SEGMENTS:
+            self.rate = speed
+            self.target += 1
+        else:
+            # The last connection did not help, or the maximum is reached
+            if speed < self.rate * SEGMENT_GAIN:
+                self.target -= 1
+            self.settled = True
+        self.changed_at = now
+
+
+def _read_chunks(response: requests.Response):
+    """Yields the body of `response` in chunks of about CHUNK_SECONDS of data."""
+    chunk_size = MIN_CHUNK_SIZE
+    while True:
+        started = time.monotonic()
+        try:
+            chunk = response.raw.read(chunk_size, decode_content=True)
+        except Urllib3Error as e:
+            # Raised like requests does for broken or timed out reads
+            raise requests.ConnectionError(e) from e
+        if not chunk:
+            return
+        elapsed = max(time.monotonic() - started, 1e-3)
+        # Small reads keep slow links responsive to cancelling, large ones
+        # keep the overhead per chunk low on fast links
+        chunk_size = int(
+            min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, len(chunk) / elapsed * CHUNK_SECONDS))
+        )
+        yield chunk
+
+
+def _validator(response: requests.Response) -> str:
+    """
+    Returns the strong ETag or the Last-Modified date of a response, weak
+    ETags cannot be used in If-Range.
+    """
+    etag = response.headers.get("etag") or ""
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("last-modified") or ""
+
+
+def _range_total(content_range: Optional[str]) -> Optional[int]:
+    """Returns the full size from a "bytes 0-0/1234" Content-Range header."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def _remaining(segments: list) -> int:
+    return sum(max(0, end - position) for _, end, position in segments)
@@ -0,0 +1,52 @@
+"""
+Bounded-concurrency fetch engine used to fan out Moodle API calls.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def fetch_concurrently(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Iterator[Tuple[Any, Any]]:
+    """
+    Calls `func` for every item on a bounded thread pool.
+    ....
+    Results are yielded as soon as each call finishes, so callers can
+    process partial results while slower calls are still running.
+    A failing call is logged and yielded with a result of None instead
+    of aborting the remaining calls.
+    ....
+    Args:
+        func (Callable): Function called with a single item.
+        items (Iterable): Items to fetch.
+        max_workers (int): Maximum number of calls running at the same time.
+    ....
+    Yields:
+        tuple: (item, result) in completion order.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as executor:
+        futures = {executor.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error("Fetching %s failed: %s", item, e)
+                result = None
+            yield item, result
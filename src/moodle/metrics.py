@@ -0,0 +1,165 @@
+"""
+Request metrics for the Moodle API, recorded per wsfunction.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import json
+import math
+import threading
+from typing import Optional
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+class FunctionStats:
+    """Counters and a latency histogram for one wsfunction or course."""
+
+    __slots__ = (
+        "requests",
+        "errors",
+        "bytes",
+        "cache_hits",
+        "retries",
+        "coalesced",
+        "total_time",
+        "max_time",
+        "buckets",
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.cache_hits = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def record(self, latency: float, nbytes: int, error: bool) -> None:
+        self.requests += 1
+        self.errors += int(error)
+        self.bytes += nbytes
+        self.total_time += latency
+        self.max_time = max(self.max_time, latency)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+                break
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Estimates a latency percentile from the histogram, returns the upper
+        bound of the bucket containing it (capped at the maximum latency).
+        """
+        if not self.requests:
+            return 0.0
+        rank = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max_time)
+        return self.max_time
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "total_time": round(self.total_time, 6),
+            "avg_time": round(self.total_time / self.requests, 6)
+            if self.requests
+            else 0.0,
+            "p50": round(self.percentile(0.5), 6),
+            "p95": round(self.percentile(0.95), 6),
+            "max_time": round(self.max_time, 6),
+            "histogram": {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS, self.buckets)
+            },
+        }
+
+
+class ApiMetrics:
+    """
+    Thread-safe collection of FunctionStats.
+    ....
+    Requests are recorded per wsfunction. Requests for a single course are
+    also recorded per course id, so the courses dominating a refresh stand out.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._functions = {}
+        self._courses = {}
+
+    def _stats(self, wsfunction: str) -> FunctionStats:
+        stats = self._functions.get(wsfunction)
+        if stats is None:
+            stats = self._functions[wsfunction] = FunctionStats()
+        return stats
+
+    def record_request(
+        self,
+        wsfunction: str,
+        latency: float,
+        nbytes: int = 0,
+        error: bool = False,
+        course_id: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            self._stats(wsfunction).record(latency, nbytes, error)
+            if course_id is not None:
+                stats = self._courses.get(course_id)
+                if stats is None:
+                    stats = self._courses[course_id] = FunctionStats()
+                stats.record(latency, nbytes, error)
+
+    def record_cache_hit(self, wsfunction: str) -> None:
+        with self._lock:
+            self._stats(wsfunction).cache_hits += 1
+
+    def record_retry(self, wsfunction: str) -> None:
+        with self._lock:
+            self._stats(wsfunction).retries += 1
+
+    def record_coalesced(self, wsfunction: str) -> None:
+        with self._lock:
+            self._stats(wsfunction).coalesced += 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: {"functions": {wsfunction: stats}, "courses": {id: stats}}
+            with every stats entry converted to a plain dict.
+        """
+        with self._lock:
+            return {
+                "functions": {
+                    name: stats.to_dict() for name, stats in self._functions.items()
+                },
+                "courses": {
+                    str(course_id): stats.to_dict()
+                    for course_id, stats in self._courses.items()
+                },
+            }
+
+    def to_json(self, indent: Optional[int] = 4) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._functions.clear()
+            self._courses.clear()
@@ -0,0 +1,242 @@
+"""
+Local SQLite mirror of the Moodle data shown by the client.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .models import Course, Section, parse_courses, parse_sections
+
+logger = logging.getLogger(__name__)
+
+MIRROR_FILE = "koodle.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    course_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    id INTEGER,
+    data TEXT NOT NULL,
+    PRIMARY KEY (course_id, position)
+);
+CREATE TABLE IF NOT EXISTS modules (
+    course_id INTEGER NOT NULL,
+    section INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    id INTEGER,
+    timemodified INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL,
+    PRIMARY KEY (course_id, section, position)
+);
+CREATE INDEX IF NOT EXISTS idx_modules_id ON modules (id);
+CREATE INDEX IF NOT EXISTS idx_modules_timemodified ON modules (course_id, timemodified);
+CREATE TABLE IF NOT EXISTS grades (
+    course_id INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    synced_at INTEGER NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+"""
+
+
+def _digest(data) -> str:
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+class OfflineMirror:
+    """
+    Stores the course list, course contents and grades in SQLite.
+    ....
+    The mirror is written by the SyncEngine after every successful request
+    and read by the GUI before anything is requested, so views open
+    instantly and keep working offline. Every thread gets its own
+    connection, the database runs in WAL mode so reads never wait for a
+    sync in progress.
+    ....
+    Every save returns whether the data differs from the stored copy, so
+    callers only re-render what actually changed.
+    """
+
+    def __init__(self, path: str = MIRROR_FILE) -> None:
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _changed(self, connection, kind: str, id: int, digest: str) -> bool:
+        row = connection.execute(
+            "SELECT digest FROM sync_state WHERE kind = ? AND id = ?", (kind, id)
+        ).fetchone()
+        connection.execute(
+            "INSERT OR REPLACE INTO sync_state (kind, id, digest, synced_at) VALUES (?, ?, ?, ?)",
+            (kind, id, digest, int(time.time())),
+        )
+        return row is None or row[0] != digest
+
+    def synced_at(self, kind: str, id: int = 0) -> Optional[int]:
+        """
+        Returns the time of the last sync of "courses", "contents" or
+        "grades" for the given course id, None if it was never synced.
+        """
+        row = self._connect().execute(
+            "SELECT synced_at FROM sync_state WHERE kind = ? AND id = ?", (kind, id)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_courses(self, courses: list[dict]) -> bool:
+        """Replaces the course list, returns True if it changed."""
+        with self._connect() as connection:
+            if not self._changed(connection, "courses", 0, _digest(courses)):
+                return False
+            connection.execute("DELETE FROM courses")
+            connection.executemany(
+                "INSERT OR REPLACE INTO courses (id, position, data) VALUES (?, ?, ?)",
+                [
+                    (course["id"], position, json.dumps(course))
+                    for position, course in enumerate(courses)
+                ],
+            )
+        return True
+
+    def load_courses(self) -> Optional[list[Course]]:
+        """Returns the mirrored course list, None if it was never synced."""
+        if self.synced_at("courses") is None:
+            return None
+        rows = self._connect().execute(
+            "SELECT data FROM courses ORDER BY position"
+        ).fetchall()
+        return parse_courses([json.loads(data) for data, in rows])
+
+    def save_course_content(self, course_id: int, sections: list[dict]) -> bool:
+        """Replaces the content of a course, returns True if it changed."""
+        with self._connect() as connection:
+            if not self._changed(connection, "contents", course_id, _digest(sections)):
+                return False
+            connection.execute("DELETE FROM sections WHERE course_id = ?", (course_id,))
+            connection.execute("DELETE FROM modules WHERE course_id = ?", (course_id,))
+            section_rows = []
+            module_rows = []
+            for position, section in enumerate(sections):
+                modules = section.get("modules") or []
+                section = {key: value for key, value in section.items() if key != "modules"}
+                section_rows.append(
+                    (course_id, position, section.get("id"), json.dumps(section))
+                )
+                for index, module in enumerate(modules):
+                    module_rows.append(
+                        (
+                            course_id,
+                            position,
+                            index,
+                            module.get("id"),
+                            module.get("timemodified") or 0,
+                            json.dumps(module),
+                        )
+                    )
+            connection.executemany(
+                "INSERT INTO sections (course_id, position, id, data) VALUES (?, ?, ?, ?)",
+                section_rows,
+            )
+            connection.executemany(
+                "INSERT INTO modules (course_id, section, position, id, timemodified, data) VALUES (?, ?, ?, ?, ?, ?)",
+                module_rows,
+            )
+        return True
+
+    def load_course_content(self, course_id: int) -> Optional[list[dict]]:
+        """
+        Returns the mirrored core_course_get_contents response of a course,
+        None if the course was never synced.
+        """
+        if self.synced_at("contents", course_id) is None:
+            return None
+        connection = self._connect()
+        sections = []
+        for (data,) in connection.execute(
+            "SELECT data FROM sections WHERE course_id = ? ORDER BY position",
+            (course_id,),
+        ):
+            section = json.loads(data)
+            section["modules"] = []
+            sections.append(section)
+        for position, data in connection.execute(
+            "SELECT section, data FROM modules WHERE course_id = ? ORDER BY section, position",
+            (course_id,),
+        ):
+            if position < len(sections):
+                sections[position]["modules"].append(json.loads(data))
+        return sections
+
+    def load_sections(self, course_id: int) -> Optional[list[Section]]:
+        return parse_sections(self.load_course_content(course_id))
+
+    def save_grades(self, course_id: int, grades: dict) -> bool:
+        """Replaces the grades of a course, returns True if they changed."""
+        with self._connect() as connection:
+            if not self._changed(connection, "grades", course_id, _digest(grades)):
+                return False
+            connection.execute(
+                "INSERT OR REPLACE INTO grades (course_id, data) VALUES (?, ?)",
+                (course_id, json.dumps(grades)),
+            )
+        return True
+
+    def load_grades(self, course_id: int) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT data FROM grades WHERE course_id = ?", (course_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_site_info(self, site_info: dict) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, data) VALUES ('site_info', ?)",
+                (json.dumps(site_info),),
+            )
+
+    def load_site_info(self) -> Optional[dict]:
+        """Returns the last known site info, None if it was never synced."""
+        row = self._connect().execute(
+            "SELECT data FROM meta WHERE key = 'site_info'"
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear(self) -> None:
+        """Deletes all mirrored data, e.g. on logout."""
+        with self._connect() as connection:
+            for table in ("courses", "sections", "modules", "grades", "meta", "sync_state"):
+                connection.execute(f"DELETE FROM {table}")
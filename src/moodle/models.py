@@ -0,0 +1,192 @@
+"""
+Compact models for the Moodle course data used by the client.
+
+Only the fields the client reads are kept. The classes use __slots__ and
+intern short, frequently repeated strings, so large course trees take
+much less memory than the raw JSON dicts.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+from sys import intern
+from typing import Iterable, Optional
+
+
+def _text(data: dict, key: str) -> str:
+    return (data.get(key) or "").strip()
+
+
+class FileContent:
+    """A file or url attached to a module."""
+
+    __slots__ = ("type", "filename", "fileurl", "filesize", "timemodified")
+
+    def __init__(
+        self,
+        type: str,
+        filename: str,
+        fileurl: str,
+        filesize: int = 0,
+        timemodified: int = 0,
+    ) -> None:
+        self.type = type
+        self.filename = filename
+        self.fileurl = fileurl
+        self.filesize = filesize
+        self.timemodified = timemodified
+
+    @classmethod
+    def from_json(cls, data: dict) -> "FileContent":
+        return cls(
+            intern(data.get("type") or ""),
+            data.get("filename") or "",
+            data.get("fileurl") or "",
+            data.get("filesize") or 0,
+            data.get("timemodified") or 0,
+        )
+
+    def __repr__(self) -> str:
+        return f"FileContent({self.type!r}, {self.filename!r})"
+
+
+class Module:
+    """An activity or resource inside a course section."""
+
+    __slots__ = ("id", "name", "modname", "url", "description", "timemodified", "contents")
+
+    def __init__(
+        self,
+        id: int,
+        name: str,
+        modname: str = "",
+        url: str = "",
+        description: str = "",
+        timemodified: int = 0,
+        contents: Optional[list] = None,
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.modname = modname
+        self.url = url
+        self.description = description
+        self.timemodified = timemodified
+        self.contents = contents or []
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Module":
+        return cls(
+            data.get("id"),
+            _text(data, "name"),
+            intern(data.get("modname") or ""),
+            data.get("url") or "",
+            _text(data, "description"),
+            data.get("timemodified") or 0,
+            [FileContent.from_json(content) for content in data.get("contents") or ()],
+        )
+
+    @property
+    def files(self) -> list[FileContent]:
+        return [content for content in self.contents if content.type == "file"]
+
+    def __repr__(self) -> str:
+        return f"Module({self.id!r}, {self.name!r})"
+
+
+class Section:
+    """A section of a course with its modules."""
+
+    __slots__ = ("id", "name", "summary", "modules")
+
+    def __init__(
+        self, id: int, name: str, summary: str = "", modules: Optional[list] = None
+    ) -> None:
+        self.id = id
+        self.name = name
+        self.summary = summary
+        self.modules = modules or []
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Section":
+        return cls(
+            data.get("id"),
+            _text(data, "name"),
+            _text(data, "summary"),
+            [Module.from_json(module) for module in data.get("modules") or ()],
+        )
+
+    def __repr__(self) -> str:
+        return f"Section({self.id!r}, {self.name!r})"
+
+
+class Course:
+    """A course the user is enrolled in."""
+
+    __slots__ = (
+        "id",
+        "shortname",
+        "fullname",
+        "summary",
+        "enrolledusercount",
+        "overviewfiles",
+        "has_update",
+        "changes",
+    )
+
+    def __init__(
+        self,
+        id: int,
+        shortname: str,
+        fullname: str = "",
+        summary: str = "",
+        enrolledusercount: int = 0,
+        overviewfiles: Optional[list] = None,
+    ) -> None:
+        self.id = id
+        self.shortname = shortname
+        self.fullname = fullname
+        self.summary = summary
+        self.enrolledusercount = enrolledusercount
+        self.overviewfiles = overviewfiles or []
+        self.has_update = False
+        # StateDiff of the last detected update, shown by the course page
+        self.changes = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Course":
+        return cls(
+            data.get("id"),
+            data.get("shortname") or "",
+            data.get("fullname") or "",
+            data.get("summary") or "",
+            data.get("enrolledusercount") or 0,
+            [FileContent.from_json(file) for file in data.get("overviewfiles") or ()],
+        )
+
+    @property
+    def image_url(self) -> str:
+        """The url of the course image, empty if the course has none."""
+        return self.overviewfiles[0].fileurl if self.overviewfiles else ""
+
+    @property
+    def image_timemodified(self) -> int:
+        """When the course image was last changed, 0 if unknown."""
+        return self.overviewfiles[0].timemodified if self.overviewfiles else 0
+
+    def __repr__(self) -> str:
+        return f"Course({self.id!r}, {self.shortname!r})"
+
+
+def parse_courses(data: Optional[Iterable[dict]]) -> Optional[list[Course]]:
+    """Parses a core_enrol_get_users_courses response, None stays None."""
+    if not isinstance(data, list):
+        return None
+    return [Course.from_json(course) for course in data]
+
+
+def parse_sections(data: Optional[Iterable[dict]]) -> Optional[list[Section]]:
+    """Parses a core_course_get_contents response, None stays None."""
+    if not isinstance(data, list):
+        return None
+    return [Section.from_json(section) for section in data]
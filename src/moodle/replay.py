@@ -0,0 +1,300 @@
+"""
+Record and replay of HTTP traffic to the Moodle instance.
+
+RecordingTransport stores every request/response pair in a cassette file,
+ReplayTransport answers requests from that file without network access,
+either with the recorded latency or immediately.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import base64
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.exceptions import RequestException
+from requests.structures import CaseInsensitiveDict
+
+from .transport import HttpTransport
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+TIMING_ORIGINAL = "original"
+TIMING_ZERO = "zero"
+# Parameters left out of the cassette keys, credentials are never stored
+SECRET_PARAMS = frozenset({"wstoken", "token", "username", "password"})
+# Parameters whose values are redacted wherever they appear in a body
+TOKEN_PARAMS = frozenset({"wstoken", "token"})
+REDACTED = "REDACTED"
+# Response headers kept in the cassette
+_KEPT_HEADERS = ("Content-Type", "Content-Range", "Accept-Ranges")
+# Request headers that select a different response, part of the keys
+_KEY_HEADERS = ("Range", "If-Range")
+
+
+class CassetteMiss(RequestException):
+    """Raised when a replayed request was never recorded."""
+
+
+def request_key(
+    method: str,
+    url: str,
+    data: Optional[dict] = None,
+    headers: Optional[dict] = None,
+) -> str:
+    """
+    Builds the key a request is recorded under.
+    ....
+    The key consists of the method, the URL path and all query and form
+    parameters except the secrets, so a cassette recorded with one token
+    replays with any other. Web service calls are distinguished by their
+    wsfunction and params, partial downloads by their Range and If-Range
+    headers.
+    """
+    parts = urlsplit(url)
+    params = [
+        (key, str(value))
+        for key, value in parse_qsl(parts.query) + list((data or {}).items())
+        if key not in SECRET_PARAMS and value is not None
+    ]
+    path = parts.path.replace("//", "/")
+    key = f"{method.upper()} {path}?{urlencode(sorted(params))}"
+    headers = CaseInsensitiveDict(headers or {})
+    for name in _KEY_HEADERS:
+        if headers.get(name):
+            key += f" {name}: {headers[name]}"
+    return key
+
+
+def _make_response(entry: dict, url: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers = CaseInsensitiveDict(entry.get("headers") or {})
+    response.url = url
+    response.encoding = "utf-8"
+    if entry.get("base64"):
+        response._content = base64.b64decode(entry["body"])
+    else:
+        response._content = entry["body"].encode("utf-8")
+    # Lets iter_content() serve the body in chunks like a streamed response
+    response._content_consumed = True
+    return response
+
+
+class RecordingTransport(HttpTransport):
+    """
+    An HttpTransport that records every response into a cassette.
+    ....
+    Streamed responses, the file downloads, are passed through without
+    being recorded, so large files are never held in memory. Tokens are
+    stripped from the keys and redacted in the bodies. The cassette is
+    written by save() and close().
+    """
+
+    def __init__(self, path: str, **kwargs) -> None:
+        """
+        Args:
+            path (str): Cassette file, existing entries are kept.
+            **kwargs: Passed to HttpTransport.
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = _load(path) if os.path.exists(path) else []
+        self._secrets = set()
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        on_retry: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        started = time.perf_counter()
+        response = super().request(
+            method, url, idempotent=idempotent, on_retry=on_retry, **kwargs
+        )
+        if kwargs.get("stream"):
+            return response
+        body = response.content
+        elapsed = time.perf_counter() - started
+        data = kwargs.get("data") if isinstance(kwargs.get("data"), dict) else None
+        self._record(
+            method, url, data, kwargs.get("headers"), response, body, elapsed
+        )
+        return response
+
+    def _record(self, method, url, data, headers, response, body, elapsed) -> None:
+        for key, value in parse_qsl(urlsplit(url).query) + list((data or {}).items()):
+            if key in TOKEN_PARAMS and value:
+                self._secrets.add(str(value))
+
+        entry = {
+            "key": request_key(method, url, data, headers),
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in _KEPT_HEADERS
+                if name in response.headers
+            },
+            "elapsed": round(elapsed, 4),
+        }
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            entry["base64"] = True
+            entry["body"] = base64.b64encode(body).decode("ascii")
+        else:
+            if urlsplit(url).path.endswith("/login/token.php"):
+                text = _redact_login(text, self._secrets)
+            entry["body"] = text
+
+        with self._lock:
+            self._entries.append(entry)
+
+    def save(self) -> None:
+        """Writes the cassette atomically, redacting every token seen so far."""
+        with self._lock:
+            entries = list(self._entries)
+            secrets = sorted(self._secrets, key=len, reverse=True)
+
+        for entry in entries:
+            if not entry.get("base64"):
+                for secret in secrets:
+                    entry["body"] = entry["body"].replace(secret, REDACTED)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_dump(entries))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+        logger.info("Recorded %d responses to %s", len(entries), self.path)
+
+    def close(self) -> None:
+        self.save()
+        super().close()
+
+
+class ReplayTransport:
+    """
+    Answers requests from a cassette instead of the network.
+    ....
+    Responses recorded several times for the same key are replayed in the
+    order they were recorded, the last one is repeated once they run out.
+    Requests missing from the cassette raise CassetteMiss, which MoodleAPI
+    handles like any other failed request.
+    """
+
+    def __init__(self, path: str, timing: str = TIMING_ORIGINAL) -> None:
+        """
+        Args:
+            path (str): Cassette file written by RecordingTransport.
+            timing (str): "original" to wait the recorded latency before
+                every response, "zero" to answer immediately.
+        """
+        if timing not in (TIMING_ORIGINAL, TIMING_ZERO):
+            raise ValueError(f"Unknown replay timing: {timing}")
+        self.path = path
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._positions = {}
+        for entry in _load(path):
+            self._entries.setdefault(entry["key"], []).append(entry)
+
+    def prewarm(self, url: str) -> None:
+        pass
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        on_retry: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        data = kwargs.get("data") if isinstance(kwargs.get("data"), dict) else None
+        key = request_key(method, url, data, kwargs.get("headers"))
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"No recorded response for {key}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            entry = entries[min(position, len(entries) - 1)]
+
+        if self.timing == TIMING_ORIGINAL:
+            time.sleep(entry["elapsed"])
+        return _make_response(entry, url)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        pass
+
+
+def _redact_login(text: str, secrets: set) -> str:
+    # token.php answers with the token itself, keep the response usable
+    try:
+        result = json.loads(text)
+    except ValueError:
+        return text
+    if isinstance(result, dict):
+        for field in ("token", "privatetoken"):
+            if result.get(field):
+                secrets.add(result[field])
+                result[field] = REDACTED
+    return json.dumps(result)
+
+
+def _dump(entries: list[dict]) -> bytes:
+    cassette = {"version": CASSETTE_VERSION, "entries": entries}
+    return gzip.compress(json.dumps(cassette, separators=(",", ":")).encode("utf-8"))
+
+
+def _load(path: str) -> list[dict]:
+    with gzip.open(path, "rb") as f:
+        cassette = json.loads(f.read().decode("utf-8"))
+    if cassette.get("version") != CASSETTE_VERSION:
+        raise ValueError(f"Unsupported cassette version in {path}")
+    return cassette["entries"]
+
+
+def transport_from_env(**kwargs) -> Optional[HttpTransport]:
+    """
+    Creates a recording or replaying transport if requested by the
+    environment, None otherwise.
+    ....
+    KOODLE_RECORD=path records all traffic to a cassette,
+    KOODLE_REPLAY=path replays one, KOODLE_REPLAY_TIMING=zero
+    skips the recorded latency. `kwargs` are passed to the recording
+    HttpTransport.
+    """
+    if os.getenv("KOODLE_REPLAY"):
+        return ReplayTransport(
+            os.environ["KOODLE_REPLAY"],
+            os.getenv("KOODLE_REPLAY_TIMING", TIMING_ORIGINAL),
+        )
+    if os.getenv("KOODLE_RECORD"):
+        return RecordingTransport(os.environ["KOODLE_RECORD"], **kwargs)
+    return None
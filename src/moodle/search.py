@@ -0,0 +1,220 @@
+"""
+Fuzzy search over the course list.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import threading
+import unicodedata
+from typing import Iterable, Optional
+
+from .models import Course
+
+# Scores of the ways a query token can match a course token
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.9
+ACRONYM_SCORE = 0.8
+SUBSTRING_SCORE = 0.6
+TYPO_SCORE = 0.5
+# Query tokens shorter than this share no trigram with the middle of a
+# course token, they are also matched as plain substrings of the names
+MIN_TRIGRAM_TOKEN = 3
+
+
+def normalize(text: str) -> str:
+    """Lowercases `text` and strips accents and punctuation."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return "".join(char if char.isalnum() else " " for char in text.casefold())
+
+
+def trigrams(token: str, prefix: bool = False) -> set[str]:
+    """
+    Returns the trigrams of a token padded like "  token ", so short tokens
+    and the start of a token get trigrams too. With `prefix` the end is not
+    padded, so a partial query shares trigrams with the full token.
+    """
+    padded = f"  {token}" if prefix else f"  {token} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein distance of `a` and `b`, capped at `limit + 1`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost
+            )
+            if (
+                previous2 is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _typo_limit(token: str) -> int:
+    # Short tokens must match exactly, longer ones may contain typos
+    if len(token) < 4:
+        return 0
+    return 1 if len(token) < 8 else 2
+
+
+class _Entry:
+    __slots__ = ("key", "text", "tokens", "acronym", "trigrams")
+
+    def __init__(self, course: Course) -> None:
+        self.key = (course.shortname, course.fullname)
+        # Lowercased names for the plain substring fallback
+        self.text = f"{course.shortname or ''}\n{course.fullname or ''}".lower()
+        words = normalize(f"{course.shortname} {course.fullname}").split()
+        self.tokens = tuple(dict.fromkeys(words))
+        fullname = normalize(course.fullname).split()
+        self.acronym = "".join(word[0] for word in fullname) if len(fullname) > 1 else ""
+        self.trigrams = set()
+        for token in self.tokens + ((self.acronym,) if self.acronym else ()):
+            self.trigrams |= trigrams(token)
+
+
+class CourseSearchIndex:
+    """
+    Ranks courses by how well their short and full names match a query.
+    ....
+    Normalized tokens, acronyms and trigrams are computed once per course
+    and only recomputed when its names change. A query token matches a
+    course token exactly, as a prefix, as a prefix of the acronym of the
+    full name ("eidi" for "Einführung in die Informatik"), as a substring
+    or with a small number of typos. Every query token must match.
+    Queries with tokens too short for trigrams also match every course
+    whose names contain the query as typed.
+    ....
+    The index is thread-safe, it is updated on the GUI thread and searched
+    from worker threads.
+    """
+
+    def __init__(self) -> None:
+        self._entries = {}
+        # Trigram -> ids of the courses containing it
+        self._postings = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, courses: Iterable[Course]) -> int:
+        """
+        Indexes new and renamed courses and drops the ones not in `courses`.
+        ....
+        Returns:
+            int: Number of courses that were (re)indexed or dropped.
+        """
+        courses = {course.id: course for course in courses}
+        changed = 0
+        with self._lock:
+            for course_id in set(self._entries) - set(courses):
+                self._remove(course_id)
+                changed += 1
+            for course_id, course in courses.items():
+                entry = self._entries.get(course_id)
+                if entry is not None and entry.key == (course.shortname, course.fullname):
+                    continue
+                if entry is not None:
+                    self._remove(course_id)
+                entry = _Entry(course)
+                self._entries[course_id] = entry
+                for trigram in entry.trigrams:
+                    self._postings.setdefault(trigram, set()).add(course_id)
+                changed += 1
+        return changed
+
+    def _remove(self, course_id: int) -> None:
+        entry = self._entries.pop(course_id)
+        for trigram in entry.trigrams:
+            posting = self._postings.get(trigram)
+            if posting is not None:
+                posting.discard(course_id)
+                if not posting:
+                    del self._postings[trigram]
+
+    def search(self, query: str, limit: Optional[int] = None) -> list[tuple[int, float]]:
+        """
+        Returns:
+            list: (course id, score) of the matching courses, best first.
+            Scores are between 0 and 1.
+        """
+        query_tokens = list(dict.fromkeys(normalize(query).split()))
+        plain = query.lower()
+        short = any(len(token) < MIN_TRIGRAM_TOKEN for token in query_tokens)
+        if not plain:
+            return []
+
+        with self._lock:
+            # Only courses sharing a trigram with every query token can match
+            candidates = None
+            for token in query_tokens:
+                matches = set()
+                for trigram in trigrams(token, prefix=True):
+                    matches |= self._postings.get(trigram, set())
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    break
+
+            results = []
+            for course_id in candidates or ():
+                entry = self._entries[course_id]
+                total = 0.0
+                for token in query_tokens:
+                    score = self._score(token, entry)
+                    if not score:
+                        break
+                    total += score
+                else:
+                    results.append((course_id, total / len(query_tokens)))
+
+            if short or not query_tokens:
+                # Short tokens like "23" in "INF1-WS23" are found by a scan
+                found = {course_id for course_id, _ in results}
+                results.extend(
+                    (course_id, SUBSTRING_SCORE)
+                    for course_id, entry in self._entries.items()
+                    if course_id not in found and plain in entry.text
+                )
+
+        results.sort(key=lambda result: result[1], reverse=True)
+        return results[:limit] if limit else results
+
+    @staticmethod
+    def _score(query: str, entry: _Entry) -> float:
+        best = 0.0
+        if entry.acronym.startswith(query) and len(query) > 1:
+            best = ACRONYM_SCORE
+        limit = _typo_limit(query)
+        for token in entry.tokens:
+            if token == query:
+                return EXACT_SCORE
+            if token.startswith(query):
+                best = max(best, PREFIX_SCORE)
+            elif len(query) > 2 and query in token:
+                best = max(best, SUBSTRING_SCORE)
+            elif limit and best < TYPO_SCORE:
+                # Compare with the start of the token, so typos in a
+                # partial query still match
+                distance = _distance(query, token[: len(query) + 1], limit)
+                distance = min(distance, _distance(query, token[: len(query)], limit))
+                if distance <= limit:
+                    best = TYPO_SCORE - 0.1 * (distance - 1)
+        return best
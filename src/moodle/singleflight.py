@@ -0,0 +1,94 @@
+"""
+Single-flight coalescing of identical in-flight requests.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import threading
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Makes sure only one request per key is in flight at a time.
+    ....
+    The first caller for a key becomes the leader and performs the request,
+    callers arriving while it runs wait for the leader's result instead of
+    sending a duplicate. `saved` counts the requests that were not sent.
+    """
+
+    def __init__(self) -> None:
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.saved = 0
+
+    def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Any],
+        on_join: Optional[Callable[[], None]] = None,
+    ) -> Any:
+        """
+        Runs `func` unless a call with the same key is in flight.
+        `on_join` is called when the caller joins a call in flight instead.
+        """
+        call, leader = self.begin(key)
+        if not leader:
+            if on_join is not None:
+                on_join()
+            return self.wait(call)
+
+        result = error = None
+        try:
+            result = func()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish(key, call, result, error)
+        return result
+
+    def begin(self, key: Hashable) -> Tuple[_Call, bool]:
+        """
+        Registers interest in a key.
+        ....
+        Returns:
+            tuple: (call, leader). A leader must perform the request and pass
+            its outcome to finish(), other callers pass the call to wait().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.saved += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(
+        self, key: Hashable, call: _Call, result: Any = None, error: BaseException = None
+    ) -> None:
+        """Publishes the leader's outcome to every waiting caller."""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    def wait(self, call: _Call) -> Any:
+        """Waits for the leader and returns its result."""
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
@@ -0,0 +1,152 @@
+"""
+Compact course state digests for change detection.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import hashlib
+from typing import Iterable, Optional
+
+from .models import Section
+
+# Hex digits kept of every hash, enough to tell the states of a course apart
+DIGEST_LENGTH = 16
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:DIGEST_LENGTH]
+
+
+class StateDiff:
+    """The sections and modules added, removed or modified between two states."""
+
+    __slots__ = (
+        "added_sections",
+        "removed_sections",
+        "modified_sections",
+        "added_modules",
+        "removed_modules",
+        "modified_modules",
+    )
+
+    def __init__(self) -> None:
+        self.added_sections = []
+        self.removed_sections = []
+        self.modified_sections = []
+        self.added_modules = []
+        self.removed_modules = []
+        self.modified_modules = []
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.added_sections
+            or self.removed_sections
+            or self.modified_sections
+            or self.added_modules
+            or self.removed_modules
+            or self.modified_modules
+        )
+
+    def section_changed(self, section_id: int) -> bool:
+        return section_id in self.added_sections or section_id in self.modified_sections
+
+    def __repr__(self) -> str:
+        return (
+            f"StateDiff(sections +{len(self.added_sections)} -{len(self.removed_sections)}"
+            f" ~{len(self.modified_sections)}, modules +{len(self.added_modules)}"
+            f" -{len(self.removed_modules)} ~{len(self.modified_modules)})"
+        )
+
+
+class CourseState:
+    """
+    A two level hash tree over the module ids and timemodified values of a
+    course.
+    ....
+    Every section has a hash over its modules, the root hash covers the
+    section hashes. Equal roots mean equal courses, otherwise only sections
+    with different hashes are compared module by module.
+    ....
+    The stored form is {"r": root, "s": [[section id, hash, [module id,
+    timemodified, ...]], ...]}, a fraction of the size of the raw module list.
+    """
+
+    __slots__ = ("root", "sections")
+
+    def __init__(self, root: str, sections: dict) -> None:
+        self.root = root
+        # Section id -> (hash, {module id: timemodified})
+        self.sections = sections
+
+    @classmethod
+    def from_sections(cls, sections: Iterable[Section]) -> "CourseState":
+        tree = {}
+        for section in sections:
+            modules = {module.id: module.timemodified or 0 for module in section.modules}
+            digest = _hash(";".join(f"{id}:{time}" for id, time in modules.items()))
+            tree[section.id] = (digest, modules)
+        return cls(cls._root(tree), tree)
+
+    @staticmethod
+    def _root(tree: dict) -> str:
+        return _hash(";".join(f"{id}:{digest}" for id, (digest, _) in tree.items()))
+
+    @classmethod
+    def from_json(cls, data) -> Optional["CourseState"]:
+        """
+        Returns the state stored by to_json, None for missing data or the
+        old format, a plain list of modules.
+        """
+        if not isinstance(data, dict) or "r" not in data:
+            return None
+        tree = {}
+        for section_id, digest, leaves in data.get("s") or ():
+            tree[section_id] = (digest, dict(zip(leaves[::2], leaves[1::2])))
+        return cls(data["r"], tree)
+
+    def to_json(self) -> dict:
+        return {
+            "r": self.root,
+            "s": [
+                [section_id, digest, [value for leaf in modules.items() for value in leaf]]
+                for section_id, (digest, modules) in self.sections.items()
+            ],
+        }
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CourseState) and self.root == other.root
+
+    def diff(self, old: "CourseState") -> StateDiff:
+        """Returns what changed from the `old` state to this one."""
+        result = StateDiff()
+        if self.root == old.root:
+            return result
+
+        old_modules = {}
+        new_modules = {}
+        for section_id, (digest, modules) in self.sections.items():
+            previous = old.sections.get(section_id)
+            if previous is None:
+                result.added_sections.append(section_id)
+                new_modules.update(modules)
+            elif previous[0] != digest:
+                result.modified_sections.append(section_id)
+                new_modules.update(modules)
+                old_modules.update(previous[1])
+        for section_id, (_, modules) in old.sections.items():
+            if section_id not in self.sections:
+                result.removed_sections.append(section_id)
+                old_modules.update(modules)
+
+        # Modules moved between changed sections count as unchanged
+        for module_id, timemodified in new_modules.items():
+            if module_id not in old_modules:
+                result.added_modules.append(module_id)
+            elif old_modules[module_id] != timemodified:
+                result.modified_modules.append(module_id)
+        result.removed_modules = [
+            module_id for module_id in old_modules if module_id not in new_modules
+        ]
+        return result
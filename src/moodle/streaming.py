@@ -0,0 +1,134 @@
+"""
+Incremental parsing of large JSON array responses.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+# Characters that matter outside of strings
+_STRUCTURAL = re.compile(r'["\[\]{},]')
+# Characters that end or escape inside of strings
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = " \t\r\n"
+
+
+class NotAnArrayError(ValueError):
+    """
+    Raised when the response is not a JSON array, for example when Moodle
+    returns an exception object. `value` holds the decoded response.
+    """
+
+    def __init__(self, value: Any) -> None:
+        super().__init__("Expected a JSON array")
+        self.value = value
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Decodes the elements of a top-level JSON array as they arrive.
+    ....
+    Only the element currently being received is buffered, every complete
+    element is decoded with json.loads and yielded at once. String contents
+    are skipped with a regular expression, so long HTML descriptions cost
+    little to scan.
+    ....
+    Args:
+        chunks (Iterable[bytes]): The UTF-8 encoded response body.
+    ....
+    Yields:
+        The decoded elements in order.
+    ....
+    Raises:
+        NotAnArrayError: If the body is valid JSON but not an array.
+        ValueError: If the body is not valid JSON.
+    """
+    chunks = iter(chunks)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    pos = 0
+    started = False
+    start = None
+    depth = 0
+    in_string = False
+
+    for chunk in _with_final(chunks):
+        buffer += decoder.decode(chunk, final=chunk == b"")
+
+        if not started:
+            stripped = buffer.lstrip(_WHITESPACE)
+            if not stripped:
+                continue
+            if stripped[0] != "[":
+                rest = stripped + "".join(decoder.decode(chunk) for chunk in chunks)
+                raise NotAnArrayError(json.loads(rest + decoder.decode(b"", final=True)))
+            started = True
+            buffer = stripped[1:]
+            pos = 0
+
+        while True:
+            if start is None:
+                while pos < len(buffer) and buffer[pos] in _WHITESPACE + ",":
+                    pos += 1
+                if pos == len(buffer):
+                    buffer = ""
+                    pos = 0
+                    break
+                if buffer[pos] == "]":
+                    return
+                start = pos
+
+            if in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buffer):
+                        # The escaped character has not arrived yet
+                        pos = match.start()
+                        break
+                    pos = match.end() + 1
+                    continue
+                in_string = False
+                pos = match.end()
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            elif depth > 0:
+                if char in "]}":
+                    depth -= 1
+            elif char in ",]":
+                yield json.loads(buffer[start : match.start()])
+                if char == "]":
+                    return
+                buffer = buffer[pos:]
+                pos = 0
+                start = None
+            else:
+                raise ValueError(f"Unexpected {char!r} in JSON array")
+
+    raise ValueError("Unexpected end of JSON array")
+
+
+def _with_final(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    # An empty chunk at the end flushes the incremental decoder
+    for chunk in chunks:
+        if chunk:
+            yield chunk
+    yield b""
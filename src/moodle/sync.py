@@ -0,0 +1,90 @@
+"""
+Keeps the offline mirror in sync with the Moodle instance.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import logging
+from typing import Optional, Tuple
+
+from .mirror import OfflineMirror
+from .models import Course, parse_courses
+
+logger = logging.getLogger(__name__)
+
+
+class SyncEngine:
+    """
+    Fetches courses, course contents and grades and writes them to the
+    OfflineMirror.
+    ....
+    Every sync method returns None when the request failed, so callers keep
+    showing the mirrored data while offline. Successful syncs also report
+    whether the mirrored data changed.
+    """
+
+    def __init__(self, moodle_api, mirror: Optional[OfflineMirror] = None) -> None:
+        self.moodle_api = moodle_api
+        self.mirror = mirror or OfflineMirror()
+
+    def restore_site_info(self) -> Optional[dict]:
+        """
+        Seeds MoodleAPI with the last known site info, so the user id is
+        known at startup without a round trip.
+        """
+        site_info = self.mirror.load_site_info()
+        if site_info is not None:
+            self.moodle_api.restore_site_info(site_info)
+        return site_info
+
+    def sync_site_info(self) -> Optional[dict]:
+        """Fetches fresh site info, which also validates the token."""
+        site_info = self.moodle_api.get_site_info(refresh=True)
+        if not isinstance(site_info, dict):
+            return None
+        self.mirror.save_site_info(site_info)
+        return site_info
+
+    def sync_courses(self, refresh: bool = True) -> Optional[Tuple[list[Course], bool]]:
+        """
+        Returns:
+            tuple: (courses, changed), None if the course list could not be fetched.
+        """
+        user_id = self.moodle_api.get_user_id()
+        if user_id is None:
+            return None
+        data = self.moodle_api.get_course(user_id, refresh=refresh)
+        if not isinstance(data, list):
+            return None
+        return parse_courses(data), self.mirror.save_courses(data)
+
+    def sync_course_content(
+        self, course_id: int, refresh: bool = True
+    ) -> Optional[Tuple[list[dict], bool]]:
+        """
+        Returns:
+            tuple: (sections, changed) with the raw sections, None if the
+            content could not be fetched.
+        """
+        data = self.moodle_api.get_course_content(course_id, refresh=refresh)
+        return self.store_course_content(course_id, data)
+
+    def store_course_content(
+        self, course_id: int, data
+    ) -> Optional[Tuple[list[dict], bool]]:
+        """Mirrors contents fetched elsewhere, e.g. by the update check."""
+        if not isinstance(data, list):
+            return None
+        return data, self.mirror.save_course_content(course_id, data)
+
+    def sync_grades(self, course_id: int) -> Optional[Tuple[dict, bool]]:
+        """
+        Returns:
+            tuple: (grades, changed), None if the grades could not be fetched.
+        """
+        data = self.moodle_api.get_user_grades(course_id)
+        if not isinstance(data, dict) or "usergrades" not in data:
+            return None
+        return data, self.mirror.save_grades(course_id, data)
@@ -0,0 +1,177 @@
+"""
+Shared HTTP transport for all traffic to the Moodle instance.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import logging
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import requests
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) timeout in seconds
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+_TOKEN_PARAM = re.compile(r"\b(token|wstoken)=[^&\s'\"]*")
+
+
+def redact(text) -> str:
+    """
+    Replaces token query parameters in `text` with "***". Exception messages
+    of requests contain the full URL, so they pass through this before they
+    are logged, shown or stored.
+    """
+    return _TOKEN_PARAM.sub(r"\1=***", str(text))
+
+
+class HttpTransport:
+    """
+    A thread-safe, pooled HTTP transport with timeouts and retries.
+    ....
+    One requests.Session is shared by every thread. Its connection pool is
+    thread-safe, so concurrent requests reuse TLS connections instead of
+    opening new ones. The session is configured once and not mutated
+    afterwards, per-request headers are passed with each call.
+    ....
+    Idempotent requests are retried with exponential backoff on 5xx
+    responses, connection resets and timeouts.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOLSIZE,
+        timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+    ) -> None:
+        """
+        Args:
+            pool_size (int): Connections kept open per host, should cover
+                every thread that talks to Moodle at the same time.
+            timeout (tuple): Default (connect, read) timeout in seconds.
+            retries (int): Retries of idempotent requests.
+            backoff (float): Delay before the first retry, doubled every retry.
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def instance(cls) -> "HttpTransport":
+        """Returns the transport shared by the whole application."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def set_instance(cls, transport) -> None:
+        """
+        Replaces the shared transport, e.g. with a recording or replaying one.
+        Must be called before the first MoodleAPI is created.
+        """
+        with cls._instance_lock:
+            cls._instance = transport
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        on_retry: Optional[Callable[[], None]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Sends a request, retrying idempotent requests on transient errors.
+        ....
+        Args:
+            method (str): HTTP method.
+            url (str): Target URL.
+            idempotent (bool): Whether the request may be retried, defaults
+                to True for GET, HEAD and OPTIONS.
+            on_retry (Callable): Called before every retry.
+            **kwargs: Passed to requests.Session.request.
+        ....
+        Returns:
+            requests.Response: The last response, 5xx responses are returned
+            once the retries are used up.
+        ....
+        Raises:
+            requests.RequestException: If the request failed for good.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = self.retries + 1 if idempotent else 1
+
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (ConnectionError, Timeout) as e:
+                if last_attempt:
+                    raise
+                logger.warning(
+                    "%s %s failed (%s), retrying", method, redact(url), redact(e)
+                )
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                logger.warning(
+                    "%s %s returned %s, retrying",
+                    method,
+                    redact(url),
+                    response.status_code,
+                )
+                response.close()
+            if on_retry is not None:
+                on_retry()
+            self._sleep(attempt)
+
+    def _sleep(self, attempt: int) -> None:
+        # Exponential backoff with jitter so parallel retries spread out
+        delay = self.backoff * (2**attempt)
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def prewarm(self, url: str) -> None:
+        """
+        Opens a pooled connection to the host of `url` (DNS, TCP and TLS),
+        so the first real request does not pay for the handshake.
+        """
+        try:
+            self.session.head(url, timeout=self.timeout).close()
+        except requests.RequestException as e:
+            logger.info(
+                "Pre-warming the connection to %s failed: %s", redact(url), redact(e)
+            )
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,192 @@
+"""
+Startup profiler for the desktop client.
+
+Enabled with the KOODLE_PROFILE environment variable or the --profile
+flag. Records the import time of every module and named milestones such as
+the first window, and prints a report once the dashboard is populated.
+Set KOODLE_PROFILE to a path ending in .json to also save the report.
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import atexit
+import importlib.abc
+import json
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+_profiler = None
+
+
+class _TimingLoader(importlib.abc.Loader):
+    """Wraps a loader and times the execution of the module."""
+
+    def __init__(self, loader, profiler: "StartupProfiler") -> None:
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        # Extension modules do most of their work here
+        started = time.perf_counter()
+        try:
+            return self._loader.create_module(spec)
+        finally:
+            self._profiler._created[spec.name] = time.perf_counter() - started
+
+    def exec_module(self, module):
+        self._profiler._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(module.__name__)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Asks the other finders and wraps the loader of the spec they return."""
+
+    def __init__(self, profiler: "StartupProfiler") -> None:
+        self._profiler = profiler
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimingLoader(spec.loader, self._profiler)
+            return spec
+        return None
+
+
+class StartupProfiler:
+    """
+    Collects import times and milestones of one application start.
+    ....
+    Import times are measured on the main thread only. The self time of a
+    module excludes the modules it imported, the cumulative time includes
+    them, like python -X importtime.
+    """
+
+    def __init__(self, output: Optional[str] = None) -> None:
+        self.started = time.perf_counter()
+        self.output = output
+        self.imports = []
+        self.marks = []
+        self.reported = False
+        # Marks that trigger the report once all of them are recorded
+        self.report_after = set()
+        self._created = {}
+        self._stack = []
+        self._main_thread = threading.main_thread()
+        self._finder = _TimingFinder(self)
+
+    def start(self) -> None:
+        sys.meta_path.insert(0, self._finder)
+        atexit.register(self.report)
+
+    def stop(self) -> None:
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def _enter(self) -> None:
+        if threading.current_thread() is self._main_thread:
+            # [start time, time spent in nested imports]
+            self._stack.append([time.perf_counter(), 0.0])
+
+    def _leave(self, name: str) -> None:
+        if threading.current_thread() is not self._main_thread or not self._stack:
+            return
+        started, nested = self._stack.pop()
+        cumulative = time.perf_counter() - started + self._created.pop(name, 0.0)
+        self.imports.append((name, cumulative - nested, cumulative))
+        if self._stack:
+            self._stack[-1][1] += cumulative
+
+    def mark(self, name: str) -> None:
+        """Records a milestone, only its first occurrence counts."""
+        if all(mark != name for mark, _ in self.marks):
+            self.marks.append((name, time.perf_counter() - self.started))
+        if self.report_after and self.report_after <= {mark for mark, _ in self.marks}:
+            self.report()
+
+    def to_dict(self, limit: int = 25) -> dict:
+        slowest = sorted(self.imports, key=lambda entry: entry[1], reverse=True)
+        return {
+            "modules": len(self.imports),
+            "import_time": round(sum(entry[1] for entry in self.imports), 4),
+            "marks": {name: round(elapsed, 4) for name, elapsed in self.marks},
+            "slowest_imports": [
+                {"module": name, "self": round(own, 4), "cumulative": round(total, 4)}
+                for name, own, total in slowest[:limit]
+            ],
+        }
+
+    def report(self, file=None) -> None:
+        """Prints the report once, and saves it if an output path is set."""
+        if self.reported:
+            return
+        self.reported = True
+        self.stop()
+        data = self.to_dict()
+        file = file or sys.stderr
+
+        print("Startup profile", file=file)
+        print(
+            f"  {data['modules']} modules imported in {data['import_time'] * 1000:.0f} ms",
+            file=file,
+        )
+        for name, elapsed in data["marks"].items():
+            print(f"  {name:<24} {elapsed * 1000:8.0f} ms", file=file)
+        print("  Slowest imports (self / cumulative ms):", file=file)
+        for entry in data["slowest_imports"]:
+            print(
+                f"    {entry['module']:<40} {entry['self'] * 1000:7.1f} {entry['cumulative'] * 1000:8.1f}",
+                file=file,
+            )
+
+        if self.output:
+            with open(self.output, "w") as f:
+                json.dump(data, f, indent=4)
+
+
+def enable(output: Optional[str] = None) -> StartupProfiler:
+    """Starts profiling, must be called before the application imports."""
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler(output)
+        _profiler.start()
+    return _profiler
+
+
+def enable_from_env(argv: Optional[list] = None) -> Optional[StartupProfiler]:
+    """Enables the profiler if KOODLE_PROFILE is set or --profile is passed."""
+    argv = sys.argv if argv is None else argv
+    setting = os.getenv("KOODLE_PROFILE")
+    if "--profile" in argv:
+        argv.remove("--profile")
+    elif not setting:
+        return None
+    output = setting if setting and setting.endswith(".json") else None
+    return enable(output)
+
+
+def mark(name: str) -> None:
+    """Records a milestone if the profiler is enabled."""
+    if _profiler is not None:
+        _profiler.mark(name)
+
+
+def report_after(*names: str) -> None:
+    """Prints the report once all named milestones are recorded, not at exit."""
+    if _profiler is not None:
+        _profiler.report_after.update(names)
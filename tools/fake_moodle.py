@@ -0,0 +1,520 @@
+"""
+Local stand-in for a Moodle instance, used for offline benchmarks.
+
+Serves /login/token.php, /webservice/rest/server.php with the wsfunctions
+MoodleAPI uses, and pluginfile downloads with HTTP Range support. All data
+is generated from a seed, latency, jitter and errors can be injected.
+
+Usage:
+    python -m tools.fake_moodle --port 8080 --courses 40 --latency 80
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import argparse
+import json
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+TOKEN = "fake-moodle-token"
+USER_ID = 2
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def _png(width: int, height: int, color: tuple) -> bytes:
+    """Encodes a solid color RGB PNG."""
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    row = b"\x00" + bytes(color) * width
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(row * height))
+        + chunk(b"IEND", b"")
+    )
+
+
+class FakeMoodle:
+    """
+    Synthetic Moodle data and the web service functions answering from it.
+    """
+
+    def __init__(
+        self,
+        courses: int = 40,
+        sections: int = 10,
+        modules: int = 8,
+        description_size: int = 400,
+        file_size: int = 256 * 1024,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 1,
+    ) -> None:
+        """
+        Args:
+            courses (int): Number of enrolled courses.
+            sections (int): Sections per course.
+            modules (int): Modules per section.
+            description_size (int): Length of the HTML descriptions.
+            file_size (int): Size of every pluginfile download in bytes.
+            latency (float): Seconds added to every response.
+            jitter (float): Maximum random deviation from the latency.
+            error_rate (float): Share of web service calls that fail, half of
+                them with HTTP 503 and half with a Moodle exception.
+            seed (int): Seed of the generated data and the injected errors.
+        """
+        self.file_size = file_size
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.now = int(time.time())
+
+        text = "Lorem ipsum dolor sit amet. " * (description_size // 28 + 1)
+        self.courses = []
+        self.contents = {}
+        for course_id in range(100, 100 + courses):
+            self.courses.append(
+                {
+                    "id": course_id,
+                    "shortname": f"C{course_id}",
+                    "fullname": f"Synthetic Course {course_id}",
+                    "summary": f"<p>{text[:description_size]}</p>",
+                    "enrolledusercount": self.random.randint(5, 400),
+                    "overviewfiles": [
+                        {
+                            "filename": "course.png",
+                            "filepath": "/",
+                            "filesize": 0,
+                            "fileurl": f"/webservice/pluginfile.php/{course_id}/course/overviewfiles/course.png",
+                            "timemodified": self.now - 86400,
+                            "mimetype": "image/png",
+                        }
+                    ],
+                }
+            )
+            self.contents[course_id] = [
+                {
+                    "id": course_id * 100 + section,
+                    "name": f"Week {section}",
+                    "summary": f"<p>{text[:description_size // 2]}</p>",
+                    "modules": [
+                        self._module(course_id, section, module, text[:description_size])
+                        for module in range(modules)
+                    ],
+                }
+                for section in range(sections)
+            ]
+
+    def _module(self, course_id: int, section: int, module: int, text: str) -> dict:
+        module_id = (course_id * 100 + section) * 100 + module
+        filename = f"lecture_{section}_{module}.pdf"
+        return {
+            "id": module_id,
+            "name": f"Lecture {section}.{module}",
+            "modname": "resource",
+            "instance": module_id,
+            "url": f"/mod/resource/view.php?id={module_id}",
+            "description": f"<p>{text}</p>",
+            "timemodified": self.now - self.random.randint(86400, 86400 * 60),
+            "contents": [
+                {
+                    "type": "file",
+                    "filename": filename,
+                    "filesize": self.file_size,
+                    "fileurl": f"/webservice/pluginfile.php/{module_id}/mod_resource/content/0/{filename}?forcedownload=1",
+                    "timemodified": self.now - 86400,
+                }
+            ],
+        }
+
+    def modules(self, course_id: int):
+        for section in self.contents.get(course_id, ()):
+            yield from section["modules"]
+
+    def touch(self, count: int = 1) -> list[int]:
+        """Marks random modules as modified now and returns their ids."""
+        with self.lock:
+            modules = [module for course_id in self.contents for module in self.modules(course_id)]
+            touched = self.random.sample(modules, min(count, len(modules)))
+            self.now = int(time.time())
+            for module in touched:
+                module["timemodified"] = self.now
+            return [module["id"] for module in touched]
+
+    def delay(self) -> None:
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self) -> bool:
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def call(self, wsfunction: str, args: dict) -> object:
+        """Answers a web service call, args use the nested JSON structure."""
+        with self.lock:
+            self.calls[wsfunction] = self.calls.get(wsfunction, 0) + 1
+
+        handler = getattr(self, f"ws_{wsfunction}", None)
+        if handler is None:
+            return {
+                "exception": "dml_missing_record_exception",
+                "errorcode": "invalidrecord",
+                "message": f"Can't find data record in database table external_functions. ({wsfunction})",
+            }
+        return handler(args)
+
+    def ws_core_webservice_get_site_info(self, args):
+        return {
+            "sitename": "Fake Moodle",
+            "username": "student",
+            "fullname": "Synthetic Student",
+            "userid": USER_ID,
+            "siteurl": "",
+            "release": "4.1",
+        }
+
+    def ws_core_user_get_users_by_field(self, args):
+        return [{"id": USER_ID, "username": "student", "fullname": "Synthetic Student"}]
+
+    def ws_core_enrol_get_users_courses(self, args):
+        return self.courses
+
+    def ws_core_course_get_contents(self, args):
+        course_id = int(args.get("courseid", 0))
+        if course_id not in self.contents:
+            return {"exception": "moodle_exception", "errorcode": "invalidcourseid", "message": "Invalid course id"}
+        return self.contents[course_id]
+
+    def ws_core_course_get_updates_since(self, args):
+        since = int(args.get("since", 0))
+        return {
+            "instances": [
+                {
+                    "contextlevel": "module",
+                    "id": module["id"],
+                    "updates": [{"name": "configuration", "timeupdated": module["timemodified"], "itemids": []}],
+                }
+                for module in self.modules(int(args.get("courseid", 0)))
+                if module["timemodified"] > since
+            ],
+            "warnings": [],
+        }
+
+    def ws_core_course_check_updates(self, args):
+        modules = {module["id"]: module for module in self.modules(int(args.get("courseid", 0)))}
+        instances = []
+        for check in args.get("tocheck", []):
+            module = modules.get(int(check["id"]))
+            if module and module["timemodified"] > int(check["since"]):
+                instances.append({"contextlevel": "module", "id": module["id"], "updates": [{"name": "configuration", "timeupdated": module["timemodified"], "itemids": []}]})
+        return {"instances": instances, "warnings": []}
+
+    def ws_gradereport_user_get_grade_items(self, args):
+        course_id = int(args.get("courseid", 0))
+        rng = random.Random(course_id)
+        return {
+            "usergrades": [
+                {
+                    "courseid": course_id,
+                    "userid": USER_ID,
+                    "gradeitems": [
+                        {
+                            "itemname": f"Assignment {index}",
+                            "graderaw": rng.randint(0, 100),
+                            "grademin": 0,
+                            "grademax": 100,
+                            "feedback": "",
+                        }
+                        for index in range(rng.randint(2, 8))
+                    ],
+                }
+            ],
+            "warnings": [],
+        }
+
+    def ws_core_group_get_course_groups(self, args):
+        course_id = int(args.get("courseid", 0))
+        return [{"id": course_id * 10 + index, "courseid": course_id, "name": f"Group {index}"} for index in range(4)]
+
+    def ws_core_group_get_activity_allowed_groups(self, args):
+        return {"groups": [{"id": 1, "name": "Group 1"}], "canaccessallgroups": False, "warnings": []}
+
+    def ws_core_group_get_group_members(self, args):
+        return [{"groupid": int(group_id), "userids": list(range(1, 6))} for group_id in args.get("groupids", [])]
+
+    def ws_mod_groupselect_get_groups(self, args):
+        return {"groups": [{"id": 1, "name": "Group 1", "members": 3}]}
+
+    def ws_message_popup_get_popup_notifications(self, args):
+        return {"notifications": [], "unreadcount": 0}
+
+    def ws_message_popup_get_unread_popup_notification_count(self, args):
+        return 0
+
+    def ws_tool_mobile_call_external_functions(self, args):
+        responses = []
+        for request in args.get("requests", []):
+            result = self.call(request["function"], json.loads(request.get("arguments") or "{}"))
+            if isinstance(result, dict) and "exception" in result:
+                responses.append({"error": True, "exception": json.dumps(result)})
+            else:
+                responses.append({"error": False, "data": json.dumps(result)})
+        return {"responses": responses}
+
+
+def _nest(params: dict) -> dict:
+    """Turns flattened form parameters like "groupids[0]" into nested data."""
+    nested = {}
+    for key, value in params.items():
+        parts = re.findall(r"[^\[\]]+", key)
+        node = nested
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+
+    def to_lists(node):
+        if isinstance(node, dict) and node and all(key.isdigit() for key in node):
+            return [to_lists(node[key]) for key in sorted(node, key=int)]
+        if isinstance(node, dict):
+            return {key: to_lists(value) for key, value in node.items()}
+        return node
+
+    return to_lists(nested)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeMoodle/1.0"
+    # Small JSON responses are written in several parts, without this every
+    # keep-alive request waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    @property
+    def moodle(self) -> FakeMoodle:
+        return self.server.moodle
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body: bytes, status: int = 200, content_type: str = "application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def send_json(self, data, status: int = 200):
+        self.send_body(json.dumps(data).encode("utf-8"), status)
+
+    def read_form(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        query = urlparse(self.path).query
+        form = parse_qs(query)
+        form.update(parse_qs(body))
+        return {key: values[-1] for key, values in form.items()}
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        form = self.read_form()
+        self.moodle.delay()
+
+        if path == "/login/token.php":
+            if form.get("username") and form.get("password") and form.get("password") != "wrong":
+                self.send_json({"token": TOKEN, "privatetoken": None})
+            else:
+                self.send_json({"error": "Invalid login, please try again", "errorcode": "invalidlogin"})
+            return
+
+        if path != "/webservice/rest/server.php":
+            self.send_body(b"Not found", 404, "text/plain")
+            return
+
+        if self.moodle.should_fail():
+            if self.moodle.random.random() < 0.5:
+                self.send_body(b"Service Unavailable", 503, "text/plain")
+            else:
+                self.send_json({"exception": "moodle_exception", "errorcode": "injected", "message": "Injected error"})
+            return
+
+        if form.get("wstoken") != TOKEN:
+            self.send_json({"exception": "moodle_exception", "errorcode": "invalidtoken", "message": "Invalid token - token not found"})
+            return
+
+        wsfunction = form.pop("wsfunction", "")
+        for key in ("wstoken", "moodlewsrestformat"):
+            form.pop(key, None)
+        result = self.moodle.call(wsfunction, _nest(form))
+        body = json.dumps(result).replace('"/webservice/pluginfile.php', f'"http://{self.headers["Host"]}/webservice/pluginfile.php')
+        body = body.replace('"/mod/', f'"http://{self.headers["Host"]}/mod/')
+        self.send_body(body.encode("utf-8"))
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if "pluginfile.php" not in parsed.path:
+            self.send_body(b"Not found", 404, "text/plain")
+            return
+        if parse_qs(parsed.query).get("token", [None])[0] != TOKEN:
+            self.send_body(b"Forbidden", 403, "text/plain")
+            return
+
+        self.moodle.delay()
+        if parsed.path.endswith(".png"):
+            seed = sum(parsed.path.encode())
+            color = (seed * 37 % 256, seed * 91 % 256, seed * 53 % 256)
+            self.send_body(_png(600, 260, color), content_type="image/png")
+            return
+
+        self.send_file(parsed.path)
+
+    do_HEAD = do_GET
+
+    def send_file(self, path: str):
+        size = self.moodle.file_size
+        # Deterministic content so resumed and segmented downloads can be verified
+        pattern = (path.encode("utf-8") * (4096 // max(1, len(path)) + 1))[:4096]
+        start, end = 0, size - 1
+        status = 200
+        # Changes with file_size, so a resized file counts as changed
+        etag = f'"{zlib.crc32(path.encode("utf-8")):08x}-{size}"'
+        headers = {"Accept-Ranges": "bytes", "ETag": etag}
+
+        range_header = self.headers.get("Range")
+        # A Range with a stale If-Range is ignored and the whole file sent
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            match = _RANGE.fullmatch(range_header.strip())
+            if match and (match.group(1) or match.group(2)):
+                if match.group(1):
+                    start = int(match.group(1))
+                    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                else:
+                    start = max(0, size - int(match.group(2)))
+                if start >= size or start > end:
+                    self.send_body(b"", 416, "text/plain", {"Content-Range": f"bytes */{size}"})
+                    return
+                status = 206
+                headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        length = end - start + 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+
+        position = start
+        try:
+            while position <= end:
+                offset = position % len(pattern)
+                block = pattern[offset:][: end - position + 1]
+                self.wfile.write(block)
+                position += len(block)
+        except (BrokenPipeError, ConnectionResetError):
+            # Range probes and cancelled segments close the connection early
+            self.close_connection = True
+
+
+class FakeMoodleServer:
+    """
+    Runs a FakeMoodle on a background thread.
+    ....
+    Example:
+        with FakeMoodleServer(FakeMoodle(courses=10, latency=0.05)) as server:
+            api = MoodleAPI(server.url)
+    """
+
+    def __init__(self, moodle: Optional[FakeMoodle] = None, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.moodle = moodle or FakeMoodle()
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.moodle = self.moodle
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeMoodleServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="FakeMoodle", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "FakeMoodleServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the options describing the synthetic data and injected faults."""
+    parser.add_argument("--courses", type=int, default=40, help="number of courses")
+    parser.add_argument("--sections", type=int, default=10, help="sections per course")
+    parser.add_argument("--modules", type=int, default=8, help="modules per section")
+    parser.add_argument("--description-size", type=int, default=400, help="length of HTML descriptions")
+    parser.add_argument("--file-size", type=int, default=256 * 1024, help="size of pluginfile downloads in bytes")
+    parser.add_argument("--latency", type=float, default=0.0, help="latency per response in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="maximum latency jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of failing web service calls")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the synthetic data")
+
+
+def from_arguments(args: argparse.Namespace) -> FakeMoodle:
+    return FakeMoodle(
+        courses=args.courses,
+        sections=args.sections,
+        modules=args.modules,
+        description_size=args.description_size,
+        file_size=args.file_size,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Moodle instance.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeMoodleServer(from_arguments(args), args.host, args.port)
+    print(f"Fake Moodle running at {server.url} (token {TOKEN})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Load-test harness driving MoodleAPI against the local fake Moodle.
+
+Every scenario runs a number of iterations on a pool of threads and reports
+throughput and p50/p95/p99 latency per operation. Every thread uses its own
+MoodleAPI, so concurrent iterations are not coalesced into one request.
+
+Usage:
+    python -m tools.loadtest --courses 40 --latency 80 --jitter 20
+    python -m tools.loadtest --url http://127.0.0.1:8080 --scenario refresh
+    python -m tools.loadtest --record run.cassette --scenario refresh
+    python -m tools.loadtest --replay run.cassette --timing zero --scenario refresh
+
+Author: EvickaStudio
+Github: @EvickaStudio
+"""
+
+
+import argparse
+import json
+import logging
+import math
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.moodle import MoodleAPI
+from src.moodle.replay import TIMING_ORIGINAL, TIMING_ZERO, RecordingTransport, ReplayTransport
+from src.moodle.transport import HttpTransport
+
+from .fake_moodle import FakeMoodleServer, add_arguments, from_arguments
+
+
+# Update checks ask for changes since the start of the day, so recorded
+# cassettes replay for the rest of the day, --since pins it for longer
+SINCE = int(time.time()) // 86400 * 86400
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of the samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class CountingTransport:
+    """
+    Wraps a transport and counts the HTTP requests sent through it,
+    retries included.
+    """
+
+    def __init__(self, transport) -> None:
+        self.transport = transport
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def request(self, method: str, url: str, on_retry=None, **kwargs):
+        def retried():
+            self._count()
+            if on_retry is not None:
+                on_retry()
+
+        self._count()
+        return self.transport.request(method, url, on_retry=retried, **kwargs)
+
+    def get(self, url: str, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+def new_transport(args: argparse.Namespace) -> CountingTransport:
+    if args.replay:
+        transport = ReplayTransport(args.replay, args.timing)
+    elif args.record:
+        transport = RecordingTransport(args.record, retries=args.retries, backoff=0.05)
+    else:
+        transport = HttpTransport(retries=args.retries, backoff=0.05)
+    return CountingTransport(transport)
+
+
+def new_api(url: str, args: argparse.Namespace, transport) -> MoodleAPI:
+    """Creates a logged in MoodleAPI on `transport` without a cache."""
+    api = MoodleAPI(
+        url,
+        max_workers=args.workers,
+        cache=False,
+        batch_size=args.batch_size,
+        transport=transport,
+    )
+    if not api.login("student", "secret"):
+        raise SystemExit(f"Login at {url} failed")
+    return api
+
+
+def error_count(api: MoodleAPI) -> int:
+    """Failed requests recorded by `api`, MoodleAPI returns None for them."""
+    return sum(stats["errors"] for stats in api.metrics.snapshot()["functions"].values())
+
+
+def scenario_site_info(api: MoodleAPI, course_ids: list[int]) -> None:
+    api.get_site_info(refresh=True)
+
+
+def scenario_courses(api: MoodleAPI, course_ids: list[int]) -> None:
+    api.get_courses(api.userid, refresh=True)
+
+
+def scenario_contents(api: MoodleAPI, course_ids: list[int]) -> None:
+    # Sequential requests, one per course
+    for course_id in course_ids:
+        api.get_sections(course_id, refresh=True)
+
+
+def scenario_stream(api: MoodleAPI, course_ids: list[int]) -> None:
+    for course_id in course_ids:
+        for _ in api.iter_sections(course_id, refresh=True):
+            pass
+
+
+def scenario_batch(api: MoodleAPI, course_ids: list[int]) -> None:
+    for _ in api.iter_course_contents(course_ids, refresh=True):
+        pass
+
+
+def scenario_refresh(api: MoodleAPI, course_ids: list[int]) -> None:
+    # The dashboard refresh: course list, update checks, changed contents
+    courses = api.get_courses(api.userid, refresh=True) or []
+    since = {course.id: SINCE for course in courses}
+    changed = [course_id for course_id, updated in api.iter_course_updates(since) if updated]
+    for _ in api.iter_course_contents(changed, refresh=True):
+        pass
+
+
+SCENARIOS = {
+    "site_info": scenario_site_info,
+    "courses": scenario_courses,
+    "contents": scenario_contents,
+    "stream": scenario_stream,
+    "batch": scenario_batch,
+    "refresh": scenario_refresh,
+}
+
+
+def run_scenario(name: str, url: str, args: argparse.Namespace) -> dict:
+    """
+    Runs one scenario `args.iterations` times on `args.concurrency` threads.
+    ....
+    Returns:
+        dict: Throughput, error count and latency percentiles in seconds.
+    """
+    func = SCENARIOS[name]
+    transport = new_transport(args)
+    # One client per thread, a client is only used by one iteration at a time
+    apis = [new_api(url, args, transport) for _ in range(args.concurrency)]
+    course_ids = [course.id for course in apis[0].get_courses(apis[0].userid) or []]
+    course_ids = course_ids[: args.course_limit] if args.course_limit else course_ids
+    idle = queue.Queue()
+    for api in apis:
+        api.metrics.reset()
+        idle.put(api)
+
+    def timed(_):
+        api = idle.get()
+        errors = error_count(api)
+        start = time.perf_counter()
+        try:
+            func(api, course_ids)
+        except Exception as e:
+            logging.getLogger(__name__).warning("%s failed: %s", name, e)
+            failed = True
+        else:
+            # Failed requests return None instead of raising
+            failed = error_count(api) > errors
+        latency = time.perf_counter() - start
+        idle.put(api)
+        return latency, failed
+
+    requests_before = transport.requests
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(timed, range(args.iterations)))
+    elapsed = time.perf_counter() - start
+    http_requests = transport.requests - requests_before
+    transport.close()
+
+    latencies = [latency for latency, _ in results]
+    return {
+        "scenario": name,
+        "iterations": len(results),
+        "errors": sum(error for _, error in results),
+        "elapsed": elapsed,
+        "throughput": len(results) / elapsed if elapsed else 0.0,
+        "http_requests": http_requests,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies, default=0.0),
+    }
+
+
+def print_report(reports: list[dict]) -> None:
+    header = f"{'scenario':<10} {'iter':>5} {'err':>4} {'ops/s':>8} {'http':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    print(header)
+    print("-" * len(header))
+    for report in reports:
+        print(
+            f"{report['scenario']:<10} {report['iterations']:>5} {report['errors']:>4} "
+            f"{report['throughput']:>8.2f} {report['http_requests']:>6} "
+            f"{report['p50'] * 1000:>8.1f} {report['p95'] * 1000:>8.1f} "
+            f"{report['p99'] * 1000:>8.1f} {report['max'] * 1000:>8.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test MoodleAPI against a fake Moodle.")
+    parser.add_argument("--url", help="use a running server instead of starting one")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=sorted(SCENARIOS),
+        help="scenario to run, can be repeated (default: all)",
+    )
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8, help="MoodleAPI max_workers")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--course-limit", type=int, default=0, help="courses per iteration (0 = all)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--record", help="record the traffic to this cassette")
+    parser.add_argument("--replay", help="replay this cassette instead of using a server")
+    parser.add_argument(
+        "--timing",
+        choices=(TIMING_ORIGINAL, TIMING_ZERO),
+        default=TIMING_ORIGINAL,
+        help="latency of replayed responses",
+    )
+    add_arguments(parser)
+    parser.add_argument("--since", type=int, help="timestamp of the update checks")
+    args = parser.parse_args()
+
+    global SINCE
+    SINCE = args.since or SINCE
+
+    logging.basicConfig(level=logging.ERROR)
+    scenarios = args.scenario or list(SCENARIOS)
+
+    server = None
+    url = args.url
+    if args.replay:
+        url = url or "http://replay"
+    elif url is None:
+        server = FakeMoodleServer(from_arguments(args)).start()
+        url = server.url
+    try:
+        reports = [run_scenario(name, url, args) for name in scenarios]
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()